@@ -19,6 +19,25 @@ from .core_npu import NPUStat, NPUStatCollection, new_npu_query
 from .npu import is_npu_available, npu_count
 from .cli import print_gpustat, main
 
+# Imported on first use: nothing needs them at import time, and shm (file
+# locks) is not available on every platform.
+_LAZY = {
+    'aquery': 'aio',
+    'amonitor': 'aio',
+    'pick_devices': 'pick',
+    'read_shared_snapshot': 'shm',
+    'sample': 'workload',
+    'load_ipython_extension': 'workload',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        module = importlib.import_module(f'.{_LAZY[name]}', __name__)
+        return getattr(module, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 __all__ = (
     '__version__',
@@ -32,6 +51,11 @@ __all__ = (
     'new_npu_query',
     'is_npu_available',
     'npu_count',
+    'aquery',
+    'amonitor',
+    'pick_devices',
+    'read_shared_snapshot',
+    'sample',
     'print_gpustat',
     'main',
 )
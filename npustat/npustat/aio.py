@@ -0,0 +1,100 @@
+"""
+Async API for asyncio services: ``await npustat.aquery()`` and
+``async for snapshot in npustat.amonitor(interval)``.
+
+mbltml and NVML calls block, so they run on a dedicated single-thread
+executor and never on the event loop. Concurrent awaiters of the same query
+share a single in-flight sample instead of each starting their own, and
+cancelling an awaiter only stops it from waiting: the sample others are
+waiting for completes.
+"""
+
+import asyncio
+import concurrent.futures
+import weakref
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from npustat.sampler import Sampler, Snapshot
+
+# The driver calls of every event loop run on this thread, one at a time.
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+# per event loop: (gpu, npu) -> the Sampler doing the queries, and the
+# sample in flight, if any
+_samplers: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]' = \
+    weakref.WeakKeyDictionary()
+_inflight: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]' = \
+    weakref.WeakKeyDictionary()
+
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='npustat-query')
+    return _executor
+
+
+def _sampler(loop, key: Tuple[bool, bool]) -> Sampler:
+    samplers = _samplers.setdefault(loop, {})
+    sampler = samplers.get(key)
+    if sampler is None:
+        from npustat.core import GPUStatCollection
+        from npustat.core_npu import NPUStatCollection
+        gpu, npu = key
+        # only sample() is used: the sampler thread (and its interval) is
+        # never started
+        sampler = samplers[key] = Sampler(
+            1.0, gpu_query=GPUStatCollection.new_query if gpu else None,
+            npu_query=NPUStatCollection.new_query if npu else None)
+    return sampler
+
+
+async def aquery(*, gpu: bool = True, npu: bool = True) -> Snapshot:
+    """Query the devices without blocking the event loop.
+
+    Args:
+        gpu: Query the NVIDIA GPUs
+        npu: Query the Mobilint NPUs
+
+    Returns:
+        A Snapshot; a family that could not be queried has its error in
+        `gpu_error` / `npu_error` instead of stats. Callers awaiting while a
+        query is in flight get the same snapshot.
+    """
+    loop = asyncio.get_running_loop()
+    key = (gpu, npu)
+    inflight = _inflight.setdefault(loop, {})
+    future = inflight.get(key)
+    if future is None:
+        future = loop.run_in_executor(_get_executor(),
+                                      _sampler(loop, key).sample)
+        inflight[key] = future
+        future.add_done_callback(lambda _: inflight.pop(key, None))
+    # a cancelled awaiter must not cancel the sample the others wait for
+    return await asyncio.shield(future)
+
+
+async def amonitor(interval: float = 1.0, *, gpu: bool = True,
+                   npu: bool = True) -> AsyncIterator[Snapshot]:
+    """Yield a snapshot every `interval` seconds, at a fixed rate.
+
+    Ticks missed while the consumer or the query was busy are skipped, not
+    caught up on. Stop by leaving the loop or cancelling the task.
+
+    Usage:
+        async for snapshot in npustat.amonitor(1.0, gpu=False):
+            print(snapshot.npu_stats)
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time()
+    while True:
+        yield await aquery(gpu=gpu, npu=npu)
+        deadline += interval
+        now = loop.time()
+        if interval <= 0:
+            deadline = now
+        elif deadline < now:
+            # skip the missed ticks, keep the phase
+            deadline += ((now - deadline) // interval + 1) * interval
+        await asyncio.sleep(deadline - now)
@@ -0,0 +1,99 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+
+import npustat
+from npustat import aio
+from npustat.core_npu import NPUStatCollection
+
+
+@pytest.fixture
+def slow_npu_query(fake_mbltml, monkeypatch):
+    """NPU queries block until `release` is set; `started` counts them."""
+    release = threading.Event()
+    started = []
+    query = NPUStatCollection.new_query
+
+    def slow_query(*args, **kwargs):
+        started.append(threading.current_thread().name)
+        release.wait(5)
+        return query(*args, **kwargs)
+
+    monkeypatch.setattr(NPUStatCollection, 'new_query', slow_query)
+    return release, started
+
+
+def test_aquery(fake_mbltml):
+    snapshot = asyncio.run(npustat.aquery(gpu=False))
+    assert snapshot.seq == 1 and snapshot.npu_error is None
+    assert [n.index for n in snapshot.npu_stats] == [0, 1]
+
+
+def test_concurrent_awaiters_share_one_sample(slow_npu_query):
+    release, started = slow_npu_query
+
+    async def main():
+        tasks = [asyncio.ensure_future(aio.aquery(gpu=False))
+                 for _ in range(5)]
+        await asyncio.sleep(0.05)
+        # the event loop is not blocked while the query runs
+        assert not any(t.done() for t in tasks)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    snapshots = asyncio.run(main())
+    assert len({id(s) for s in snapshots}) == 1
+    assert len(started) == 1 and started[0].startswith('npustat-query')
+
+
+def test_cancelled_awaiter_does_not_cancel_the_sample(slow_npu_query):
+    release, started = slow_npu_query
+
+    async def main():
+        first = asyncio.ensure_future(aio.aquery(gpu=False))
+        second = asyncio.ensure_future(aio.aquery(gpu=False))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()).npu_stats is not None
+    assert len(started) == 1
+
+
+def test_amonitor(fake_mbltml):
+    async def main():
+        snapshots = []
+        async for snapshot in npustat.amonitor(0.01, gpu=False):
+            snapshots.append(snapshot)
+            if len(snapshots) == 3:
+                break
+        return snapshots
+
+    assert [s.seq for s in asyncio.run(main())] == [1, 2, 3]
+
+
+def test_amonitor_cancel(fake_mbltml):
+    async def main():
+        seen = []
+
+        async def consume():
+            async for snapshot in aio.amonitor(10.0, gpu=False):
+                seen.append(snapshot)
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.1)  # sleeping until the next tick
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return seen
+
+    assert len(asyncio.run(main())) == 1
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,300 @@
+"""
+Declarative alert rules, evaluated against every snapshot.
+
+A rule reads like ``npu.temperature > 85 for 30s clear 80``:
+
+- ``npu`` or ``gpu``, optionally with device indices (``npu[0,1]``);
+- a field (see NPU_FIELDS and GPU_FIELDS), a comparison and a threshold;
+- ``for DURATION``: the condition must hold that long before firing;
+- ``clear VALUE``: hysteresis; once firing, the alert only clears when the
+  value crosses back past VALUE instead of the threshold itself.
+
+Rules are compiled once; evaluating them only reads values already in the
+queried stats, so alerting costs no extra driver calls.
+"""
+
+import operator
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import (Any, Callable, Dict, List, Optional, Sequence, Tuple)
+
+from npustat.util import parse_duration
+
+# Exit status of a one-shot npustat run in which any alert fired.
+ALERT_EXIT_CODE = 3
+
+NPU_FIELDS: Dict[str, Callable[[Any], Optional[float]]] = {
+    'temperature': lambda n: n.temperature,
+    'utilization': lambda n: n.utilization,
+    'memory_used': lambda n: n.memory_used,
+    'memory_free': lambda n: n.memory_free,
+    'memory_total': lambda n: n.memory_total,
+    'power': lambda n: n.power_total,
+    'fan': lambda n: n.fan_duty,
+}
+
+GPU_FIELDS: Dict[str, Callable[[Any], Optional[float]]] = {
+    'temperature': lambda g: g.temperature,
+    'utilization': lambda g: g.utilization,
+    'memory_used': lambda g: g.memory_used,
+    'memory_free': lambda g: g.memory_free,
+    'memory_total': lambda g: g.memory_total,
+    'power': lambda g: g.power_draw,
+    'fan': lambda g: g.fan_speed,
+}
+
+_OPERATORS = {
+    '>': operator.gt, '>=': operator.ge,
+    '<': operator.lt, '<=': operator.le,
+    '==': operator.eq, '!=': operator.ne,
+}
+
+_NUMBER = r'-?\d+(?:\.\d+)?'
+_RULE_RE = re.compile(
+    r'^\s*(?P<family>npu|gpu)(?:\[(?P<indices>\d+(?:\s*,\s*\d+)*)\])?'
+    r'\.(?P<field>\w+)\s*(?P<op>>=|<=|==|!=|>|<)\s*(?P<threshold>' + _NUMBER +
+    r')(?:\s+for\s+(?P<duration>\S+))?(?:\s+clear\s+(?P<clear>' + _NUMBER +
+    r'))?\s*$')
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A compiled alert rule."""
+    text: str
+    family: str  # 'npu' or 'gpu'
+    indices: Optional[Tuple[int, ...]]  # None for all devices
+    field: str
+    op: str
+    threshold: float
+    duration: float = 0.0  # seconds the condition must hold
+    clear: Optional[float] = None  # hysteresis threshold
+
+    @classmethod
+    def parse(cls, text: str) -> 'Rule':
+        m = _RULE_RE.match(text)
+        if not m:
+            raise ValueError(f"Invalid alert rule: {text!r} (expected e.g. "
+                             "'npu.temperature > 85 for 30s')")
+        fields = NPU_FIELDS if m['family'] == 'npu' else GPU_FIELDS
+        if m['field'] not in fields:
+            raise ValueError(f"Unknown {m['family']} field {m['field']!r} in "
+                             f"{text!r}; one of {', '.join(fields)}")
+        if m['clear'] is not None and m['op'] in ('==', '!='):
+            raise ValueError(f"'clear' needs an ordering comparison: {text!r}")
+        threshold = float(m['threshold'])
+        clear = float(m['clear']) if m['clear'] is not None else None
+        if clear is not None:
+            # on the firing side, the alert would never clear (or flap)
+            if m['op'] in ('>', '>=') and not clear < threshold:
+                raise ValueError(f"'clear' must be below the threshold of "
+                                 f"{m['op']!r}: {text!r}")
+            if m['op'] in ('<', '<=') and not clear > threshold:
+                raise ValueError(f"'clear' must be above the threshold of "
+                                 f"{m['op']!r}: {text!r}")
+        indices = None
+        if m['indices']:
+            indices = tuple(int(i) for i in m['indices'].split(','))
+        return cls(text=' '.join(text.split()), family=m['family'],
+                   indices=indices, field=m['field'], op=m['op'],
+                   threshold=threshold,
+                   duration=parse_duration(m['duration'])
+                   if m['duration'] else 0.0,
+                   clear=clear)
+
+    def read(self, device) -> Optional[float]:
+        fields = NPU_FIELDS if self.family == 'npu' else GPU_FIELDS
+        try:
+            return fields[self.field](device)
+        except (TypeError, KeyError, AttributeError):
+            return None  # e.g. not supported by the device
+
+    def breached(self, value: float) -> bool:
+        return _OPERATORS[self.op](value, self.threshold)
+
+    def cleared(self, value: float) -> bool:
+        """Whether a firing alert with this value clears."""
+        if self.clear is None:
+            return not self.breached(value)
+        # past the clear level on the other side of the threshold
+        if self.op in ('>', '>='):
+            return value <= self.clear
+        return value >= self.clear
+
+
+@dataclass
+class AlertState:
+    """The state of one rule on one device."""
+    pending_since: Optional[float] = None
+    firing: bool = False
+    value: Optional[float] = None
+
+
+@dataclass
+class AlertEvent:
+    """A rule starting or stopping to fire on a device."""
+    rule: Rule
+    device: str  # e.g. N0
+    value: Optional[float]
+    firing: bool
+    time: datetime = field(default_factory=datetime.now)
+
+    def __str__(self) -> str:
+        state = 'FIRING' if self.firing else 'CLEARED'
+        return (f"{self.time.isoformat(timespec='seconds')} {state} "
+                f"[{self.device}] {self.rule.text} (value: {self.value})")
+
+
+class AlertEngine:
+    """Evaluates rules incrementally and runs the actions on transitions.
+
+    Usage:
+        engine = AlertEngine.parse(['npu.temperature > 85 for 30s'])
+        engine.evaluate(gpu_stats, npu_stats)   # list of AlertEvents
+        engine.firing                            # what fires right now
+    """
+
+    def __init__(self, rules: Sequence[Rule], *,
+                 log_path: Optional[str] = None,
+                 hook: Optional[str] = None,
+                 oneshot: bool = False):
+        self.rules = list(rules)
+        self.log_path = log_path
+        self.hook = hook
+        # A single evaluation cannot wait for 'for' durations: such rules
+        # are only ever pending.
+        self.oneshot = oneshot
+        self._states: Dict[Tuple[int, str], AlertState] = {}
+        self._hooks: List[subprocess.Popen] = []
+
+    @classmethod
+    def parse(cls, texts: Sequence[str], **kwargs) -> 'AlertEngine':
+        return cls([Rule.parse(t) for t in texts], **kwargs)
+
+    @property
+    def firing(self) -> List[Tuple[Rule, str, Optional[float]]]:
+        """(rule, device, value) of the alerts firing right now."""
+        return [(self.rules[i], device, state.value)
+                for (i, device), state in self._states.items()
+                if state.firing]
+
+    @property
+    def pending(self) -> List[Tuple[Rule, str, Optional[float]]]:
+        """(rule, device, value) of the breached rules waiting for 'for'."""
+        return [(self.rules[i], device, state.value)
+                for (i, device), state in self._states.items()
+                if state.pending_since is not None and not state.firing]
+
+    def evaluate(self, gpu_stats=None, npu_stats=None,
+                 now: Optional[float] = None) -> List[AlertEvent]:
+        """Evaluate all rules against the given stats.
+
+        Firing rules are attached to each device (its `alerts`), and the
+        transitions are logged and passed to the hook command.
+        """
+        if now is None:
+            now = datetime.now().timestamp()
+        devices = {'gpu': [(f'G{g.index}', g) for g in gpu_stats or ()],
+                   'npu': [(f'N{n.index}', n) for n in npu_stats or ()]}
+        alerts: Dict[int, List[str]] = {}  # id(device) -> firing rule texts
+
+        events = []
+        seen = set()
+        for i, rule in enumerate(self.rules):
+            for key, device in devices[rule.family]:
+                if rule.indices is not None and device.index not in rule.indices:
+                    continue
+                seen.add((i, key))
+                event = self._step(i, rule, key, rule.read(device), now)
+                if event is not None:
+                    events.append(event)
+                if self._states[(i, key)].firing:
+                    alerts.setdefault(id(device), []).append(rule.text)
+
+        # Forget the devices that are gone from a family that was queried;
+        # their firing alerts clear.
+        queried = {'gpu': gpu_stats is not None, 'npu': npu_stats is not None}
+        for i, key in list(self._states):
+            if (i, key) in seen or not queried[self.rules[i].family]:
+                continue
+            if self._states.pop((i, key)).firing:
+                events.append(AlertEvent(self.rules[i], key, None,
+                                         firing=False))
+
+        for _, device in devices['gpu']:
+            device.entry['alerts'] = alerts.get(id(device), [])
+        for _, device in devices['npu']:
+            device.entry.alerts = alerts.get(id(device), [])
+
+        for event in events:
+            self._act(event)
+        self._reap_hooks()
+        return events
+
+    def observe(self, snapshot):
+        """Sampler observer: evaluate every snapshot before it is shown."""
+        self.evaluate(snapshot.gpu_stats, snapshot.npu_stats,
+                      now=snapshot.query_time.timestamp())
+
+    def _step(self, i: int, rule: Rule, key: str, value: Optional[float],
+              now: float) -> Optional[AlertEvent]:
+        state = self._states.setdefault((i, key), AlertState())
+        if value is None:  # no reading: keep the current state
+            return None
+        state.value = value
+
+        if state.firing:
+            if rule.cleared(value):
+                state.firing = False
+                state.pending_since = None
+                return AlertEvent(rule, key, value, firing=False)
+            return None
+
+        if not rule.breached(value):
+            state.pending_since = None
+            return None
+        if state.pending_since is None:
+            state.pending_since = now
+        if self.oneshot and rule.duration:
+            return None
+        if now - state.pending_since >= rule.duration:
+            state.firing = True
+            return AlertEvent(rule, key, value, firing=True)
+        return None
+
+    def _act(self, event: AlertEvent):
+        if self.log_path:
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(str(event) + '\n')
+            except OSError as e:
+                sys.stderr.write(f'Cannot write the alert log: {e}\n')
+        if self.hook:
+            env = dict(os.environ,
+                       NPUSTAT_ALERT_STATE='firing' if event.firing
+                       else 'cleared',
+                       NPUSTAT_ALERT_DEVICE=event.device,
+                       NPUSTAT_ALERT_RULE=event.rule.text,
+                       NPUSTAT_ALERT_VALUE=str(event.value))
+            try:
+                # do not wait: a slow hook must not stall the sampling loop
+                self._hooks.append(subprocess.Popen(
+                    self.hook, shell=True, env=env,
+                    stdin=subprocess.DEVNULL))
+            except OSError as e:
+                sys.stderr.write(f'Cannot run the alert hook: {e}\n')
+
+    def _reap_hooks(self):
+        self._hooks = [p for p in self._hooks if p.poll() is None]
+
+    def wait_hooks(self, timeout: Optional[float] = None):
+        """Wait for the hook commands still running (e.g. before exiting)."""
+        for p in self._hooks:
+            try:
+                p.wait(timeout)
+            except subprocess.TimeoutExpired:
+                pass
+        self._reap_hooks()
@@ -0,0 +1,102 @@
+import sys
+
+import pytest
+
+from npustat import cli
+from npustat.alerts import ALERT_EXIT_CODE, AlertEngine, Rule
+from npustat.conftest import aries
+from npustat.core_npu import NPUStatCollection
+
+
+def test_rule_parse():
+    rule = Rule.parse('npu[0, 2].temperature  >  85 for 30s clear 80')
+    assert (rule.family, rule.indices, rule.field) == \
+        ('npu', (0, 2), 'temperature')
+    assert (rule.op, rule.threshold, rule.duration, rule.clear) == \
+        ('>', 85, 30, 80)
+    assert rule.text == 'npu[0, 2].temperature > 85 for 30s clear 80'
+
+    with pytest.raises(ValueError, match='Invalid'):
+        Rule.parse('npu.temperature is hot')
+    with pytest.raises(ValueError, match='Unknown npu field'):
+        Rule.parse('npu.flux > 1')
+    # the clear level must be on the other side of the threshold
+    assert Rule.parse('gpu.memory_free < 1000 clear 2000').clear == 2000
+    for text in ('npu.temperature > 85 clear 90',
+                 'npu.temperature >= 85 clear 85',
+                 'gpu.memory_free < 1000 clear 500'):
+        with pytest.raises(ValueError, match="'clear' must be"):
+            Rule.parse(text)
+
+
+def test_duration_and_hysteresis(fake_mbltml, tmp_path):
+    fake_mbltml.devices[:] = [aries(0), aries(1)]
+    log = tmp_path / 'alerts.log'
+    engine = AlertEngine.parse(['npu.temperature > 85 for 30s clear 80'],
+                               log_path=str(log))
+
+    def tick(now, temperature):
+        fake_mbltml.devices[0]['Temperature'] = temperature
+        stats = NPUStatCollection.new_query()
+        return engine.evaluate(npu_stats=stats, now=now), stats
+
+    assert tick(0, 90)[0] == []  # pending
+    assert tick(20, 88)[0] == []
+    events, stats = tick(30, 87)  # held for 30 s
+    assert [(e.device, e.firing) for e in events] == [('N0', True)]
+    assert stats[0].alerts == [engine.rules[0].text]
+    assert stats[1].alerts == []
+    assert stats[0].jsonify()['alerts'] == [engine.rules[0].text]
+
+    assert tick(40, 82)[0] == []  # below the threshold, above 'clear'
+    assert [r.text for r, _, _ in engine.firing] == [engine.rules[0].text]
+    events, stats = tick(50, 79)
+    assert [(e.device, e.firing) for e in events] == [('N0', False)]
+    assert engine.firing == [] and stats[0].alerts == []
+
+    lines = log.read_text().splitlines()
+    assert 'FIRING [N0]' in lines[0] and 'CLEARED [N0]' in lines[1]
+
+    # the condition must hold without interruption
+    tick(60, 90)
+    tick(70, 84)
+    assert tick(95, 90)[0] == []
+
+
+def test_oneshot_duration_is_pending(fake_mbltml):
+    engine = AlertEngine.parse(['npu[1].memory_free < 16384 for 1m',
+                                'npu[1].memory_free < 16384'], oneshot=True)
+    events = engine.evaluate(npu_stats=NPUStatCollection.new_query())
+    # one sample cannot show that a condition held for a minute
+    assert [(e.rule.text, e.device) for e in events] == \
+        [(engine.rules[1].text, 'N1')]
+    assert [(r.text, d) for r, d, _ in engine.pending] == \
+        [(engine.rules[0].text, 'N1')]
+
+
+def test_oneshot_cli_exit_status(fake_mbltml, capsys):
+    cli.main('npustat', '--npu-only', '--alert',
+             'npu.temperature > 40 for 30s')  # pending: no exit status
+    assert 'Pending [N0]' in capsys.readouterr().err
+    with pytest.raises(SystemExit) as e:
+        cli.main('npustat', '--npu-only', '--alert', 'npu.temperature > 40')
+    assert e.value.code == ALERT_EXIT_CODE
+
+
+def test_vanished_device_clears(fake_mbltml):
+    engine = AlertEngine.parse(['npu.temperature > 40'])
+    engine.evaluate(npu_stats=NPUStatCollection.new_query(), now=0)
+    assert [d for _, d, _ in engine.firing] == ['N0', 'N1']
+
+    # a failed query says nothing about the devices
+    assert engine.evaluate(npu_stats=None, now=1) == []
+    assert len(engine.firing) == 2
+
+    del fake_mbltml.devices[1]
+    events = engine.evaluate(npu_stats=NPUStatCollection.new_query(), now=2)
+    assert [(e.device, e.firing) for e in events] == [('N1', False)]
+    assert [d for _, d, _ in engine.firing] == ['N0']
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,188 @@
+"""
+Caches of query results: across invocations (``--max-age``), and within a
+process (Memo, behind ``new_query(max_age=...)``).
+
+tmux hooks, shell prompts and scripts often run npustat many times within
+the same second, each repeating the same driver queries. With a maximum age,
+the result of a query is kept in a per-user cache file; later invocations
+within that age reuse it instead of querying again.
+
+Writers serialize on a lock file, and the first caller in each window does
+the query while the others wait for it and then read its result. Cache
+files are replaced atomically, so a reader sees either the previous
+snapshot or the new one, never a partial write.
+
+The cache needs POSIX file locks and user IDs; where they are missing,
+queries with a maximum age simply run every time.
+
+Within a process, a Memo does the same for threads: concurrent callers
+block on the single query in flight instead of each starting their own.
+"""
+
+import getpass
+import os
+import pickle
+import tempfile
+import threading
+import time
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # e.g. Windows: no cache across invocations
+    fcntl = None
+
+T = TypeVar('T')
+
+
+def cache_dir() -> str:
+    """$NPUSTAT_CACHE_DIR, else a private directory of the current user."""
+    if os.environ.get('NPUSTAT_CACHE_DIR'):
+        return os.environ['NPUSTAT_CACHE_DIR']
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, 'npustat')
+    user = os.getuid() if hasattr(os, 'getuid') else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f'npustat-{user}')
+
+
+def _ensure_private_dir(directory: str):
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.stat(directory)
+    # the cache is unpickled: never trust a directory someone else owns
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise PermissionError(f'{directory} is not private to the user')
+
+
+def _load(path: str, max_age: float) -> Optional[Tuple[float, object]]:
+    """(timestamp, value) of a cache file no older than max_age, if any."""
+    try:
+        with open(path, 'rb') as f:
+            timestamp, value = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:  # pylint: disable=broad-exception-caught
+        return None  # unreadable, e.g. written by another npustat version
+    if not 0 <= time.time() - timestamp <= max_age:
+        return None
+    return timestamp, value
+
+
+def _store(path: str, value: object):
+    fd, tmp = tempfile.mkstemp(prefix='.', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time(), value), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def cached_query(key: str, max_age: float, query: Callable[[], T], *,
+                 directory: Optional[str] = None) -> T:
+    """The result of `query()`, reused if cached less than max_age ago.
+
+    Args:
+        key: Identifies the query and its arguments, e.g. 'npu'
+        max_age: Seconds a cached result may be reused for
+        query: Runs the query; exceptions are not cached
+        directory: Cache directory (default: cache_dir())
+
+    Returns:
+        The cached or fresh result.
+    """
+    if fcntl is None or not hasattr(os, 'getuid'):
+        return query()  # cannot lock or check ownership: no cache
+    directory = directory or cache_dir()
+    try:
+        _ensure_private_dir(directory)
+    except OSError:
+        return query()  # no usable cache: behave as without --max-age
+    path = os.path.join(directory, f'{key}.pickle')
+
+    hit = _load(path, max_age)
+    if hit is not None:
+        return hit[1]
+
+    with open(path + '.lock', 'a+b') as lock:
+        # whoever holds the lock is querying: wait for its result
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        hit = _load(path, max_age)
+        if hit is not None:
+            return hit[1]
+        value = query()
+        try:
+            _store(path, value)
+        except (OSError, pickle.PicklingError):
+            pass
+        return value
+
+
+class _Flight:
+    """A query in progress, and eventually its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class Memo(Generic[T]):
+    """The result of a query, shared by threads while it is fresh enough.
+
+    Usage:
+        memo = Memo(NPUStatCollection.new_query, copy=copy.deepcopy)
+        npus = memo.get(max_age=0.5)
+
+    Without `copy`, callers share the very same result object and must
+    treat it as read-only; with it, each caller gets copy(result) and the
+    kept result is never handed out.
+    """
+
+    def __init__(self, query: Callable[[], T], *,
+                 copy: Optional[Callable[[T], T]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.query = query
+        self.copy = copy or (lambda value: value)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._taken_at = 0.0  # when the query of _value started
+        self._flight: Optional[_Flight] = None
+
+    def get(self, max_age: float) -> T:
+        """A result at most max_age seconds old, querying if there is none.
+
+        If another thread is already querying, waits for its result (or
+        its exception) instead of starting another query.
+        """
+        with self._lock:
+            if self._value is not None and \
+                    self.clock() - self._taken_at <= max_age:
+                return self.copy(self._value)
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self.copy(flight.value)
+
+        started = self.clock()
+        try:
+            flight.value = self.query()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._value, self._taken_at = flight.value, started
+                self._flight = None
+            flight.done.set()
+        return self.copy(flight.value)
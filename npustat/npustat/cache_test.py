@@ -0,0 +1,183 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+import npustat
+from npustat import cache, cli
+
+posix_only = pytest.mark.skipif(cache.fcntl is None,
+                                reason='no cache without fcntl')
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    directory = str(tmp_path / 'cache')
+    monkeypatch.setenv('NPUSTAT_CACHE_DIR', directory)
+    return directory
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@posix_only
+def test_reuse_within_max_age(cache_dir, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'time', clock.time)
+    calls = []
+
+    def query():
+        calls.append(clock.now)
+        return {'n': len(calls)}
+
+    assert cache.cached_query('npu', 2.0, query) == {'n': 1}
+    clock.now += 1.5
+    assert cache.cached_query('npu', 2.0, query) == {'n': 1}
+    # another key is another query
+    assert cache.cached_query('gpu-all-0', 2.0, query) == {'n': 2}
+    clock.now += 1.0
+    assert cache.cached_query('npu', 2.0, query) == {'n': 3}
+    assert len(calls) == 3
+
+
+def test_errors_are_not_cached(cache_dir):
+    def fail():
+        raise RuntimeError('mbltml is not available')
+
+    with pytest.raises(RuntimeError):
+        cache.cached_query('npu', 10, fail)
+    assert cache.cached_query('npu', 10, lambda: 42) == 42
+
+
+@posix_only
+def test_concurrent_callers_share_one_query(cache_dir):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_query():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'snapshot'
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(
+        cache.cached_query('npu', 10, slow_query)))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: results.append(
+        cache.cached_query('npu', 10, slow_query)))
+    second.start()
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert results == ['snapshot', 'snapshot']
+    assert len(calls) == 1
+
+
+def test_no_cache_without_fcntl(cache_dir, monkeypatch):
+    monkeypatch.setattr(cache, 'fcntl', None)
+    calls = []
+    for _ in range(2):
+        cache.cached_query('npu', 10, lambda: calls.append(1))
+    assert len(calls) == 2
+    assert not os.path.exists(cache_dir)
+
+
+@posix_only
+def test_foreign_directory_is_not_used(tmp_path, monkeypatch):
+    directory = tmp_path / 'shared'
+    directory.mkdir(mode=0o777)
+    os.chmod(directory, 0o777)
+    monkeypatch.setenv('NPUSTAT_CACHE_DIR', str(directory))
+    assert cache.cached_query('npu', 10, lambda: 1) == 1
+    assert os.listdir(directory) == []
+
+
+@posix_only
+def test_max_age_cli(fake_mbltml, cache_dir, capsys):
+    cli.main('npustat', '--npu-only', '--json', '--max-age', '10')
+    calls = sum(fake_mbltml.calls.values())
+    first = json.loads(capsys.readouterr().out)
+
+    cli.main('npustat', '--npu-only', '--json', '--max-age', '10')
+    assert sum(fake_mbltml.calls.values()) == calls
+    assert json.loads(capsys.readouterr().out) == first
+
+    cli.main('npustat', '--npu-only', '--json')
+    assert sum(fake_mbltml.calls.values()) > calls
+
+
+def test_memo_reuse_within_max_age():
+    clock = Clock()
+    calls = []
+    memo = cache.Memo(lambda: calls.append(1) or len(calls), clock=clock.time)
+    assert memo.get(0.5) == 1
+    clock.now += 0.4
+    assert memo.get(0.5) == 1
+    clock.now += 0.2
+    assert memo.get(0.5) == 2
+
+
+def test_memo_single_flight():
+    release = threading.Event()
+    calls = []
+
+    def slow_query():
+        calls.append(1)
+        release.wait(5)
+        if len(calls) == 1:
+            raise RuntimeError('device lost')
+        return object()
+
+    memo = cache.Memo(slow_query)
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(memo.get(10))
+        except RuntimeError as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for t in threads:
+        t.start()
+    while not calls:
+        release.wait(0.01)
+    release.wait(0.1)  # let the other threads join the flight
+    release.set()
+    for t in threads:
+        t.join(5)
+    # every caller got the error of the one query in flight
+    assert len(calls) == 1
+    assert len(outcomes) == 4 and len({id(o) for o in outcomes}) == 1
+
+    # errors are not kept: the next call queries again
+    result = memo.get(10)
+    assert memo.get(10) is result and len(calls) == 2
+
+
+def test_new_npu_query_max_age(fake_mbltml, monkeypatch):
+    from npustat import core_npu
+    monkeypatch.setattr(core_npu, '_npu_memo', None)
+    npus = npustat.new_npu_query(max_age=10)
+    calls = sum(fake_mbltml.calls.values())
+    again = npustat.new_npu_query(max_age=10)
+    assert sum(fake_mbltml.calls.values()) == calls
+    # the same snapshot, but each caller's own copy
+    assert again.query_time == npus.query_time and again is not npus
+    again[0].entry.utilization = 99.0
+    assert npustat.new_npu_query(max_age=10)[0].utilization == \
+        npus[0].utilization != 99.0
+    assert npustat.new_npu_query() is not npus
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
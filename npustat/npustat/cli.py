@@ -1,5 +1,6 @@
 """npustat CLI - GPU and NPU monitoring tool."""
 
+import functools
 import locale
 import os
 import platform
@@ -11,12 +12,51 @@ from datetime import datetime
 from blessed import Terminal
 
 from npustat import __version__
-from npustat.core import GPUStatCollection, DEFAULT_GPUNAME_WIDTH
+from npustat.core import (GPUStatCollection, GPUSampleReader,
+                          ProcessUtilizationReader,
+                          DEFAULT_GPUNAME_WIDTH)
+from npustat.alerts import ALERT_EXIT_CODE
 from npustat.core_npu import NPUStatCollection, DEFAULT_NPUNAME_WIDTH
 from npustat.npu import is_npu_available
+from npustat.query import DEFAULT_QUERY
+from npustat.sampler import Sampler
 
 IS_WINDOWS = 'windows' in platform.platform().lower()
 
+# Shortest watch interval; ticks the queries cannot keep up with are skipped
+# and reported rather than letting the refresh rate drift.
+MIN_INTERVAL = 0.01
+
+# Seconds between two checks for keys and new snapshots in watch mode; the
+# screen is redrawn at most this often, whatever the sampling interval.
+RENDER_INTERVAL = 0.05
+
+# Snapshots kept by the sampler for the sparkline view to catch up on.
+TUI_BACKLOG = 64
+
+# Subcommands (`npustat <name> ...`) and the modules whose main(argv)
+# implements them, each with its own argument parser.
+SUBCOMMANDS = {
+    'top': 'npustat.top',
+    'wait': 'npustat.wait',
+    'pick': 'npustat.pick',
+    'lease': 'npustat.lease',
+    'publish': 'npustat.shm',
+    'statusline': 'npustat.statusline',
+    'run': 'npustat.run',
+    'stream': 'npustat.diff',
+}
+
+# Arguments of print_gpustat that select what and how to query, as opposed
+# to how to display it.
+QUERY_ARGS = ('id', 'debug', 'batch_fields', 'high_res', 'sample_reader',
+              'events', 'event_listener', 'npu_poll_policy', 'npu_poller',
+              'no_npu', 'npu_only', 'shm', 'max_age')
+
+# The options that apply to --format; the others are rejected with it.
+FORMAT_ARGS = ('table_format', 'query', 'interval', 'id', 'no_npu',
+               'npu_only')
+
 
 SHTAB_PREAMBLE = {
     'zsh': '''\
@@ -61,18 +101,39 @@ def get_complete_for_one_or_zero(input):
     return output
 
 
-def print_gpustat(*, id=None, json=False, debug=False,
-                  no_npu=False, npu_only=False, show_npu_clock=False,
+def print_gpustat(*, id=None, json=False, debug=False, batch_fields=True,
+                  high_res=False, sample_reader=None,
+                  events=False, event_listener=None,
+                  npu_poll_policy=None, npu_poller=None, alerts=None,
+                  no_npu=False, npu_only=False, shm=False, max_age=None,
+                  show_npu_clock=False,
                   show_npu_extra=False, show_npu_core_status=True, **kwargs):
     '''Display the GPU and NPU query results into standard output.'''
     gpu_stats = None
     npu_stats = None
     show_npu = not no_npu  # NPU is shown by default
 
+    if high_res and sample_reader is None:
+        sample_reader = GPUSampleReader()
+
+    def cached(key, query):
+        # reuse the result of another npustat run less than max_age ago
+        if not max_age:
+            return query
+        from npustat.cache import cached_query
+        return functools.partial(cached_query, key, max_age, query)
+
     # Query GPU stats (unless npu_only mode)
     if not npu_only:
         try:
-            gpu_stats = GPUStatCollection.new_query(debug=debug, id=id)
+            gpu_query = functools.partial(
+                GPUStatCollection.new_query,
+                debug=debug, id=id, batch_fields=batch_fields,
+                sample_reader=sample_reader, event_listener=event_listener)
+            if event_listener is None:
+                devices = str(id or 'all').replace(os.sep, '_')
+                gpu_query = cached(f'gpu-{devices}-{int(high_res)}', gpu_query)
+            gpu_stats = gpu_query()
         except Exception as e:
             sys.stderr.write('Error on querying NVIDIA devices. '
                              'Use --debug flag to see more details.\n')
@@ -97,7 +158,14 @@ def print_gpustat(*, id=None, json=False, debug=False,
     # Query NPU stats (shown by default, unless --no-npu is specified)
     if show_npu or npu_only:
         try:
-            npu_stats = NPUStatCollection.new_query(debug=debug)
+            npu_query = functools.partial(NPUStatCollection.new_query,
+                                          debug=debug, poller=npu_poller,
+                                          leases=True)
+            if shm:
+                # the snapshot of `npustat publish`, if one is running
+                from npustat.shm import npu_query as shm_query
+                npu_query = functools.partial(shm_query, fallback=npu_query)
+            npu_stats = cached('npu', npu_query)()
         except Exception as e:
             if npu_only:
                 # NPU-only mode but NPU not available - show error
@@ -115,6 +183,34 @@ def print_gpustat(*, id=None, json=False, debug=False,
             sys.stderr.write('No Mobilint NPU was detected.\n')
             sys.exit(1)
 
+    # highlights the devices, logs and runs the hook; see alerts.py
+    if alerts is not None:
+        alerts.evaluate(gpu_stats, npu_stats)
+
+    render_gpustat(gpu_stats, npu_stats, json=json,
+                   show_npu_clock=show_npu_clock,
+                   show_npu_extra=show_npu_extra,
+                   show_npu_core_status=show_npu_core_status, **kwargs)
+
+    if alerts is not None and (alerts.firing or alerts.pending):
+        term = Terminal(stream=sys.stderr)
+        for rule, device, value in alerts.firing:
+            sys.stderr.write(term.bold_red(
+                f'Alert [{device}] {rule.text} (value: {value})') + '\n')
+        # a single sample cannot tell if the condition holds for a while
+        for rule, device, value in alerts.pending:
+            sys.stderr.write(term.yellow(
+                f'Pending [{device}] {rule.text} (value: {value}; '
+                f'use -i to wait for it)') + '\n')
+        sys.stderr.flush()
+
+
+def render_gpustat(gpu_stats, npu_stats, *, json=False, compact=False,
+                   query_time=None,
+                   show_npu_clock=False, show_npu_extra=False,
+                   show_npu_core_status=True, show_npu_heatmap=False,
+                   **kwargs):
+    '''Display already queried GPU and NPU stats into standard output.'''
     # Build NPU-specific kwargs
     npu_kwargs = {
         'force_color': kwargs.get('force_color', False),
@@ -124,31 +220,21 @@ def print_gpustat(*, id=None, json=False, debug=False,
         'show_user': kwargs.get('show_user', False),
         'show_pid': kwargs.get('show_pid', False),
         'show_power': kwargs.get('show_power', None),
+        'show_process_util': kwargs.get('show_process_util', False),
         'show_clock': show_npu_clock,
         'show_fan_speed': kwargs.get('show_fan_speed', False),
         'show_extra': show_npu_extra,
         'show_core_status': show_npu_core_status,
+        'show_core_heatmap': show_npu_heatmap,
         'show_header': False,  # Header is printed separately
         'no_processes': kwargs.get('no_processes', False),
     }
 
     if json:
         # Combined JSON output
-        output = {}
-        if gpu_stats:
-            output['gpu'] = gpu_stats.jsonify()
-        if npu_stats and len(npu_stats) > 0:
-            output['npu'] = npu_stats.jsonify()
-
-        import json as json_module
-
-        def date_handler(obj):
-            if hasattr(obj, 'isoformat'):
-                return obj.isoformat()
-            raise TypeError(type(obj))
-
-        json_module.dump(output, sys.stdout, indent=4, separators=(',', ': '),
-                         default=date_handler)
+        from npustat import serialize
+        serialize.dump(serialize.output(gpu_stats, npu_stats), sys.stdout,
+                       indent=None if compact else 4)
         sys.stdout.write(os.linesep)
         sys.stdout.flush()
     else:
@@ -182,7 +268,8 @@ def print_gpustat(*, id=None, json=False, debug=False,
 
         # Print unified header
         if show_header:
-            query_time = datetime.now()
+            if query_time is None:
+                query_time = datetime.now()
             if IS_WINDOWS:
                 timestr = query_time.strftime('%Y-%m-%d %H:%M:%S')
             else:
@@ -232,25 +319,152 @@ def print_gpustat(*, id=None, json=False, debug=False,
             npu_stats.print_formatted(fp, **npu_kwargs)
 
 
-def loop_gpustat(interval=1.0, **kwargs):
-    term = Terminal()
+def _query_args(kwargs):
+    """Split off the arguments of print_gpustat that only affect querying."""
+    return {k: kwargs.pop(k) for k in QUERY_ARGS if k in kwargs}
 
-    with term.fullscreen():
-        while 1:
-            try:
-                query_start = time.time()
+
+def loop_gpustat(interval=1.0, tui=False, tui_cores=False, averages=None,
+                 alerts=None, **kwargs):
+    term = Terminal()
+    query = _query_args(kwargs)
+    debug = query.get('debug', False)
+
+    view = None
+    if tui:
+        from npustat.tui import SparklineView
+        view = SparklineView(show_cores=tui_cores,
+                             high_res=bool(query.get('high_res')))
+
+    sample_reader = None
+    if query.get('high_res'):
+        # keep the last-seen sample timestamps across refreshes; the
+        # sparklines get every sub-second sample, not only the peaks
+        sample_reader = GPUSampleReader(
+            history=view.history if view is not None else None)
+    # the same for the per-process utilization
+    process_reader = ProcessUtilizationReader()
+
+    # with --npu-poll-policy, slow devices and slow-moving values are read
+    # less often than each tick
+    npu_poller = None
+    if not query.get('no_npu') and query.get('npu_poll_policy') is not None:
+        from npustat.policy import NPUPoller
+        npu_poller = NPUPoller(query.get('npu_poll_policy'))
+
+    # Waking the sampler on the listener's event takes a new snapshot as
+    # soon as an XID or other critical GPU event comes in, without polling
+    # any faster.
+    event_listener = None
+    if query.get('events') and not query.get('npu_only'):
+        from npustat.events import GPUEventListener
+        try:
+            event_listener = GPUEventListener().start()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            sys.stderr.write(f'Cannot listen to GPU events: {e}\n')
+
+    gpu_query = None
+    if not query.get('npu_only'):
+        gpu_query = functools.partial(
+            GPUStatCollection.new_query, debug=debug, id=query.get('id'),
+            batch_fields=query.get('batch_fields', True),
+            sample_reader=sample_reader, event_listener=event_listener,
+            process_reader=process_reader)
+    npu_query = None
+    if not query.get('no_npu'):
+        npu_query = functools.partial(NPUStatCollection.new_query,
+                                      debug=debug, poller=npu_poller,
+                                      leases=True)
+        if query.get('shm'):
+            from npustat.shm import npu_query as shm_query
+            npu_query = functools.partial(shm_query, fallback=npu_query)
+
+    # The devices are queried on a background thread at a fixed rate (see
+    # sampler.py and scheduler.py); this thread only draws the latest
+    # snapshot and handles keys, so a slow mbltml or NVML call never freezes
+    # the screen.
+    sampler = Sampler(interval, gpu_query=gpu_query, npu_query=npu_query,
+                      wakeup=event_listener.wakeup if event_listener else None,
+                      maxlen=TUI_BACKLOG if tui else 1,
+                      observers=[o.observe for o in (averages, alerts)
+                                 if o is not None])
+    sampler.start()
+
+    eol_char = term.clear_eol + os.linesep
+    shown, drawn_at = None, 0.0
+    try:
+        with term.fullscreen(), term.cbreak(), term.hidden_cursor():
+            while 1:
+                key = term.inkey(timeout=RENDER_INTERVAL)
+                if key.lower() == 'q':
+                    return 0
+                if view is not None and key.lower() == 'c':
+                    view.show_cores = not view.show_cores
+
+                if view is not None:
+                    # every sample goes into the sparklines, even those
+                    # taken faster than the screen is redrawn
+                    for s in sampler.slot.recent():
+                        view.update(s)
+
+                snapshot = sampler.slot.get()
+                now = time.monotonic()
+                if snapshot is None:
+                    if shown is None and not drawn_at:
+                        print(term.move(0, 0) + 'Waiting for the first '
+                              'sample...', end=eol_char, flush=True)
+                        drawn_at = now
+                    continue
+                # redraw on a new snapshot, and every second to keep the
+                # sample age up to date when sampling is stuck.
+                if snapshot is shown and now - drawn_at < 1.0 and not key:
+                    continue
+                shown, drawn_at = snapshot, now
 
                 # Move cursor to (0, 0) but do not restore original cursor loc
                 print(term.move(0, 0), end='')
-                print_gpustat(eol_char=term.clear_eol + os.linesep, **kwargs)
+                if view is not None:
+                    from npustat.tui import render_frame
+                    render_frame(term, view, snapshot, sys.stdout,
+                                 eol_char=eol_char)
+                else:
+                    render_gpustat(snapshot.gpu_stats, snapshot.npu_stats,
+                                   query_time=snapshot.query_time,
+                                   eol_char=eol_char, **kwargs)
+                for message in _snapshot_errors(snapshot, query):
+                    print(term.red(message), end=eol_char)
+                for rule, device, value in (alerts.firing if alerts else ()):
+                    print(term.bold_red(f'Alert [{device}] {rule.text} '
+                                        f'(value: {value})'), end=eol_char)
+                if kwargs.get('show_header', True):
+                    print(term.bold_black(
+                        '(sampled {:.1f}s ago in {:.0f} ms; {}; q to quit)'
+                        .format(snapshot.age(now), snapshot.duration * 1000,
+                                sampler.scheduler.stats)), end=eol_char)
                 print(term.clear_eos, end='')
-
-                query_duration = time.time() - query_start
-                sleep_duration = interval - query_duration
-                if sleep_duration > 0:
-                    time.sleep(sleep_duration)
-            except KeyboardInterrupt:
-                return 0
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        # do not wait for a query stuck in the driver
+        sampler.stop(timeout=RENDER_INTERVAL)
+        if event_listener is not None:
+            event_listener.stop()
+
+
+def _snapshot_errors(snapshot, query):
+    """Messages for the device families that failed in a snapshot."""
+    messages = []
+    if snapshot.gpu_error is not None:
+        messages.append(f'Error on querying NVIDIA devices: '
+                        f'{snapshot.gpu_error}')
+    if snapshot.npu_error is not None:
+        if query.get('npu_only') or query.get('debug'):
+            messages.append(f'Error on querying NPU devices: '
+                            f'{snapshot.npu_error}')
+    elif query.get('npu_only') and not snapshot.npu_stats:
+        messages.append('No Mobilint NPU was detected.')
+    return messages
 
 
 def main(*argv):
@@ -265,6 +479,10 @@ def main(*argv):
     except Exception:  # pylint: disable=broad-exception-caught
         pass
 
+    if len(argv) > 1 and argv[1] in SUBCOMMANDS:
+        import importlib
+        return importlib.import_module(SUBCOMMANDS[argv[1]]).main(argv[1:])
+
     # arguments to npustat
     import argparse
     try:
@@ -274,6 +492,27 @@ def main(*argv):
     parser = argparse.ArgumentParser('npustat')
     shtab.add_argument_to(parser, preamble=SHTAB_PREAMBLE)
 
+    def npu_poll_policy(value):
+        from npustat.policy import DEFAULT_POLICY, PollingPolicy
+        try:
+            return PollingPolicy.parse(value, base=DEFAULT_POLICY)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+    def rolling_averages(value):
+        from npustat.rolling import RollingAverages
+        try:
+            return RollingAverages.parse(value)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+    def alert_rule(value):
+        from npustat.alerts import Rule
+        try:
+            return Rule.parse(value)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
     def nonnegative_int(value):
         value = int(value)
         if value < 0:
@@ -299,6 +538,8 @@ def main(*argv):
                         help='Display username of running process')
     parser.add_argument('-p', '--show-pid', action='store_true',
                         help='Display PID of running process')
+    parser.add_argument('--show-process-util', action='store_true',
+                        help='Display GPU/NPU utilization of running process')
     parser.add_argument('-F', '--show-fan-speed', '--show-fan',
                         action='store_true', help='Display GPU fan speed')
     codec_choices = ['', 'enc', 'dec', 'enc,dec']
@@ -319,10 +560,60 @@ def main(*argv):
     )
     parser.add_argument('--json', action='store_true', default=False,
                         help='Print all the information in JSON format')
+    parser.add_argument('--compact', action='store_true', default=False,
+                        help='With --json, print the JSON on a single line')
+    parser.add_argument(
+        '--format', dest='table_format', choices=['csv', 'tsv'],
+        default=None,
+        help='Print the --query columns as CSV or TSV rows, one per device '
+             '(or per NPU core with core.* columns), at every --interval'
+    )
+    parser.add_argument(
+        '--query', default=None, metavar='COLUMNS',
+        help='Comma-separated columns for --format, e.g. '
+             '"index,name,utilization,memory.used,power.total,core.*" '
+             '(default: "%s")' % DEFAULT_QUERY.replace('%', '%%')
+    )
     parser.add_argument(
         '-i', '--interval', '--watch', nargs='?', type=float, default=0,
         help='Use watch mode if given; seconds to wait between updates'
     ).complete = get_complete_for_one_or_zero({'zsh': '_numbers float'})  # type: ignore
+    parser.add_argument(
+        '--max-age', type=float, default=None, metavar='SECONDS',
+        help='Reuse the result of another npustat run at most SECONDS old, '
+             'from a per-user cache, instead of querying the devices again'
+    )
+    parser.add_argument(
+        '--avg', dest='averages', nargs='?', type=rolling_averages,
+        const='1s,10s,60s', default=None, metavar='WINDOWS',
+        help='In watch mode, show load-average style rolling utilization '
+             'over the given windows (default: 1s,10s,60s)'
+    )
+    parser.add_argument(
+        '--alert', dest='alert_rules', action='append', type=alert_rule,
+        default=[], metavar='RULE',
+        help='Highlight devices matching a rule such as '
+             '"npu.temperature > 85 for 30s clear 80" (repeatable); a '
+             'one-shot run then exits with status %d' % ALERT_EXIT_CODE
+    )
+    parser.add_argument(
+        '--alert-log', default=None, metavar='FILE',
+        help='Append every alert that fires or clears to FILE'
+    )
+    parser.add_argument(
+        '--alert-hook', default=None, metavar='CMD',
+        help='Run a shell command whenever an alert fires or clears, with '
+             'NPUSTAT_ALERT_{STATE,DEVICE,RULE,VALUE} in its environment'
+    )
+    parser.add_argument(
+        '--tui', action='store_true', default=False,
+        help='Full-screen watch mode with sparklines of recent utilization, '
+             'memory, power and temperature of every device'
+    )
+    parser.add_argument(
+        '--tui-cores', action='store_true', default=False,
+        help='With --tui, also show a sparkline for every NPU core'
+    )
     parser.add_argument(
         '--no-header', dest='show_header', action='store_false', default=True,
         help='Suppress header message'
@@ -339,6 +630,22 @@ def main(*argv):
         '--no-processes', dest='no_processes', action='store_true',
         help='Do not display running process information (memory, user, etc.)'
     )
+    parser.add_argument(
+        '--high-res', action='store_true', default=False,
+        help='Read the driver\'s sub-second GPU utilization and power '
+             'samples and show the peak utilization since the last update'
+    )
+    parser.add_argument(
+        '--events', action='store_true', default=False,
+        help='In watch mode, listen to GPU XID and other critical events '
+             'and show them as soon as they happen'
+    )
+    parser.add_argument(
+        '--no-batch-fields', dest='batch_fields', action='store_false',
+        default=True,
+        help='Query each GPU value with its own NVML call instead of '
+             'batching them through nvmlDeviceGetFieldValues'
+    )
 
     # NPU options
     npu_group = parser.add_argument_group('NPU options')
@@ -358,6 +665,25 @@ def main(*argv):
         '--npu-extra', dest='show_npu_extra', action='store_true',
         help='Display NPU chip, firmware, PCIe and power rail details'
     )
+    npu_group.add_argument(
+        '--npu-poll-policy', type=npu_poll_policy, nargs='?', const='',
+        default=None, metavar='POLICY',
+        help='In watch mode, read slow devices and slow-moving values less '
+             'often than every tick: the default policy, with the given '
+             'minimum seconds between reads of a device class or field '
+             'group, e.g. "Regulus(USB)=3,temperature=10,cores=0"'
+    )
+    npu_group.add_argument(
+        '--npu-heatmap', dest='show_npu_heatmap', action='store_true',
+        help='Show NPU cores as a compact row of colored cells on each '
+             'device line instead of one line per cluster'
+    )
+    npu_group.add_argument(
+        '--shm', action='store_true',
+        help='Read the NPUs from the shared-memory snapshot of a running '
+             '`npustat publish` instead of querying mbltml (queries mbltml '
+             'when no publisher runs)'
+    )
     npu_group.add_argument(
         '--no-npu-core-status', dest='show_npu_core_status',
         action='store_false', default=True,
@@ -370,6 +696,14 @@ def main(*argv):
     # TypeError: GPUStatCollection.print_formatted() got an unexpected keyword argument 'print_completion'
     with suppress(AttributeError):
         del args.print_completion  # type: ignore
+    if args.table_format is not None:
+        actions = parser._actions  # pylint: disable=protected-access
+        ignored = [max(action.option_strings, key=len) for action in actions
+                   if action.option_strings and action.dest not in FORMAT_ARGS
+                   and getattr(args, action.dest, action.default)
+                   != action.default]
+        if ignored:
+            parser.error(f"{', '.join(ignored)} can't be used with --format")
     if args.show_all:
         args.show_cmd = True
         args.show_user = True
@@ -385,19 +719,66 @@ def main(*argv):
     if args.npu_only:
         args.no_npu = False
 
+    # only meaningful in watch mode, which --tui implies
+    watch_args = {'tui': args.tui, 'tui_cores': args.tui_cores,
+                  'averages': args.averages}
+    del args.tui, args.tui_cores, args.averages  # type: ignore
+    if watch_args['tui'] and not args.interval:
+        args.interval = None
+
     if args.interval is None:  # with default value
         args.interval = 1.0
+    if args.npu_poll_policy is not None and not args.interval > 0:
+        parser.error('--npu-poll-policy requires --interval/-i')
+    if args.npu_poll_policy == '':  # given without a value (not converted)
+        args.npu_poll_policy = npu_poll_policy('')
+    if watch_args['averages'] is not None and not args.interval > 0:
+        parser.error('--avg requires --interval/-i')
+    if args.events and not args.interval > 0:
+        parser.error('--events requires --interval/-i')
+
+    table_format, query = args.table_format, args.query
+    del args.table_format, args.query  # type: ignore
+    if query is not None and table_format is None:
+        parser.error('--query requires --format csv or tsv')
+    if table_format is not None:
+        from npustat.query import QueryTable, parse_columns, write_table
+        try:
+            columns = parse_columns(query or DEFAULT_QUERY)
+            gpu_ids = [int(i) for i in args.id.split(',')] \
+                if args.id is not None else None
+            # the --id indices are checked against the GPUs here, up front
+            table = QueryTable(columns, gpu=not args.npu_only,
+                               npu=not args.no_npu, gpu_ids=gpu_ids)
+        except ValueError as e:
+            parser.error(str(e))
+        return write_table(table, table_format,
+                           max(MIN_INTERVAL, args.interval)
+                           if args.interval > 0 else 0)
+
+    alerts = None
+    if args.alert_rules:
+        from npustat.alerts import AlertEngine
+        alerts = AlertEngine(args.alert_rules, log_path=args.alert_log,
+                             hook=args.alert_hook,
+                             oneshot=not args.interval)
+    del args.alert_rules, args.alert_log, args.alert_hook  # type: ignore
+
     if args.interval > 0:
-        args.interval = max(0.1, args.interval)
+        args.interval = max(MIN_INTERVAL, args.interval)
         if args.json:
             sys.stderr.write("Error: --json and --interval/-i "
                              "can't be used together.\n")
             sys.exit(1)
 
-        loop_gpustat(**vars(args))
+        loop_gpustat(**vars(args), **watch_args, alerts=alerts)
     else:
         del args.interval  # type: ignore
-        print_gpustat(**vars(args))
+        print_gpustat(**vars(args), alerts=alerts)
+        if alerts is not None:
+            alerts.wait_hooks(timeout=10)
+            if alerts.firing:
+                sys.exit(ALERT_EXIT_CODE)
 
 
 if __name__ == '__main__':
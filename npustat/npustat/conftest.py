@@ -0,0 +1,131 @@
+"""
+Fixtures shared by the tests: a fake mbltml module and fake NPU records.
+"""
+# pylint: disable=redefined-outer-name
+
+import collections
+import types
+
+import pytest
+
+from npustat import npu
+
+MB = 1024 * 1024
+
+
+def core_info(cluster, core, npu_time, interval=1_000_000):
+    """A mbltmlCoreInfo_t; core -1 is the cluster's global core."""
+    return types.SimpleNamespace(
+        core_id=types.SimpleNamespace(
+            cluster=0x00010000 << cluster,
+            core=npu.CORE_GLOBAL if core < 0 else core + 1),
+        npu_time=npu_time, interval=interval)
+
+
+def process_info(pid, memory_mb, utilization):
+    return types.SimpleNamespace(
+        pid=pid, npu_memory_usage=memory_mb * MB, counts=1,
+        total_npu_time_us=int(utilization * 10_000),
+        total_interval_us=1_000_000)
+
+
+class FakeMbltml:
+    """Stands in for the mbltml module; counts every getter call.
+
+    Each device is a dict from getter suffix (e.g. 'Temperature' for
+    mbltmlGetTemperature) to its value. Missing getters raise, like an
+    unsupported mbltml call does.
+    """
+
+    MBLTML_DEVICE_ARIES = 0x1
+    MBLTML_DEVICE_REGULUS = 0x2
+    MBLTML_DEVICE_REGULUS_USB = 0x4
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.calls = collections.Counter()
+
+    def mbltmlGetDeviceCount(self):
+        return len(self.devices)
+
+    def mbltmlGetDriverVersion(self, device_type):
+        if device_type == self.MBLTML_DEVICE_ARIES:
+            return '1.13.0'
+        raise RuntimeError('not installed')
+
+    def mbltmlGetDriverRevision(self, device_type):
+        return 1
+
+    def __getattr__(self, name):
+        if not name.startswith('mbltmlGet'):
+            raise AttributeError(name)
+        key = name[len('mbltmlGet'):]
+
+        def _getter(dev_no):
+            self.calls[(dev_no, key)] += 1
+            device = self.devices[dev_no]
+            if key not in device:
+                raise RuntimeError(f'{name}: not supported')
+            return device[key]
+        return _getter
+
+
+def aries(index=0, utilization=8.0, temperature=46, memory_used=426,
+          cores=None, processes=None):
+    return {
+        'NodeName': f'/dev/aries{index}',
+        'DeviceType': 0x1,
+        'HardwareVersion': 0x3,
+        'FirmwareVersion': '1.1',
+        'FirmwareRevision': 0,
+        'FirmwareCRC': 0xFB9A5980,
+        'SignalType': 0,
+        'PcieGen': 4,
+        'PcieLanes': 8,
+        'Temperature': temperature,
+        'NPUClock': 1000,
+        'BusClock': 400,
+        'TotalPower': 16.7,
+        'TotalCurrent': 1.37,
+        'TotalVoltage': 12.18,
+        'ExtraPmicId': 0,
+        'ExtraPmicPower': 6.95,
+        'MemoryUsage': memory_used * MB,
+        'MemoryTotal': 16384 * MB,
+        'TotalUtilization': utilization,
+        'CoreInfos': cores if cores is not None else [
+            core_info(0, -1, 0), core_info(0, 0, 676_000),
+            core_info(0, 1, 0), core_info(1, -1, 0), core_info(1, 0, 0),
+        ],
+        'ProcessInfos': processes if processes is not None else [
+            process_info(0, 0, 0),  # empty slot of the binding
+        ],
+    }
+
+
+def regulus_usb(index=0):
+    device = aries(index)
+    device.update(NodeName=f'/dev/regulus{index}', DeviceType=0x4,
+                  HardwareVersion=0x2)
+    return device
+
+
+@pytest.fixture
+def fake_mbltml(monkeypatch):
+    """Installs a FakeMbltml with one Aries and one USB Regulus board."""
+    fake = FakeMbltml([aries(0), regulus_usb(1)])
+    monkeypatch.setattr(npu, 'mbltml', fake)
+    monkeypatch.setattr(npu, 'ensure_initialized', lambda: None)
+    monkeypatch.setattr(npu, '_lookup_process', lambda pid: {
+        'process_name': 'python', 'username': 'user1',
+        'full_command': ['python', 'serve.py']})
+    return fake
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
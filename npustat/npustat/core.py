@@ -5,9 +5,10 @@ Implementation of GPU statistics (based on gpustat)
 @url https://github.com/wookayin/gpustat
 """
 
+import copy
 import functools
 from typing import (TYPE_CHECKING, Any, Callable, Dict, Iterable, List,
-                    Optional, Sequence, Union, cast)
+                    Optional, Sequence, Tuple, Union, cast)
 
 try:
     from typing_extensions import TypedDict
@@ -17,11 +18,11 @@ except ModuleNotFoundError:
 # pyright: reportTypedDictNotRequiredAccess = false
 # pylint: disable=redefined-builtin
 
-import json
 import locale
 import os.path
 import platform
 import sys
+import threading
 import time
 from datetime import datetime
 from io import StringIO
@@ -30,6 +31,8 @@ import psutil
 from blessed import Terminal
 
 from npustat import util
+from npustat.history import History
+from npustat.serialize import check_finite
 from npustat import nvml
 from npustat.nvml import pynvml as N
 from npustat.nvml import check_driver_nvml_version
@@ -38,6 +41,7 @@ NOT_SUPPORTED = 'Not Supported'
 MB = 1024 * 1024
 
 DEFAULT_GPUNAME_WIDTH = 16
+MAX_EVENTS_SHOWN = 5
 
 IS_WINDOWS = 'windows' in platform.platform().lower()
 
@@ -50,6 +54,21 @@ Percentage = int
 Watts = int
 ProcessInfo = Dict[str, Any]
 
+# NvidiaGPUInfo entries that can be read through a single
+# nvmlDeviceGetFieldValues() round trip, as (field id, scope id) pairs.
+# Values are in milliwatts, like nvmlDeviceGetPowerUsage(); 'power.draw' is
+# the averaged reading that getter returns (about one second on Ampere and
+# later), not the noisier instant one. NVML defines no
+# field id for temperature, fan, memory or utilization; those keep their own
+# getters. Older pynvml lacks the constants, in which case nothing is batched.
+BATCHED_FIELD_IDS = {
+    key: (getattr(N, name), getattr(N, 'NVML_POWER_SCOPE_GPU', 0))
+    for key, name in (
+        ('power.draw', 'NVML_FI_DEV_POWER_AVERAGE'),
+        ('enforced.power.limit', 'NVML_FI_DEV_POWER_CURRENT_LIMIT'),
+    ) if hasattr(N, name)
+}
+
 # We use the same key/spec as `nvidia-smi --query-help-gpu`
 NvidiaGPUInfo = TypedDict('NvidiaGPUInfo', {
     'index': int,
@@ -210,6 +229,7 @@ class GPUStat:
                  show_fan_speed=None,
                  show_codec="",
                  show_power=None,
+                 show_process_util=False,
                  gpuname_width=None,
                  eol_char=os.linesep,
                  term=None,
@@ -295,7 +315,9 @@ class GPUStat:
 
         safe_self = cast(GPUStat, SafePropertyAccessor(self))
 
-        _write(f"[G{self.index}]", color=term.cyan)
+        # highlighted while an alert rule fires on the GPU
+        _write(f"[G{self.index}]", color=term.bold_white_on_red
+               if self.entry.get('alerts') else term.cyan)
         _write(" ")
 
         if gpuname_width is None or gpuname_width != 0:
@@ -311,6 +333,19 @@ class GPUStat:
 
         _write(rjustify(safe_self.utilization, 3), " %", color='CUtil')
 
+        # Peak of the sub-second samples since the last refresh (high-res mode)
+        if self.entry.get('utilization.gpu.max') is not None:
+            _write(" (max ", rjustify(self.entry['utilization.gpu.max'], 3),
+                   " %)", color='CUtil')
+
+        # Rolling averages, e.g. (1s/10s/60s:   8   7   5 %)
+        if self.entry.get('utilization.avg'):
+            avg = self.entry['utilization.avg']
+            _write(f" ({'/'.join(avg)}:", color='CUtil')
+            for value in avg.values():
+                _write(rjustify(f"{value:.0f}", 4), color='CUtil')
+            _write(" %)", color='CUtil')
+
         if show_codec:
             _write(" (")
             _sep = ''
@@ -326,6 +361,10 @@ class GPUStat:
         if show_power:
             _write(",  ")
             _write(rjustify(safe_self.power_draw, 3), color='CPowU')
+            # Peak of the sub-second samples since the last refresh
+            if self.entry.get('power.draw.max') is not None:
+                _write(" (max ", rjustify(self.entry['power.draw.max'], 3),
+                       ")", color='CPowU')
             if show_power is True or 'limit' in show_power:
                 _write(" / ")
                 _write(rjustify(safe_self.power_limit, 3), ' W', color='CPowL')
@@ -356,9 +395,14 @@ class GPUStat:
 
             if show_pid:
                 r += ("/%s" % _repr(p['pid'], '--'))
-            r += '({CMemP}{}M{C0})'.format(
+            r += '({CMemP}{}M{C0}'.format(
                 _repr(p['gpu_memory_usage'], '?'), **colors
             )
+            if show_process_util:
+                r += ', {CUtil}{}%{C0}'.format(
+                    _repr(p.get('gpu_utilization'), '??'), **colors
+                )
+            r += ')'
             return r
 
         def full_process_info(p: ProcessInfo):
@@ -394,11 +438,14 @@ class GPUStat:
         fp.write(''.join(reps))
         return fp
 
-    def jsonify(self):
+    def jsonify(self, non_finite: Optional[list] = None):
         o = self.entry.copy()
+        check_finite(o.values(), non_finite, self)
         if self.entry['processes'] is not None:
             o['processes'] = [{k: v for (k, v) in p.items() if k != 'gpu_uuid'}
                               for p in self.entry['processes']]
+            for p in o['processes']:
+                check_finite(p.values(), non_finite, self)
         return o
 
 
@@ -422,19 +469,140 @@ class InvalidGPU(GPUStat):
         return False
 
 
+class GPUSampleReader:
+    """Drains NVML's internal high-resolution sample buffers.
+
+    The driver samples utilization and power on its own, several times per
+    second, into ring buffers that nvmlDeviceGetSamples() reads from a given
+    timestamp on. Passing the last-seen timestamp reads every sample exactly
+    once, so a refresh costs one driver call per metric however fast the
+    driver samples and however slowly we poll. A new reader looks `window`
+    seconds back rather than draining the whole buffer.
+
+    With a `history`, every drained sample is also recorded there, as the
+    `utilization` and `power` series of the GPU key (e.g. ``G0``).
+    """
+
+    # metric name -> (nvmlSamplingType_t, scale to display unit)
+    SAMPLING_TYPES = {
+        'utilization': (N.NVML_GPU_UTILIZATION_SAMPLES, 1),
+        'power.draw': (N.NVML_TOTAL_POWER_SAMPLES, 0.001),  # mW -> W
+    }
+    # metric name -> series name in the History
+    HISTORY_METRICS = {'utilization': 'utilization', 'power.draw': 'power'}
+
+    def __init__(self, window: float = 1.0,
+                 clock: Callable[[], float] = time.time,
+                 history: Optional[History] = None):
+        self.window = window
+        self.clock = clock
+        self.history = history
+        self._last_seen: Dict[tuple, int] = {}
+        self._unsupported = set()
+
+    def drain(self, handle: NVMLHandle, key: str) -> Dict[str, list]:
+        """Read the samples taken since the last call, for GPU `key`.
+
+        Returns the new (timestamp, value) samples of each metric.
+        """
+        drained = {}
+        for metric, (sampling_type, scale) in self.SAMPLING_TYPES.items():
+            if (key, metric) in self._unsupported:
+                continue
+            last_seen = self._last_seen.get((key, metric))
+            if last_seen is None:
+                last_seen = max(int((self.clock() - self.window) * 1e6), 0)
+            try:
+                value_type, samples = N.nvmlDeviceGetSamples(
+                    handle, sampling_type, last_seen)
+            except N.NVMLError_NotFound:  # type: ignore
+                continue  # no new samples
+            except (N.NVMLError_NotSupported,  # type: ignore
+                    N.NVMLError_FunctionNotFound):  # type: ignore
+                self._unsupported.add((key, metric))
+                continue
+            except N.NVMLError:
+                continue
+
+            new_samples = []
+            for sample in samples:
+                if sample.timeStamp <= last_seen:
+                    continue
+                value = nvml.decode_value(sample.sampleValue, value_type)
+                if value is None:
+                    continue
+                # NVML timestamps are in microseconds since the epoch
+                new_samples.append((sample.timeStamp / 1e6, value * scale))
+                last_seen = max(last_seen, sample.timeStamp)
+
+            self._last_seen[(key, metric)] = last_seen
+            drained[metric] = new_samples
+            if self.history is not None:
+                self.history.record_many(key, self.HISTORY_METRICS[metric],
+                                         new_samples)
+        return drained
+
+
+class ProcessUtilizationReader:
+    """Per-process utilization samples of the GPUs, read incrementally.
+
+    nvmlDeviceGetProcessUtilization() returns the samples taken after a given
+    timestamp. Keep one reader across refreshes (e.g. in watch mode) and each
+    call only transfers what the driver recorded since the previous one; a
+    new reader looks `window` seconds back. A process with no sample in that
+    span was idle, and gets no entry.
+    """
+
+    def __init__(self, window: float = 1.0,
+                 clock: Callable[[], float] = time.time):
+        self.window = window
+        self.clock = clock
+        self._last_seen: Dict[str, int] = {}  # uuid -> microseconds
+
+    def read(self, handle: NVMLHandle, uuid: str
+             ) -> Dict[int, Tuple[int, int, int, int, int]]:
+        """The newest (timestamp, sm, mem, enc, dec) sample of each pid.
+
+        Raises NVMLError if the API is not supported.
+        """
+        last_seen = self._last_seen.get(uuid)
+        if last_seen is None:
+            last_seen = max(int((self.clock() - self.window) * 1e6), 0)
+        try:
+            samples = N.nvmlDeviceGetProcessUtilization(handle, last_seen)
+        except N.NVMLError_NotFound:  # type: ignore
+            samples = []  # nothing new since last_seen
+
+        latest: Dict[int, Tuple[int, int, int, int, int]] = {}
+        for sample in samples:
+            if sample.timeStamp <= last_seen:
+                continue
+            prev = latest.get(sample.pid)
+            if prev is None or sample.timeStamp >= prev[0]:
+                latest[sample.pid] = (sample.timeStamp, sample.smUtil,
+                                      sample.memUtil, sample.encUtil,
+                                      sample.decUtil)
+        self._last_seen[uuid] = max(
+            [last_seen] + [t for t, *_ in latest.values()])
+        return latest
+
+
 class GPUStatCollection(Sequence[GPUStat]):
 
     global_processes = {}
 
     def __init__(self,
                  gpu_list: Sequence[GPUStat],
-                 driver_version: Optional[str] = None):
+                 driver_version: Optional[str] = None,
+                 events: Optional[list] = None):
         self.gpus = list(gpu_list)
 
         # attach additional system information
         self.hostname = platform.node()
         self.query_time = datetime.now()
         self.driver_version = driver_version
+        # recent driver events (npustat.events.GPUEvent), if listened to
+        self.events = events
 
     @staticmethod
     def clean_processes():
@@ -443,11 +611,35 @@ class GPUStatCollection(Sequence[GPUStat]):
                 del GPUStatCollection.global_processes[pid]
 
     @staticmethod
-    def new_query(debug=False, id=None) -> 'GPUStatCollection':
-        """Query the information of all the GPUs on local machine"""
+    def new_query(debug=False, id=None, batch_fields=True,
+                  sample_reader: Optional[GPUSampleReader] = None,
+                  event_listener=None,
+                  process_reader: Optional[ProcessUtilizationReader] = None,
+                  ) -> 'GPUStatCollection':
+        """Query the information of all the GPUs on local machine
+
+        With `batch_fields` (the default), values that NVML can serve as
+        field values are read in a single nvmlDeviceGetFieldValues() call
+        per GPU instead of one driver call each (see BATCHED_FIELD_IDS).
+
+        With a `sample_reader`, the driver's high-resolution utilization and
+        power samples since the previous query (or, the first time, over the
+        reader's window) are drained, and their peaks are reported as
+        'utilization.gpu.max' and 'power.draw.max'.
+
+        With an `event_listener` (npustat.events.GPUEventListener), the
+        events it has recorded are attached as `events`.
+
+        With a `process_reader` kept across queries, the per-process
+        utilization covers the time since the previous query; without, the
+        last second.
+        """
+        if process_reader is None:
+            process_reader = ProcessUtilizationReader()
 
         nvml.ensure_initialized()
         log = util.DebugHelper()
+        query_start = time.perf_counter()
 
         def _decode(b: Union[str, bytes]) -> str:
             if isinstance(b, bytes):
@@ -501,6 +693,17 @@ class GPUStatCollection(Sequence[GPUStat]):
                 process['pid'] = nv_process.pid
                 return process
 
+            def get_process_utilization(uuid: str) -> Optional[Dict[int, tuple]]:
+                """Per-process utilization samples since the last refresh.
+
+                Returns None if the API is not supported.
+                """
+                try:
+                    return process_reader.read(handle, uuid)
+                except N.NVMLError as e:
+                    log.add_exception('nvmlDeviceGetProcessUtilization', e)
+                    return None
+
             def safenvml(fn):
                 @functools.wraps(fn)
                 def _wrapped(*args, **kwargs):
@@ -538,13 +741,30 @@ class GPUStatCollection(Sequence[GPUStat]):
             utilization = safenvml(N.nvmlDeviceGetDecoderUtilization)(handle)
             gpu_info['utilization.dec'] = utilization[0] if utilization is not None else None
 
-            # Power
-            power = safenvml(N.nvmlDeviceGetPowerUsage)(handle)
+            # Power: one nvmlDeviceGetFieldValues() round trip serves both
+            # values when supported, the per-value getters are the fallback.
+            batched = nvml.get_field_values(
+                handle, BATCHED_FIELD_IDS, device=gpu_info['uuid']) \
+                if batch_fields else {}
+
+            power = batched.get('power.draw')
+            if power is None:
+                power = safenvml(N.nvmlDeviceGetPowerUsage)(handle)
             gpu_info['power.draw'] = power // 1000 if power is not None else None
 
-            power_limit = safenvml(N.nvmlDeviceGetEnforcedPowerLimit)(handle)
+            power_limit = batched.get('enforced.power.limit')
+            if power_limit is None:
+                power_limit = safenvml(N.nvmlDeviceGetEnforcedPowerLimit)(handle)
             gpu_info['enforced.power.limit'] = power_limit // 1000 if power_limit is not None else None
 
+            # Sub-second peaks from the driver's sample buffers
+            if sample_reader is not None:
+                drained = sample_reader.drain(handle, 'G%d' % gpu_info['index'])
+                for entry_key, metric in (('utilization.gpu.max', 'utilization'),
+                                          ('power.draw.max', 'power.draw')):
+                    values = [v for _, v in drained.get(metric, [])]
+                    gpu_info[entry_key] = int(max(values)) if values else None
+
             # Processes
             nv_comp_processes = safenvml(N.nvmlDeviceGetComputeRunningProcesses)(handle)
             nv_graphics_processes = safenvml(N.nvmlDeviceGetGraphicsRunningProcesses)(handle)
@@ -579,6 +799,20 @@ class GPUStatCollection(Sequence[GPUStat]):
                         # FileNotFoundError is thrown in different situations.
                         pass
 
+                # Per-process SM/memory/encoder/decoder utilization. A pid with
+                # no sample since the last refresh has been idle meanwhile.
+                utilization_samples = get_process_utilization(gpu_info['uuid'])
+                for process in processes:
+                    sample = None
+                    if utilization_samples is not None:
+                        sample = utilization_samples.get(
+                            process['pid'], (0, 0, 0, 0, 0))
+                    for i, key in enumerate(('gpu_utilization',
+                                             'gpu_memory_utilization',
+                                             'enc_utilization',
+                                             'dec_utilization')):
+                        process[key] = sample[i + 1] if sample else None
+
                 # TODO: Do not block if full process info is not requested
                 time.sleep(0.1)
                 for process in processes:
@@ -628,8 +862,14 @@ class GPUStatCollection(Sequence[GPUStat]):
 
         if debug:
             log.report_summary()
+            sys.stderr.write("> GPU query took {:.1f} ms "
+                             "(batched field values: {})\n".format(
+                                 (time.perf_counter() - query_start) * 1000,
+                                 'on' if batch_fields else 'off'))
 
-        return GPUStatCollection(gpu_list, driver_version=driver_version)
+        events = event_listener.recent() if event_listener is not None else None
+        return GPUStatCollection(gpu_list, driver_version=driver_version,
+                                 events=events)
 
     def __len__(self):
         return len(self.gpus)
@@ -653,6 +893,7 @@ class GPUStatCollection(Sequence[GPUStat]):
                         show_cmd=False, show_full_cmd=False, show_user=False,
                         show_pid=False, show_fan_speed=None,
                         show_codec="", show_power=None,
+                        show_process_util=False,
                         gpuname_width=None, show_header=True,
                         no_processes=False,
                         eol_char=os.linesep,
@@ -713,6 +954,7 @@ class GPUStatCollection(Sequence[GPUStat]):
                        show_fan_speed=show_fan_speed,
                        show_codec=show_codec,
                        show_power=show_power,
+                       show_process_util=show_process_util,
                        gpuname_width=gpuname_width,
                        eol_char=eol_char,
                        term=t_color)
@@ -721,36 +963,54 @@ class GPUStatCollection(Sequence[GPUStat]):
         if len(self.gpus) == 0:
             print(t_color.yellow("(No GPUs are available)"))
 
+        # the latest few driver events, e.g. XID errors
+        for event in (self.events or [])[-MAX_EVENTS_SHOWN:]:
+            fp.write(t_color.bold_red(str(event)))
+            fp.write(eol_char)
+
         fp.flush()
 
-    def jsonify(self):
-        return {
+    def jsonify(self, non_finite: Optional[list] = None):
+        o = {
             'hostname': self.hostname,
             'driver_version': self.driver_version,
             'query_time': self.query_time,
-            "gpus": [g.jsonify() for g in self]
+            "gpus": [g.jsonify(non_finite) for g in self]
         }
+        if self.events is not None:
+            o['events'] = [e.jsonify() for e in self.events]
+        return o
 
-    def print_json(self, fp=sys.stdout):
-        def date_handler(obj):
-            if hasattr(obj, 'isoformat'):
-                return obj.isoformat()
-            else:
-                raise TypeError(type(obj))
-
-        o = self.jsonify()
-        json.dump(o, fp, indent=4, separators=(',', ': '),
-                  default=date_handler)
+    def print_json(self, fp=sys.stdout, compact=False):
+        from npustat import serialize
+        serialize.dump(serialize.gpu_output(self), fp,
+                       indent=None if compact else 4)
         fp.write(os.linesep)
         fp.flush()
 
 
-def new_query() -> GPUStatCollection:
+_gpu_memo = None
+_gpu_memo_lock = threading.Lock()
+
+
+def new_query(max_age: Optional[float] = None) -> GPUStatCollection:
     '''
     Obtain a new GPUStatCollection instance by querying nvidia-smi
     to get the list of GPUs and running process information.
+
+    With max_age, the collection of an earlier call (from any thread) taken
+    at most max_age seconds ago is returned instead, and threads calling
+    while a query is in flight wait for its result. Every caller gets its
+    own copy of the collection, free to modify.
     '''
-    return GPUStatCollection.new_query()
+    if max_age is None:
+        return GPUStatCollection.new_query()
+    global _gpu_memo
+    with _gpu_memo_lock:  # threads calling at once must share a single memo
+        if _gpu_memo is None:
+            from npustat.cache import Memo
+            _gpu_memo = Memo(GPUStatCollection.new_query, copy=copy.deepcopy)
+    return _gpu_memo.get(max_age)
 
 
 def gpu_count() -> int:
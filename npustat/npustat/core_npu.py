@@ -5,11 +5,13 @@ This module provides NPUStat and NPUStatCollection classes
 for displaying Mobilint NPU status in a format similar to gpustat.
 """
 
-import json
+import bisect
+import copy
 import locale
 import os
 import platform
 import sys
+import threading
 from datetime import datetime
 from io import StringIO
 from typing import Any, Dict, List, Optional, Sequence
@@ -17,6 +19,7 @@ from typing import Any, Dict, List, Optional, Sequence
 from blessed import Terminal
 
 from npustat import util
+from npustat.serialize import Layout, check_finite
 from npustat.npu import (
     NPUInfo, NPUProcess, NPUCore, NPUDriverVersions,
     query_npu_status, is_npu_available, npu_count
@@ -26,6 +29,17 @@ NOT_SUPPORTED = 'Not Supported'
 DEFAULT_NPUNAME_WIDTH = 20
 IS_WINDOWS = 'windows' in platform.platform().lower()
 
+# Cells of the core heatmap: (utilization upper bound, character, color).
+# The character height alone still reads as a heatmap without colors.
+HEATMAP_LEVELS = (
+    (0.0, '·', 'bold_black'),
+    (30.0, '▃', 'green'),
+    (60.0, '▅', 'bold_green'),
+    (85.0, '▇', 'yellow'),
+    (float('inf'), '█', 'bold_red'),
+)
+_HEATMAP_BOUNDS = [bound for bound, _, _ in HEATMAP_LEVELS]
+
 
 class NPUStat:
     """
@@ -34,6 +48,54 @@ class NPUStat:
     Wraps NPUInfo and provides formatted output methods.
     """
 
+    # The keys of jsonify(), in order, and the attributes of their values;
+    # "cores" and "processes" follow the scalar fields.
+    JSON_LAYOUT = Layout({
+        'index': 'index',
+        'name': 'name',
+        'node_name': 'node_name',
+        'chip': 'chip_name',
+        'firmware_version': 'firmware_version',
+        'firmware_revision': 'entry.firmware_revision',
+        'firmware_crc': 'firmware_crc_str',
+        'signal_type': 'signal_type_str',
+        'temperature': 'temperature',
+        'fan_duty': 'fan_duty',
+        'memory.used': 'memory_used',
+        'memory.total': 'memory_total',
+        'utilization': 'utilization',
+        'power.npu': 'power_npu',
+        'power.total': 'power_total',
+        'current.total': 'current_total',
+        'voltage.total': 'voltage_total',
+        'rail.name': 'extra_rail_name',
+        'rail.power': 'extra_rail_power',
+        'rail.current': 'entry.extra_rail_current',
+        'rail.voltage': 'entry.extra_rail_voltage',
+        'clock.npu': 'clock_npu',
+        'clock.bus': 'clock_bus',
+        'pcie': 'pcie',
+    })
+    CORE_JSON_LAYOUT = Layout({
+        'cluster': 'cluster',
+        'core': 'core',
+        'is_global': 'is_global',
+        'is_active': 'is_active',
+        'utilization': 'utilization',
+        'npu_time_us': 'npu_time_us',
+        'interval_us': 'interval_us',
+    })
+    PROCESS_JSON_LAYOUT = Layout({
+        'npu_index': 'npu_index',
+        'pid': 'pid',
+        'process_name': 'process_name',
+        'username': 'username',
+        'full_command': 'full_command',
+        'npu_memory': 'npu_memory',
+        'count': 'count',
+        'utilization': 'utilization',
+    })
+
     def __init__(self, entry: NPUInfo):
         if not isinstance(entry, NPUInfo):
             raise TypeError(
@@ -174,6 +236,55 @@ class NPUStat:
         """Returns the per-core usage records grouped by cluster."""
         return self.entry.clusters
 
+    @property
+    def field_ages(self) -> Dict[str, float]:
+        """Returns the age in seconds of each field group, if polled."""
+        return self.entry.field_ages
+
+    def core_heatmap(self, term=None) -> str:
+        """
+        Render the non-global cores as one cell each, clusters separated
+        by a space, in a single pass over the cores.
+
+        Args:
+            term: Terminal to color the cells with, or None for no colors
+
+        Returns:
+            The heatmap string
+        """
+        if term is not None:
+            palette = [getattr(term, color)(char)
+                       for _, char, color in HEATMAP_LEVELS]
+        else:
+            palette = [char for _, char, _ in HEATMAP_LEVELS]
+
+        cells = []
+        cluster = None
+        for core in sorted(self.cores, key=lambda c: (c.cluster, c.core)):
+            if core.is_global:
+                continue
+            if cluster is not None and core.cluster != cluster:
+                cells.append(' ')
+            cluster = core.cluster
+            cells.append(palette[bisect.bisect_left(_HEATMAP_BOUNDS,
+                                                    core.utilization)])
+        return ''.join(cells)
+
+    @property
+    def averages(self) -> Dict[str, Dict[str, float]]:
+        """Returns the rolling utilization averages, if tracked."""
+        return self.entry.averages
+
+    @property
+    def alerts(self) -> List[str]:
+        """Returns the alert rules firing on this NPU, if evaluated."""
+        return self.entry.alerts
+
+    @property
+    def lease(self):
+        """Returns the advisory lease (npustat.lease.Lease) on this NPU."""
+        return self.entry.lease
+
     def print_to(self, fp, *,
                  with_colors=True,
                  show_cmd=False,
@@ -182,10 +293,12 @@ class NPUStat:
                  show_user=False,
                  show_pid=False,
                  show_power=None,
+                 show_process_util=False,
                  show_clock=False,
                  show_fan_speed=False,
                  show_extra=False,
                  show_core_status=True,
+                 show_core_heatmap=False,
                  npuname_width=None,
                  eol_char=os.linesep,
                  term=None,
@@ -202,10 +315,13 @@ class NPUStat:
             show_user: Show username of running processes
             show_pid: Show PID of running processes
             show_power: Show power consumption
+            show_process_util: Show NPU utilization of running processes
             show_clock: Show clock frequencies
             show_fan_speed: Show fan duty cycle
             show_extra: Show chip/firmware/PCIe/rail details on an extra line
             show_core_status: Show per-cluster, per-core utilization
+            show_core_heatmap: Show the cores as one row of colored cells
+                on the device line instead of one line per cluster
             npuname_width: Width for NPU name column
             eol_char: End of line character
             term: Terminal instance for color output
@@ -246,6 +362,8 @@ class NPUStat:
         colors['CExtra'] = term.bold_black
         colors['CCmd'] = term.color(24)
         colors['CNPU'] = term.bold_magenta  # NPU 구분용 색상
+        if self.alerts:
+            colors['CNPU'] = term.bold_white_on_red
 
         if not with_colors:
             for k in list(colors.keys()):
@@ -290,6 +408,14 @@ class NPUStat:
         # Utilization (integer to match GPU format)
         _write(rjustify(int(self.utilization), 3), " %", color='CUtil')
 
+        # Rolling averages, e.g. (1s/10s/60s:   8   7   5 %)
+        if self.averages.get('utilization'):
+            avg = self.averages['utilization']
+            _write(f" ({'/'.join(avg)}:", color='CUtil')
+            for value in avg.values():
+                _write(rjustify(f"{value:.0f}", 4), color='CUtil')
+            _write(" %)", color='CUtil')
+
         # Power. The per-rail reading is only available while that rail is the
         # selected extra PMIC rail, so it is shown next to the total draw only
         # when the NPU rail happens to be the live one.
@@ -314,6 +440,12 @@ class NPUStat:
         _write(rjustify(self.memory_total, 5), color='CMemT')
         _write(" MB")
 
+        # Core heatmap, on the device line itself
+        show_heatmap = show_core_status and show_core_heatmap and self.cores
+        if show_heatmap:
+            _write(" | ")
+            reps.append(self.core_heatmap(term if with_colors else None))
+
         # Add " |" only if processes information is to be added
         if not no_processes:
             _write(" |")
@@ -334,8 +466,15 @@ class NPUStat:
                     _write(_repr(p.username, p.process_name), color='CUser')
                 _write('(', color='C0')
                 _write(f"{p.npu_memory}M", color='CMemP')
+                if show_process_util:
+                    _write(', ', color='C0')
+                    _write(f"{p.utilization:.0f}%", color='CUtil')
                 _write(')', color='C0')
 
+        # Advisory lease (npustat lease)
+        if self.lease is not None:
+            _write(f" [leased: {self.lease}]", color='CUser')
+
         # Chip / firmware / PCIe / rail details
         if show_extra:
             _write(eol_char)
@@ -355,7 +494,7 @@ class NPUStat:
             _write("    ├─ " + " | ".join(extra), color='CExtra')
 
         # Show per-cluster, per-core utilization
-        if show_core_status and self.cores:
+        if show_core_status and self.cores and not show_heatmap:
             clusters = self.clusters
             for cluster_idx in sorted(clusters):
                 _write(eol_char)
@@ -370,59 +509,35 @@ class NPUStat:
         fp.write(''.join(reps))
         return fp
 
-    def jsonify(self) -> Dict[str, Any]:
-        """Convert to JSON-serializable dictionary."""
-        return {
-            'index': self.index,
-            'name': self.name,
-            'node_name': self.node_name,
-            'chip': self.chip_name,
-            'firmware_version': self.firmware_version,
-            'firmware_revision': self.entry.firmware_revision,
-            'firmware_crc': self.firmware_crc_str,
-            'signal_type': self.signal_type_str,
-            'temperature': self.temperature,
-            'fan_duty': self.fan_duty,
-            'memory.used': self.memory_used,
-            'memory.total': self.memory_total,
-            'utilization': self.utilization,
-            'power.npu': self.power_npu,
-            'power.total': self.power_total,
-            'current.total': self.current_total,
-            'voltage.total': self.voltage_total,
-            'rail.name': self.extra_rail_name,
-            'rail.power': self.extra_rail_power,
-            'rail.current': self.entry.extra_rail_current,
-            'rail.voltage': self.entry.extra_rail_voltage,
-            'clock.npu': self.clock_npu,
-            'clock.bus': self.clock_bus,
-            'pcie': self.pcie,
-            'cores': [
-                {
-                    'cluster': core.cluster,
-                    'core': core.core,
-                    'is_global': core.is_global,
-                    'is_active': core.is_active,
-                    'utilization': core.utilization,
-                    'npu_time_us': core.npu_time_us,
-                    'interval_us': core.interval_us,
-                }
-                for core in self.cores
-            ],
-            'processes': [
-                {
-                    'npu_index': p.npu_index,
-                    'pid': p.pid,
-                    'process_name': p.process_name,
-                    'username': p.username,
-                    'full_command': p.full_command,
-                    'npu_memory': p.npu_memory,
-                    'count': p.count,
-                    'utilization': p.utilization,
-                }
-                for p in self.processes
-            ]
-        }
+    def jsonify(self, non_finite: Optional[list] = None) -> Dict[str, Any]:
+        """Convert to JSON-serializable dictionary.
+
+        Args:
+            non_finite: If given, gets the objects with NaN or infinite
+                values appended (see serialize.check_finite)
+        """
+        o = self.JSON_LAYOUT.build(self, non_finite)
+        averages = self.averages
+        cores = []
+        for core in self.cores:
+            c = self.CORE_JSON_LAYOUT.build(core, non_finite)
+            if core.label in averages:
+                c['utilization.avg'] = averages[core.label]
+                check_finite(averages[core.label].values(), non_finite, core)
+            cores.append(c)
+        o['cores'] = cores
+        o['processes'] = [self.PROCESS_JSON_LAYOUT.build(p, non_finite)
+                          for p in self.processes]
+        if self.field_ages:
+            o['field_ages'] = dict(self.field_ages)
+        if averages.get('utilization'):
+            o['utilization.avg'] = dict(averages['utilization'])
+            check_finite(o['utilization.avg'].values(), non_finite, self)
+        if self.alerts:
+            o['alerts'] = list(self.alerts)
+        if self.lease is not None:
+            o['lease'] = self.lease.jsonify()
+        return o
 
 
 class NPUStatCollection(Sequence[NPUStat]):
@@ -441,12 +556,18 @@ class NPUStatCollection(Sequence[NPUStat]):
         self.driver_versions = driver_versions or NPUDriverVersions()
 
     @staticmethod
-    def new_query(debug=False) -> 'NPUStatCollection':
+    def new_query(debug=False, poller=None,
+                  leases=False) -> 'NPUStatCollection':
         """
         Query the information of all NPUs on local machine.
 
         Args:
             debug: Enable debug output
+            poller: An npustat.policy.NPUPoller to read the devices with,
+                so that field groups not yet due reuse their last value
+            leases: Attach the advisory lease of each NPU (npustat lease),
+                as displayed; stale leases are left for `npustat lease` to
+                reclaim
 
         Returns:
             NPUStatCollection with all NPU stats
@@ -457,11 +578,19 @@ class NPUStatCollection(Sequence[NPUStat]):
                 or simply means "GPU only" (the default mode).
         """
         try:
-            npus, drivers = query_npu_status()
+            npus, drivers = poller.poll() if poller else query_npu_status()
         except RuntimeError as e:
             if debug:
                 print(f"NPU query error: {e}", file=sys.stderr)
             raise
+        if leases:
+            try:
+                from npustat.lease import list_leases
+                held = list_leases(reclaim=False)
+            except Exception:  # pylint: disable=broad-exception-caught
+                held = {}  # leases are advisory; never fail a query over them
+            for npu in npus:
+                npu.lease = held.get(npu.index)
         npu_stats = [NPUStat(npu) for npu in npus]
         return NPUStatCollection(npu_stats, driver_versions=drivers)
 
@@ -495,9 +624,10 @@ class NPUStatCollection(Sequence[NPUStat]):
     def print_formatted(self, fp=sys.stdout, *,
                         force_color=False, no_color=False,
                         show_cmd=False, show_full_cmd=False, show_user=False,
-                        show_pid=False, show_power=None, show_clock=False,
+                        show_pid=False, show_power=None,
+                        show_process_util=False, show_clock=False,
                         show_fan_speed=False, show_extra=False,
-                        show_core_status=True,
+                        show_core_status=True, show_core_heatmap=False,
                         npuname_width=None, show_header=True,
                         no_processes=False,
                         eol_char=os.linesep,
@@ -514,10 +644,12 @@ class NPUStatCollection(Sequence[NPUStat]):
             show_user: Show username
             show_pid: Show process IDs
             show_power: Show power consumption
+            show_process_util: Show NPU utilization of running processes
             show_clock: Show clock frequencies
             show_fan_speed: Show fan duty cycle
             show_extra: Show chip/firmware/PCIe/rail details
             show_core_status: Show per-cluster, per-core utilization
+            show_core_heatmap: Show the cores as a heatmap row per device
             npuname_width: Width for NPU name column
             show_header: Show header line
             no_processes: Hide process information
@@ -568,10 +700,12 @@ class NPUStatCollection(Sequence[NPUStat]):
                        show_user=show_user,
                        show_pid=show_pid,
                        show_power=show_power,
+                       show_process_util=show_process_util,
                        show_clock=show_clock,
                        show_fan_speed=show_fan_speed,
                        show_extra=show_extra,
                        show_core_status=show_core_status,
+                       show_core_heatmap=show_core_heatmap,
                        npuname_width=npuname_width,
                        eol_char=eol_char,
                        term=t_color)
@@ -579,8 +713,8 @@ class NPUStatCollection(Sequence[NPUStat]):
 
         fp.flush()
 
-    def jsonify(self) -> Dict[str, Any]:
-        """Convert to JSON-serializable dictionary."""
+    def jsonify(self, non_finite: Optional[list] = None) -> Dict[str, Any]:
+        """Convert to JSON-serializable dictionary; see NPUStat.jsonify()."""
         return {
             'hostname': self.hostname,
             'query_time': self.query_time,
@@ -589,28 +723,40 @@ class NPUStatCollection(Sequence[NPUStat]):
                 'regulus': self.driver_versions.regulus,
                 'regulus_usb': self.driver_versions.regulus_usb,
             },
-            'npus': [n.jsonify() for n in self]
+            'npus': [n.jsonify(non_finite) for n in self]
         }
 
-    def print_json(self, fp=sys.stdout):
-        """Print NPU stats as JSON."""
-        def date_handler(obj):
-            if hasattr(obj, 'isoformat'):
-                return obj.isoformat()
-            raise TypeError(type(obj))
-
-        o = self.jsonify()
-        json.dump(o, fp, indent=4, separators=(',', ': '),
-                  default=date_handler)
+    def print_json(self, fp=sys.stdout, compact=False):
+        """Print NPU stats as JSON, on a single line if compact."""
+        from npustat import serialize
+        serialize.dump(serialize.npu_output(self), fp,
+                       indent=None if compact else 4)
         fp.write(os.linesep)
         fp.flush()
 
 
-def new_npu_query() -> NPUStatCollection:
+_npu_memo = None
+_npu_memo_lock = threading.Lock()
+
+
+def new_npu_query(max_age: Optional[float] = None) -> NPUStatCollection:
     """
     Obtain a new NPUStatCollection instance by querying mbltml.
 
+    Args:
+        max_age: If given, return the collection of an earlier call (from
+            any thread) taken at most max_age seconds ago instead; threads
+            calling while a query is in flight wait for its result. Every
+            caller gets its own copy of the collection, free to modify.
+
     Returns:
         NPUStatCollection with current NPU stats
     """
-    return NPUStatCollection.new_query()
+    if max_age is None:
+        return NPUStatCollection.new_query()
+    global _npu_memo
+    with _npu_memo_lock:  # threads calling at once must share a single memo
+        if _npu_memo is None:
+            from npustat.cache import Memo
+            _npu_memo = Memo(NPUStatCollection.new_query, copy=copy.deepcopy)
+    return _npu_memo.get(max_age)
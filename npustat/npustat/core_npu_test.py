@@ -0,0 +1,37 @@
+import subprocess
+import sys
+from io import StringIO
+
+import pytest
+
+from npustat.conftest import aries, core_info
+from npustat.core_npu import NPUStatCollection
+
+
+def test_import_without_fcntl():
+    # as on Windows: the POSIX-only modules are only imported when used
+    code = ("import sys; sys.modules['fcntl'] = None; import npustat; "
+            "assert 'npustat.shm' not in sys.modules; npustat.pick_devices")
+    subprocess.run([sys.executable, '-W', 'ignore', '-c', code], check=True)
+
+
+def test_core_heatmap(fake_mbltml):
+    fake_mbltml.devices[:] = [aries(0, cores=[
+        core_info(1, 0, 100_000),  # cores may come in any order
+        core_info(0, -1, 500_000),
+        core_info(0, 0, 0), core_info(0, 1, 450_000),
+        core_info(0, 2, 700_000), core_info(0, 3, 990_000),
+    ])]
+    stats = NPUStatCollection.new_query()
+    assert stats[0].core_heatmap() == '·▅▇█ ▃'
+
+    fp = StringIO()
+    stats.print_formatted(fp, no_color=True, show_header=False,
+                          show_core_heatmap=True)
+    lines = fp.getvalue().splitlines()
+    assert len(lines) == 1  # one row per device
+    assert lines[0].endswith('MB | ·▅▇█ ▃ |')
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
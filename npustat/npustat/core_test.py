@@ -0,0 +1,138 @@
+import sys
+import types
+from collections import namedtuple
+
+import psutil
+import pytest
+from mockito import mock, unstub, verify, when
+
+import npustat
+from npustat import nvml
+from npustat.core import (GPUSampleReader, GPUStatCollection,
+                          ProcessUtilizationReader)
+from npustat.history import History
+from npustat.nvml import pynvml as N
+
+MB = 1024 * 1024
+
+mock_handle = types.SimpleNamespace(value='mock-handle-0', index=0)
+mock_memory_t = namedtuple('Memory_t', ['total', 'used'])
+mock_utilization_t = namedtuple('Utilization_t', ['gpu', 'memory'])
+mock_process_t = namedtuple('Process_t', ['pid', 'usedGpuMemory'])
+mock_value_t = namedtuple('Value_t', ['uiVal'])
+mock_nvml_sample_t = namedtuple('nvmlSample_t', ['timeStamp', 'sampleValue'])
+mock_sample_t = namedtuple('Sample_t', ['pid', 'timeStamp', 'smUtil',
+                                        'memUtil', 'encUtil', 'decUtil'])
+
+
+@pytest.fixture
+def single_gpu():
+    """A single mocked GPU running one process (pid 4242)."""
+    N.NVMLError.__hash__ = lambda _: 0
+    nvml._initialized = True
+    nvml._has_field_values = False
+
+    when(N).nvmlSystemGetDriverVersion().thenReturn('535.104.05')
+    when(N).nvmlDeviceGetCount().thenReturn(1)
+    when(N).nvmlDeviceGetHandleByIndex(0).thenReturn(mock_handle)
+    when(N).nvmlDeviceGetIndex(mock_handle).thenReturn(0)
+    when(N).nvmlDeviceGetName(mock_handle).thenReturn(b'Mock GPU')
+    when(N).nvmlDeviceGetUUID(mock_handle).thenReturn(b'GPU-mock-0')
+    when(N).nvmlDeviceGetTemperature(mock_handle, N.NVML_TEMPERATURE_GPU)\
+        .thenReturn(50)
+    when(N).nvmlDeviceGetFanSpeed(mock_handle).thenReturn(30)
+    when(N).nvmlDeviceGetMemoryInfo(mock_handle)\
+        .thenReturn(mock_memory_t(total=16000 * MB, used=4000 * MB))
+    when(N).nvmlDeviceGetUtilizationRates(mock_handle)\
+        .thenReturn(mock_utilization_t(gpu=40, memory=10))
+    when(N).nvmlDeviceGetEncoderUtilization(mock_handle).thenReturn([0, 0])
+    when(N).nvmlDeviceGetDecoderUtilization(mock_handle).thenReturn([0, 0])
+    when(N).nvmlDeviceGetPowerUsage(mock_handle).thenReturn(100000)
+    when(N).nvmlDeviceGetEnforcedPowerLimit(mock_handle).thenReturn(250000)
+    when(N).nvmlDeviceGetComputeRunningProcesses(mock_handle)\
+        .thenReturn([mock_process_t(4242, 4000 * MB)])
+    when(N).nvmlDeviceGetGraphicsRunningProcesses(mock_handle).thenReturn([])
+
+    p = mock(strict=False)
+    p.username = lambda: 'user1'
+    p.cmdline = lambda: ['python']
+    p.cpu_percent = lambda: 0.0
+    p.memory_percent = lambda: 0.0
+    when(psutil).Process(...).thenReturn(p)
+    when(psutil).pid_exists(...).thenReturn(True)
+    when(psutil).virtual_memory()\
+        .thenReturn(mock_memory_t(total=8 * 1024 * MB, used=0))
+    when(npustat.core.time).sleep(...).thenReturn(None)
+
+    yield mock_handle
+    unstub()
+
+
+def test_process_utilization_incremental(single_gpu):
+    handle = single_gpu
+    reader = ProcessUtilizationReader(window=1.0, clock=lambda: 10.0)
+    # a new reader looks one second back
+    when(N).nvmlDeviceGetProcessUtilization(handle, 9_000_000).thenReturn([
+        mock_sample_t(4242, 9_100_000, 30, 5, 0, 0),
+        mock_sample_t(4242, 9_200_000, 70, 8, 1, 2),
+    ])
+    when(N).nvmlDeviceGetProcessUtilization(handle, 9_200_000)\
+        .thenRaise(N.NVMLError(N.NVML_ERROR_NOT_FOUND))
+
+    p = GPUStatCollection.new_query(process_reader=reader)[0].processes[0]
+    assert p['gpu_utilization'] == 70  # the newest sample wins
+    assert p['gpu_memory_utilization'] == 8
+    assert (p['enc_utilization'], p['dec_utilization']) == (1, 2)
+
+    # the next query only asks for samples newer than the last one seen;
+    # a process without any has been idle since.
+    p = GPUStatCollection.new_query(process_reader=reader)[0].processes[0]
+    assert p['gpu_utilization'] == 0
+    assert p['gpu_memory_utilization'] == 0
+
+
+def test_process_utilization_not_supported(single_gpu):
+    when(N).nvmlDeviceGetProcessUtilization(...)\
+        .thenRaise(N.NVMLError(N.NVML_ERROR_NOT_SUPPORTED))
+
+    p = GPUStatCollection.new_query()[0].processes[0]
+    assert p['gpu_utilization'] is None
+
+
+def test_sample_reader_drains_incrementally(single_gpu):
+    handle = single_gpu
+    uint = N.NVML_VALUE_TYPE_UNSIGNED_INT
+    when(N).nvmlDeviceGetSamples(...)\
+        .thenRaise(N.NVMLError(N.NVML_ERROR_NOT_FOUND))
+    when(N).nvmlDeviceGetSamples(handle, N.NVML_GPU_UTILIZATION_SAMPLES, 0)\
+        .thenReturn((uint, [mock_nvml_sample_t(1_000_000, mock_value_t(10)),
+                            mock_nvml_sample_t(1_200_000, mock_value_t(95)),
+                            mock_nvml_sample_t(1_400_000, mock_value_t(20))]))
+    when(N).nvmlDeviceGetSamples(handle, N.NVML_TOTAL_POWER_SAMPLES, 0)\
+        .thenReturn((uint, [mock_nvml_sample_t(1_100_000, mock_value_t(180000))]))
+    when(N).nvmlDeviceGetSamples(handle, N.NVML_GPU_UTILIZATION_SAMPLES,
+                                 1_400_000)\
+        .thenReturn((uint, [mock_nvml_sample_t(1_600_000, mock_value_t(50))]))
+    when(N).nvmlDeviceGetProcessUtilization(...).thenReturn([])
+
+    # one second back from 1.0 s: the first call drains from timestamp 0
+    history = History()
+    reader = GPUSampleReader(window=1.0, clock=lambda: 1.0, history=history)
+    g = GPUStatCollection.new_query(sample_reader=reader)[0]
+    assert g['utilization.gpu.max'] == 95  # a burst between two polls
+    assert g['power.draw.max'] == 180
+
+    g = GPUStatCollection.new_query(sample_reader=reader)[0]
+    assert g['utilization.gpu.max'] == 50
+    assert g['power.draw.max'] is None
+
+    # every sub-second sample reaches the time series, each exactly once
+    assert list(history.series('G0', 'utilization')) == \
+        [(1.0, 10.0), (1.2, 95.0), (1.4, 20.0), (1.6, 50.0)]
+    assert list(history.series('G0', 'power')) == [(1.1, 180.0)]
+    verify(N, times=0).nvmlDeviceGetSamples(
+        handle, N.NVML_MEMORY_UTILIZATION_SAMPLES, ...)
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
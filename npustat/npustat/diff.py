@@ -0,0 +1,210 @@
+"""
+``npustat stream``: repeated snapshots as a full keyframe, then JSON Patches.
+
+Consumers polling ``npustat --json`` re-transfer and re-parse the static
+fields (chip, firmware, PCIe) and every unchanged core on each tick. The
+stream instead writes one JSON object per line:
+
+    {"seq": 0, "snapshot": {...}}           a keyframe: the whole document
+    {"seq": 1, "patch": [{"op": ...}, ...]}  an RFC 6902 patch to the previous
+
+so a tick costs bytes in proportion to what changed. A keyframe is written
+again every `keyframe` ticks, letting consumers that joined late or missed a
+line (a gap in ``seq``) resynchronize.
+
+In the streamed document, the lists of the ``--json`` output are objects
+keyed by what identifies their entries: devices by index, NPU cores by label
+(``C0/G``, escaped as ``C0~1G`` in patch paths) and processes by PID. A
+device, core or process that appears or goes away is then a single ``add``
+or ``remove``, and the paths of the others never shift.
+"""
+
+import argparse
+import functools
+import sys
+from typing import Any, Dict, List, Optional
+
+from npustat import serialize
+from npustat.scheduler import FixedRateScheduler
+
+# Ticks between two keyframes, by default.
+DEFAULT_KEYFRAME = 60
+
+
+def _keyed(entries: Optional[List[Dict[str, Any]]], key) -> Any:
+    if entries is None:
+        return None
+    return {key(e): e for e in entries}
+
+
+def _core_key(core: Dict[str, Any]) -> str:
+    # as NPUCore.label
+    return f"C{core['cluster']}/" + \
+        ('G' if core['is_global'] else f"c{core['core']}")
+
+
+def _pid_key(process: Dict[str, Any]) -> str:
+    return str(process['pid'])
+
+
+def document(gpu_stats=None, npu_stats=None) -> Dict[str, Any]:
+    """The streamed document of a snapshot: ``--json`` output, keyed."""
+    doc: Dict[str, Any] = {}
+    if gpu_stats:
+        gpu = serialize.gpu_output(gpu_stats)
+        gpu['gpus'] = {
+            str(g['index']): dict(g, processes=_keyed(g['processes'],
+                                                      _pid_key))
+            for g in gpu['gpus']}
+        doc['gpu'] = gpu
+    if npu_stats and len(npu_stats) > 0:
+        npu = serialize.npu_output(npu_stats)
+        npu['npus'] = {
+            str(n['index']): dict(n, cores=_keyed(n['cores'], _core_key),
+                                  processes=_keyed(n['processes'], _pid_key))
+            for n in npu['npus']}
+        doc['npu'] = npu
+    return doc
+
+
+def _escape(key: str) -> str:
+    """A JSON Pointer reference token (RFC 6901)."""
+    return key.replace('~', '~0').replace('/', '~1')
+
+
+def diff(old: Dict[str, Any], new: Dict[str, Any],
+         path: str = '') -> List[Dict[str, Any]]:
+    """The RFC 6902 operations turning the object `old` into `new`.
+
+    Objects are compared key by key, recursively; any other value (lists
+    included) is replaced as a whole when it changed.
+    """
+    ops: List[Dict[str, Any]] = []
+    for key in old:
+        if key not in new:
+            ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+    for key, value in new.items():
+        pointer = f'{path}/{_escape(key)}'
+        if key not in old:
+            ops.append({'op': 'add', 'path': pointer, 'value': value})
+            continue
+        before = old[key]
+        if isinstance(before, dict) and isinstance(value, dict):
+            ops.extend(diff(before, value, pointer))
+        elif before != value or type(before) is not type(value):
+            ops.append({'op': 'replace', 'path': pointer, 'value': value})
+    return ops
+
+
+def apply(doc: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply the add, remove and replace operations of diff() in place.
+
+    Enough for a Python consumer of the stream; any RFC 6902 library works
+    as well.
+    """
+    for op in ops:
+        tokens = [t.replace('~1', '/').replace('~0', '~')
+                  for t in op['path'].split('/')[1:]]
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[token]
+        if op['op'] == 'remove':
+            del parent[tokens[-1]]
+        elif op['op'] in ('add', 'replace'):
+            parent[tokens[-1]] = op['value']
+        else:
+            raise ValueError(f"Unsupported operation: {op['op']}")
+    return doc
+
+
+class PatchStream:
+    """Turns successive documents into keyframe and patch messages.
+
+    Usage:
+        stream = PatchStream(keyframe=60)
+        for snapshot in snapshots:
+            message = stream.encode(document(...))
+    """
+
+    def __init__(self, keyframe: int = DEFAULT_KEYFRAME):
+        if keyframe < 1:
+            raise ValueError('keyframe must be at least 1')
+        self.keyframe = keyframe
+        self.seq = 0
+        self._last: Optional[Dict[str, Any]] = None
+
+    def encode(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """The message of the next tick: {'seq', 'snapshot' or 'patch'}."""
+        seq, last = self.seq, self._last
+        self.seq += 1
+        self._last = doc
+        if last is None or seq % self.keyframe == 0:
+            return {'seq': seq, 'snapshot': doc}
+        return {'seq': seq, 'patch': diff(last, doc)}
+
+
+def main(argv: List[str]) -> int:
+    """Entry point of ``npustat stream``; argv[0] is the subcommand name."""
+    parser = argparse.ArgumentParser(
+        'npustat stream',
+        description='Write the device stats as JSON lines: a full snapshot, '
+                    'then at every tick a JSON Patch (RFC 6902) of what '
+                    'changed, with a full snapshot again every KEYFRAME '
+                    'ticks.')
+    parser.add_argument('-i', '--interval', type=float, default=1.0,
+                        help='Seconds between ticks (default: 1)')
+    parser.add_argument('--keyframe', type=int, default=DEFAULT_KEYFRAME,
+                        metavar='TICKS',
+                        help='Ticks between two full snapshots '
+                             f'(default: {DEFAULT_KEYFRAME})')
+    parser.add_argument('-n', '--count', type=int, default=None,
+                        help='Stop after COUNT ticks (default: never)')
+    parser.add_argument('--avg', dest='averages', nargs='?',
+                        const='1s,10s,60s', default=None, metavar='WINDOWS',
+                        help='Add load-average style rolling utilization '
+                             'over the given windows as "utilization.avg" '
+                             '(default: 1s,10s,60s)')
+    family = parser.add_mutually_exclusive_group()
+    family.add_argument('--no-gpu', dest='gpu', action='store_false')
+    family.add_argument('--no-npu', dest='npu', action='store_false')
+    args = parser.parse_args(argv[1:])
+    if args.interval <= 0:
+        parser.error('--interval must be positive')
+    if args.keyframe < 1:
+        parser.error('--keyframe must be at least 1')
+    observers = []
+    if args.averages is not None:
+        from npustat.rolling import RollingAverages
+        try:
+            observers.append(RollingAverages.parse(args.averages).observe)
+        except ValueError as e:
+            parser.error(f'--avg: {e}')
+
+    from npustat.core import GPUStatCollection
+    from npustat.core_npu import NPUStatCollection
+    from npustat.policy import NPUPoller
+    from npustat.sampler import Sampler
+
+    npu_query = None
+    if args.npu:
+        # static fields are read once per device (see policy.DEFAULT_POLICY)
+        npu_query = functools.partial(NPUStatCollection.new_query,
+                                      poller=NPUPoller())
+    sampler = Sampler(args.interval,
+                      gpu_query=GPUStatCollection.new_query if args.gpu
+                      else None,
+                      npu_query=npu_query, observers=observers)
+    stream = PatchStream(args.keyframe)
+    scheduler = FixedRateScheduler(args.interval)
+    try:
+        while args.count is None or stream.seq < args.count:
+            scheduler.wait()
+            snapshot = sampler.sample()
+            message = stream.encode(document(snapshot.gpu_stats,
+                                             snapshot.npu_stats))
+            sys.stdout.write(serialize.dumps(message))
+            sys.stdout.write('\n')
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    return 0
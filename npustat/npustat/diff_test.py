@@ -0,0 +1,113 @@
+import copy
+import json
+import sys
+from datetime import datetime
+
+import pytest
+
+from npustat import cli
+from npustat.conftest import aries, core_info, process_info
+from npustat.core_npu import NPUStatCollection
+from npustat.diff import PatchStream, apply, diff, document
+
+
+def _document():
+    return document(npu_stats=NPUStatCollection.new_query())
+
+
+def test_diff_roundtrip():
+    old = {'a': 1, 'b': {'c/d': [1, 2], 'e~': 'x'}, 'gone': None}
+    new = {'a': 1, 'b': {'c/d': [1, 3], 'e~': 'y', 'f': {}}, 'new': 2}
+    ops = diff(old, new)
+    assert {'op': 'replace', 'path': '/b/c~1d', 'value': [1, 3]} in ops
+    assert {'op': 'replace', 'path': '/b/e~0', 'value': 'y'} in ops
+    assert {'op': 'remove', 'path': '/gone'} in ops
+    assert apply(copy.deepcopy(old), ops) == new
+    assert diff(new, new) == []
+    # 0 == False and 1 == 1.0 in Python, not in JSON
+    assert diff({'x': 0}, {'x': False}) != []
+
+
+def test_keyed_by_device_core_and_pid(fake_mbltml):
+    fake_mbltml.devices[0] = aries(0, cores=[
+        core_info(0, -1, 100_000), core_info(0, 0, 200_000)],
+        processes=[process_info(1234, 300, 10)])
+    old = _document()
+    npu = old['npu']['npus']['0']
+    assert set(npu['cores']) == {'C0/G', 'C0/c0'}
+    assert set(npu['processes']) == {'1234'}
+
+    fake_mbltml.devices[0] = aries(0, cores=[
+        core_info(0, -1, 100_000), core_info(0, 0, 500_000)],
+        processes=[process_info(1234, 300, 10), process_info(99, 10, 1)])
+    new = _document()
+    ops = [op for op in diff(old, new) if op['path'] != '/npu/query_time']
+    assert ops == [
+        {'op': 'replace', 'path': '/npu/npus/0/cores/C0~1c0/utilization',
+         'value': 50.0},
+        {'op': 'replace', 'path': '/npu/npus/0/cores/C0~1c0/npu_time_us',
+         'value': 500_000},
+        {'op': 'add', 'path': '/npu/npus/0/processes/99',
+         'value': new['npu']['npus']['0']['processes']['99']},
+    ]
+    assert apply(copy.deepcopy(old), diff(old, new)) == new
+
+
+def test_gpu_event_times_are_strings():
+    class FakeGPUStats(list):
+        def jsonify(self, non_finite=None):
+            return {'query_time': datetime(2024, 5, 1, 12, 0, 0),
+                    'gpus': [{'index': 0, 'processes': None}],
+                    'events': [{'gpu_index': 0, 'type': 'xid',
+                                'time': datetime(2024, 5, 1, 11, 59, 58)}]}
+
+    doc = document(gpu_stats=FakeGPUStats([None]))
+    assert doc['gpu']['query_time'] == '2024-05-01T12:00:00'
+    assert doc['gpu']['events'][0]['time'] == '2024-05-01T11:59:58'
+    json.dumps(doc)  # nothing left that json cannot encode
+
+
+def test_patch_stream_keyframes():
+    stream = PatchStream(keyframe=3)
+    docs = [{'v': i, 'static': 'x'} for i in range(5)]
+    messages = [stream.encode(d) for d in docs]
+    assert [m['seq'] for m in messages] == [0, 1, 2, 3, 4]
+    assert [('snapshot' in m) for m in messages] == \
+        [True, False, False, True, False]
+    assert messages[1]['patch'] == [
+        {'op': 'replace', 'path': '/v', 'value': 1}]
+    with pytest.raises(ValueError):
+        PatchStream(keyframe=0)
+
+
+def test_stream_cli(fake_mbltml, capsys):
+    assert cli.main('npustat', 'stream', '-i', '0.01', '-n', '3',
+                    '--no-gpu') == 0
+    lines = [json.loads(line) for line in
+             capsys.readouterr().out.splitlines()]
+    assert [m['seq'] for m in lines] == [0, 1, 2]
+    doc = lines[0]['snapshot']
+    assert set(doc['npu']['npus']) == {'0', '1'}
+    for message in lines[1:]:
+        # the chip, firmware and PCIe fields are not sent again
+        assert not any('/firmware' in op['path'] or '/pcie' in op['path']
+                       for op in message['patch'])
+        apply(doc, message['patch'])
+
+
+
+def test_stream_averages(fake_mbltml, capsys):
+    assert cli.main('npustat', 'stream', '-i', '0.01', '-n', '1',
+                    '--no-gpu', '--avg', '1s,1m') == 0
+    doc = json.loads(capsys.readouterr().out)['snapshot']
+    npu = doc['npu']['npus']['0']
+    assert npu['utilization.avg'] == {'1s': 8.0, '1m': 8.0}
+    assert set(npu['cores']['C0/G']['utilization.avg']) == {'1s', '1m'}
+
+    with pytest.raises(SystemExit):
+        cli.main('npustat', 'stream', '--avg', '0s')
+    assert '--avg' in capsys.readouterr().err
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,176 @@
+"""
+Event-driven GPU error monitoring through NVML event sets.
+
+Instead of noticing a lost or failing GPU only when a later poll hits
+NVMLError_GpuIsLost, a GPUEventListener blocks in nvmlEventSetWait() on a
+background thread and records XID and other critical events the moment the
+driver reports them. The watch loop is woken up to redraw right away, with
+no need to poll faster.
+"""
+
+import collections
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Deque, List, Optional
+
+from npustat import nvml
+from npustat.nvml import pynvml as N
+
+
+def _event_type(name: str) -> int:
+    return getattr(N, name, 0)  # older pynvml lacks the newer event types
+
+
+# Human-readable names for nvmlEventType bits.
+EVENT_TYPE_NAMES = {
+    _event_type('nvmlEventTypeXidCriticalError'): 'Xid',
+    _event_type('nvmlEventTypeSingleBitEccError'): 'SBE',
+    _event_type('nvmlEventTypeDoubleBitEccError'): 'DBE',
+    _event_type('nvmlEventTypeSingleBitEccErrorStorm'): 'SBE storm',
+    _event_type('nvmlEventTypeDramRetirementEvent'): 'Page retirement',
+    _event_type('nvmlEventTypeDramRetirementFailure'): 'Page retirement failure',
+    _event_type('nvmlEventTypeNonFatalPoisonError'): 'Poison',
+    _event_type('nvmlEventTypeFatalPoisonError'): 'Fatal poison',
+    _event_type('nvmlEventTypeGpuUnavailableError'): 'GPU unavailable',
+    _event_type('nvmlEventTypeGpuRecoveryAction'): 'Recovery action',
+    _event_type('nvmlEventTypePState'): 'PState',
+    _event_type('nvmlEventTypeClock'): 'Clock',
+}
+EVENT_TYPE_NAMES.pop(0, None)
+
+# Events listened to by default: errors only, no pstate/clock chatter.
+DEFAULT_EVENT_TYPES = (
+    _event_type('nvmlEventTypeXidCriticalError') |
+    _event_type('nvmlEventTypeDoubleBitEccError') |
+    _event_type('nvmlEventTypeDramRetirementFailure') |
+    _event_type('nvmlEventTypeFatalPoisonError') |
+    _event_type('nvmlEventTypeGpuUnavailableError')
+)
+
+
+@dataclass
+class GPUEvent:
+    """A single event reported by the NVIDIA driver."""
+    gpu_index: Optional[int]
+    event_type: int  # nvmlEventType bit
+    data: int  # the XID number for Xid events
+    time: datetime = field(default_factory=datetime.now)
+
+    @property
+    def name(self) -> str:
+        return EVENT_TYPE_NAMES.get(self.event_type, hex(self.event_type))
+
+    def __str__(self) -> str:
+        gpu = '[G?]' if self.gpu_index is None else f'[G{self.gpu_index}]'
+        desc = self.name
+        if self.event_type == _event_type('nvmlEventTypeXidCriticalError'):
+            desc += f' {self.data}'
+        return f"{gpu} {desc} at {self.time.strftime('%H:%M:%S')}"
+
+    def jsonify(self):
+        return {
+            'gpu_index': self.gpu_index,
+            'type': self.name,
+            'data': self.data,
+            'time': self.time,
+        }
+
+
+class GPUEventListener:
+    """Records NVML events of all GPUs from a background thread.
+
+    Usage:
+        listener = GPUEventListener().start()
+        ...
+        listener.recent()   # the most recent events
+        listener.stop()
+    """
+
+    def __init__(self, event_types: int = DEFAULT_EVENT_TYPES, *,
+                 timeout_ms: int = 500, maxlen: int = 100,
+                 on_event: Optional[Callable[[GPUEvent], None]] = None):
+        self.event_types = event_types
+        self.timeout_ms = timeout_ms
+        self.on_event = on_event
+        # Set whenever an event arrives; watch mode waits on it to redraw.
+        self.wakeup = threading.Event()
+
+        self._events: Deque[GPUEvent] = collections.deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._event_set = None
+
+    def start(self) -> 'GPUEventListener':
+        """Register all GPUs in a new event set and start listening."""
+        nvml.ensure_initialized()
+        self._event_set = N.nvmlEventSetCreate()
+        for index in range(N.nvmlDeviceGetCount()):
+            try:
+                handle = N.nvmlDeviceGetHandleByIndex(index)
+                supported = N.nvmlDeviceGetSupportedEventTypes(handle)
+                event_types = self.event_types & supported
+                if event_types:
+                    N.nvmlDeviceRegisterEvents(handle, event_types,
+                                               self._event_set)
+            except N.NVMLError:
+                # e.g. NotSupported on some consumer GPUs: just skip the GPU
+                continue
+
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='npustat-gpu-events')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._event_set is not None:
+            try:
+                N.nvmlEventSetFree(self._event_set)
+            except N.NVMLError:
+                pass
+            self._event_set = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                data = N.nvmlEventSetWait(self._event_set, self.timeout_ms)
+            except N.NVMLError_Timeout:  # type: ignore
+                continue
+            except N.NVMLError:
+                # The event set is unusable (e.g. driver unloaded); do not
+                # spin, the regular polling will still report the failure.
+                self._stop.wait(self.timeout_ms / 1000.0)
+                continue
+
+            try:
+                gpu_index = N.nvmlDeviceGetIndex(data.device)
+            except N.NVMLError:
+                gpu_index = None
+            self.add(GPUEvent(gpu_index=gpu_index,
+                              event_type=int(data.eventType),
+                              data=int(data.eventData)))
+
+    def add(self, event: GPUEvent):
+        """Record an event and wake up anyone waiting for one."""
+        with self._lock:
+            self._events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+        self.wakeup.set()
+
+    def recent(self, limit: Optional[int] = None) -> List[GPUEvent]:
+        """The most recent events, oldest first."""
+        with self._lock:
+            events = list(self._events)
+        return events[-limit:] if limit else events
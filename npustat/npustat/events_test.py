@@ -0,0 +1,108 @@
+import contextlib
+import sys
+import threading
+import types
+
+import pytest
+from blessed import Terminal
+from mockito import unstub, when
+
+from npustat import cli, events, nvml
+from npustat.events import GPUEventListener
+from npustat.nvml import pynvml as N
+
+
+@pytest.fixture
+def mock_event_set():
+    """Two GPUs registered in a mocked NVML event set.
+
+    Events put into the returned list are delivered one per
+    nvmlEventSetWait() call; an empty list times out.
+    """
+    N.NVMLError.__hash__ = lambda _: 0
+    nvml._initialized = True
+    event_set = object()
+    handles = [types.SimpleNamespace(index=i) for i in range(2)]
+    pending = []
+
+    when(N).nvmlEventSetCreate().thenReturn(event_set)
+    when(N).nvmlEventSetFree(event_set).thenReturn(None)
+    when(N).nvmlDeviceGetCount().thenReturn(2)
+    for i, handle in enumerate(handles):
+        when(N).nvmlDeviceGetHandleByIndex(i).thenReturn(handle)
+        when(N).nvmlDeviceGetIndex(handle).thenReturn(i)
+    when(N).nvmlDeviceGetSupportedEventTypes(handles[0])\
+        .thenReturn(N.nvmlEventTypeAll)
+    when(N).nvmlDeviceGetSupportedEventTypes(handles[1])\
+        .thenRaise(N.NVMLError(N.NVML_ERROR_NOT_SUPPORTED))
+    when(N).nvmlDeviceRegisterEvents(...).thenReturn(None)
+
+    def _wait(_event_set, _timeout_ms):
+        if not pending:
+            raise N.NVMLError(N.NVML_ERROR_TIMEOUT)
+        gpu, event_type, data = pending.pop(0)
+        return types.SimpleNamespace(device=handles[gpu],
+                                     eventType=event_type, eventData=data)
+    when(N).nvmlEventSetWait(...).thenAnswer(_wait)
+
+    yield pending
+    unstub()
+
+
+def test_listener_records_xid(mock_event_set):
+    pending = mock_event_set
+    seen = []
+    listener = GPUEventListener(timeout_ms=10, on_event=seen.append)
+
+    with listener:
+        pending.append((0, N.nvmlEventTypeXidCriticalError, 79))
+        assert listener.wakeup.wait(timeout=5)
+
+    events = listener.recent()
+    assert len(events) == 1 and seen == events
+    assert events[0].gpu_index == 0
+    assert events[0].name == 'Xid'
+    assert events[0].data == 79
+    assert str(events[0]).startswith('[G0] Xid 79 at ')
+
+
+
+def test_events_requires_interval(capsys):
+    with pytest.raises(SystemExit):  # would be silently ignored
+        cli.main('npustat', '--events')
+    assert '--events requires' in capsys.readouterr().err
+
+
+def test_watch_mode_stops_listener(monkeypatch):
+    listeners = []
+
+    class FakeListener:
+        def __init__(self):
+            self.wakeup = threading.Event()
+            self.stopped = False
+            listeners.append(self)
+
+        def start(self):
+            return self
+
+        def stop(self):
+            self.stopped = True
+
+    class FakeTerminal(Terminal):
+        def __init__(self):
+            super().__init__(force_styling=None)
+
+        def cbreak(self):
+            return contextlib.nullcontext()
+
+        def inkey(self, timeout=None, esc_delay=0.35):
+            return 'q'
+
+    monkeypatch.setattr(events, 'GPUEventListener', FakeListener)
+    monkeypatch.setattr(cli, 'Terminal', FakeTerminal)
+    assert cli.loop_gpustat(interval=0.1, events=True, no_npu=True) == 0
+    assert [listener.stopped for listener in listeners] == [True]
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,101 @@
+"""
+In-memory time-series store for device metrics.
+
+Each series is a bounded ring buffer of ``(timestamp, value)`` samples, keyed
+by a device key (e.g. ``G0``, ``N1``, ``N1/C0/c2``) and a metric name (e.g.
+``utilization``). Memory is capped per series, so a monitoring session can
+run for days without growing.
+"""
+
+import collections
+import threading
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+Sample = Tuple[float, float]  # (unix timestamp in seconds, value)
+
+DEFAULT_MAXLEN = 600
+
+
+class Series:
+    """A bounded, thread-safe ring buffer of (timestamp, value) samples."""
+
+    def __init__(self, maxlen: int = DEFAULT_MAXLEN):
+        self._samples: Deque[Sample] = collections.deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._samples))
+
+    @property
+    def maxlen(self) -> int:
+        return self._samples.maxlen  # type: ignore
+
+    def append(self, timestamp: float, value: float):
+        """Add a sample; samples older than the newest one are dropped."""
+        with self._lock:
+            self._append(timestamp, value)
+
+    def extend(self, samples: Iterable[Sample]):
+        with self._lock:
+            for timestamp, value in samples:
+                self._append(timestamp, value)
+
+    def _append(self, timestamp, value):
+        if self._samples and timestamp < self._samples[-1][0]:
+            return
+        self._samples.append((timestamp, float(value)))
+
+    def latest(self) -> Optional[Sample]:
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def values(self, last: Optional[int] = None) -> List[float]:
+        """Values of the series, oldest first; only the `last` N if given."""
+        with self._lock:
+            samples = list(self._samples)
+        if last is not None:
+            samples = samples[-last:] if last > 0 else []
+        return [v for _, v in samples]
+
+    def since(self, timestamp: float) -> List[Sample]:
+        """Samples strictly newer than `timestamp`."""
+        with self._lock:
+            return [s for s in self._samples if s[0] > timestamp]
+
+
+class History:
+    """A thread-safe collection of Series keyed by (device, metric)."""
+
+    def __init__(self, maxlen: int = DEFAULT_MAXLEN):
+        self.maxlen = maxlen
+        self._series: Dict[Tuple[str, str], Series] = {}
+        self._lock = threading.Lock()
+
+    def series(self, key: str, metric: str) -> Series:
+        """Returns the series for (key, metric), creating it if needed."""
+        with self._lock:
+            s = self._series.get((key, metric))
+            if s is None:
+                s = self._series[(key, metric)] = Series(self.maxlen)
+            return s
+
+    def record(self, key: str, metric: str, timestamp: float, value):
+        """Append one sample; None values (not supported) are skipped."""
+        if value is None:
+            return
+        self.series(key, metric).append(timestamp, value)
+
+    def record_many(self, key: str, metric: str, samples: Iterable[Sample]):
+        self.series(key, metric).extend(samples)
+
+    def keys(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return list(self._series.keys())
+
+    def get(self, key: str, metric: str) -> Optional[Series]:
+        with self._lock:
+            return self._series.get((key, metric))
@@ -0,0 +1,44 @@
+import sys
+import threading
+
+import pytest
+
+from npustat.history import History, Series
+
+
+def test_series_is_bounded():
+    s = Series(maxlen=3)
+    for t in range(5):
+        s.append(float(t), t * 10)
+    assert len(s) == 3
+    assert s.values() == [20, 30, 40]
+    assert s.values(last=2) == [30, 40]
+    assert s.latest() == (4.0, 40)
+    assert s.since(2.5) == [(3.0, 30), (4.0, 40)]
+
+    s.append(1.0, 99)  # out of order: dropped
+    assert s.latest() == (4.0, 40)
+
+
+def test_history_concurrent_writers():
+    h = History(maxlen=1000)
+
+    def _writer(key):
+        for t in range(500):
+            h.record(key, 'utilization', float(t), t)
+
+    threads = [threading.Thread(target=_writer, args=(f'N{i}',))
+               for i in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    assert sorted(h.keys()) == [(f'N{i}', 'utilization') for i in range(4)]
+    assert all(len(h.series(k, m)) == 500 for k, m in h.keys())
+    h.record('N0', 'power', 0.0, None)  # not supported: skipped
+    assert h.get('N0', 'power') is None
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,361 @@
+"""
+Advisory NPU leases: ``npustat lease acquire/release/list``.
+
+A lease is a small JSON lock file per NPU (``N0.lease``) in a runtime
+directory shared by all users of the host. Files are hard-linked into
+place, which fails if the lease exists, so of two launchers racing for the
+same NPU exactly one wins. Right after winning, the NPU's live process list
+is checked: a device already used by a process outside the lease holder's
+process tree is not leased. Leases whose holder process has exited are
+reclaimed automatically; the holder's start time is recorded along with its
+PID, so that a PID reused by an unrelated process does not keep the lease.
+
+The directory is writable by everyone and deliberately not sticky: the
+stale lease of a user's exited process must be removable by another user.
+Leases are advisory: they coordinate launchers that use them, they do not
+stop anything else from opening the device.
+"""
+
+import argparse
+import getpass
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+
+import psutil
+
+try:
+    import fcntl
+except ImportError:  # e.g. Windows: leases can be listed, not reclaimed
+    fcntl = None
+
+LEASE_SUFFIX = '.lease'
+
+
+class LeaseError(Exception):
+    """A lease could not be acquired or released."""
+
+
+@dataclass
+class Lease:
+    """The holder of an NPU."""
+    index: int  # NPU index
+    pid: int  # the process holding the lease
+    username: str
+    hostname: str
+    acquired: float  # unix timestamp
+    note: str = ''
+    create_time: float = 0.0  # of the holder process; 0 if unknown
+
+    @property
+    def alive(self) -> bool:
+        if not self.create_time:  # e.g. written by an older npustat
+            return psutil.pid_exists(self.pid)
+        try:
+            started = psutil.Process(self.pid).create_time()
+        except psutil.NoSuchProcess:
+            return False
+        except psutil.Error:
+            return True  # exists, but we may not look at it
+        # otherwise the holder exited and its PID was reused
+        return abs(started - self.create_time) < 1.0
+
+    def __str__(self) -> str:
+        return f'{self.username}/{self.pid}'
+
+    def jsonify(self):
+        return asdict(self)
+
+
+def lease_dir() -> str:
+    """$NPUSTAT_LEASE_DIR, or npustat-leases in the temporary directory."""
+    return os.environ.get('NPUSTAT_LEASE_DIR') or \
+        os.path.join(tempfile.gettempdir(), 'npustat-leases')
+
+
+def _ensure_dir(directory: str):
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+        try:
+            # shared by every user, like /tmp, but without the sticky bit
+            # (which would keep them from reclaiming each other's leases)
+            os.chmod(directory, 0o777)
+        except OSError:
+            pass
+
+
+def _path(directory: str, index: int) -> str:
+    return os.path.join(directory, f'N{index}{LEASE_SUFFIX}')
+
+
+def _read(path: str) -> Optional[Lease]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return Lease(**json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError):
+        # garbage (leases are never seen half-written): treat it as held by
+        # nobody alive, so that it gets reclaimed.
+        return Lease(index=-1, pid=-1, username='?', hostname='?',
+                     acquired=0.0)
+
+
+def _reclaim(path: str, stale: Lease) -> bool:
+    """Remove a stale lease file, unless someone else replaced it."""
+    # Reclaimers take turns, so that one of them cannot remove the fresh
+    # lease another one's launcher created right after reclaiming.
+    if fcntl is None:
+        raise OSError('stale leases cannot be reclaimed without fcntl')
+    lock_path = os.path.join(os.path.dirname(path), '.reclaim.lock')
+    # read-only: flock() does not need more, and the file may belong to
+    # another user (0644 after their umask)
+    fd = os.open(lock_path, os.O_CREAT | os.O_RDONLY, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        current = _read(path)
+        if current is None:
+            return True
+        if current.pid != stale.pid or current.acquired != stale.acquired:
+            return False
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        return True
+    finally:
+        os.close(fd)
+
+
+def list_leases(directory: Optional[str] = None, *,
+                reclaim: bool = True) -> Dict[int, Lease]:
+    """Current leases by NPU index; stale ones are removed unless told not."""
+    directory = directory or lease_dir()
+    leases = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return {}
+    for name in names:
+        if not (name.startswith('N') and name.endswith(LEASE_SUFFIX)):
+            continue
+        path = os.path.join(directory, name)
+        lease = _read(path)
+        if lease is None:
+            continue
+        if not lease.alive:
+            if reclaim:
+                try:
+                    _reclaim(path, lease)
+                except OSError:
+                    pass  # e.g. someone else's file in a non-sticky dir
+            continue
+        leases[lease.index] = lease
+    return leases
+
+
+def _foreign_processes(index: int, pid: int) -> List[int]:
+    """PIDs using the NPU that are not `pid` or one of its descendants."""
+    from npustat import npu
+    npu.ensure_initialized()
+    processes = npu.FIELD_GROUPS['processes'](index)['processes']
+    own = {pid}
+    try:
+        own.update(p.pid for p in psutil.Process(pid).children(recursive=True))
+    except psutil.Error:
+        pass
+    return [p.pid for p in processes if p.pid not in own]
+
+
+def acquire(indices: Iterable[int], *, pid: Optional[int] = None,
+            note: str = '', directory: Optional[str] = None,
+            check_processes: bool = True) -> List[Lease]:
+    """Lease all of the given NPUs to `pid`, or none of them.
+
+    Args:
+        indices: NPU indices
+        pid: Holder of the leases (default: the calling process)
+        note: Free text shown by ``npustat lease list``
+        directory: Lease directory (default: lease_dir())
+        check_processes: Refuse NPUs used by processes of other owners
+
+    Returns:
+        The new leases.
+
+    Raises:
+        LeaseError: If any NPU is leased by another live process or busy.
+    """
+    directory = directory or lease_dir()
+    pid = pid or os.getpid()
+    _ensure_dir(directory)
+
+    acquired: List[Lease] = []
+    try:
+        for index in sorted(set(indices)):
+            acquired.append(_acquire_one(directory, index, pid, note,
+                                         check_processes))
+    except BaseException:
+        release([lease.index for lease in acquired], pid=pid,
+                directory=directory)
+        raise
+    return acquired
+
+
+def _create_time(pid: int) -> float:
+    try:
+        return psutil.Process(pid).create_time()
+    except psutil.Error:
+        return 0.0
+
+
+def _acquire_one(directory: str, index: int, pid: int, note: str,
+                 check_processes: bool) -> Lease:
+    path = _path(directory, index)
+    lease = Lease(index=index, pid=pid, username=getpass.getuser(),
+                  hostname=platform.node(), acquired=time.time(), note=note,
+                  create_time=_create_time(pid))
+    # Write the lease aside, then link it into place: the link fails if the
+    # lease exists, and readers never see a half-written file.
+    fd, tmp = tempfile.mkstemp(prefix=f'.N{index}.', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(lease.jsonify(), f)
+        os.chmod(tmp, 0o644)
+        for _ in range(10):
+            try:
+                os.link(tmp, path)
+                break
+            except FileExistsError:
+                holder = _read(path)
+                if holder is None:
+                    continue  # released meanwhile
+                if holder.alive:
+                    if holder.pid == pid:
+                        return holder  # already ours
+                    raise LeaseError(
+                        f'NPU {index} is leased by {holder}'
+                        + (f' ({holder.note})' if holder.note else ''))
+                try:
+                    _reclaim(path, holder)
+                except OSError as e:
+                    # e.g. someone else's file in a non-sticky directory
+                    raise LeaseError(f'NPU {index}: cannot remove the stale '
+                                     f'lease of {holder}: {e}') from e
+        else:
+            raise LeaseError(f'NPU {index}: could not create {path}')
+    finally:
+        os.unlink(tmp)
+
+    # The lock is ours: now nobody else can lease the NPU while we look at
+    # who is using it.
+    if check_processes:
+        try:
+            foreign = _foreign_processes(index, pid)
+        except Exception:
+            os.unlink(path)
+            raise
+        if foreign:
+            os.unlink(path)
+            raise LeaseError(f'NPU {index} is in use by process(es) '
+                             f'{", ".join(map(str, foreign))}')
+    return lease
+
+
+def release(indices: Iterable[int], *, pid: Optional[int] = None,
+            force: bool = False, directory: Optional[str] = None) -> List[int]:
+    """Release leases held by `pid` (any holder with force).
+
+    Returns:
+        The NPU indices that were released.
+
+    Raises:
+        LeaseError: If a lease is held by another live process.
+    """
+    directory = directory or lease_dir()
+    pid = pid or os.getpid()
+    released = []
+    for index in indices:
+        path = _path(directory, index)
+        holder = _read(path)
+        if holder is None:
+            continue
+        if holder.pid != pid and holder.alive and not force:
+            raise LeaseError(f'NPU {index} is leased by {holder}, not {pid}')
+        try:
+            os.unlink(path)
+            released.append(index)
+        except FileNotFoundError:
+            pass
+    return released
+
+
+def _indices(value: str) -> List[int]:
+    try:
+        return [int(i) for i in value.split(',') if i.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f'expected a comma-separated list of NPU indices: {value!r}')
+
+
+def main(argv: List[str]) -> int:
+    """Entry point of ``npustat lease``; argv[0] is the subcommand name."""
+    parser = argparse.ArgumentParser(
+        'npustat lease',
+        description='Advisory NPU leases, shared by all users of the host '
+                    f'(in $NPUSTAT_LEASE_DIR, default {lease_dir()}).')
+    actions = parser.add_subparsers(dest='action', required=True)
+
+    p = actions.add_parser('acquire', help='Lease NPUs (all or none)')
+    p.add_argument('--npu', type=_indices, required=True, metavar='INDICES')
+    p.add_argument('--pid', type=int, default=None,
+                   help='Process holding the lease; the lease ends when it '
+                        'exits (default: the parent process, e.g. the '
+                        'launching shell)')
+    p.add_argument('--note', default='', help='Shown by `npustat lease list`')
+    p.add_argument('--ignore-processes', action='store_true',
+                   help='Lease even if other processes use the NPU')
+
+    p = actions.add_parser('release', help='Release leased NPUs')
+    p.add_argument('--npu', type=_indices, required=True, metavar='INDICES')
+    p.add_argument('--pid', type=int, default=None,
+                   help='Holder of the lease (default: the parent process)')
+    p.add_argument('--force', action='store_true',
+                   help="Release other processes' leases too")
+
+    p = actions.add_parser('list', help='List the current leases')
+    p.add_argument('--json', action='store_true')
+
+    args = parser.parse_args(argv[1:])
+
+    try:
+        if args.action == 'acquire':
+            leases = acquire(args.npu, pid=args.pid or os.getppid(),
+                             note=args.note,
+                             check_processes=not args.ignore_processes)
+            print(','.join(str(lease.index) for lease in leases))
+        elif args.action == 'release':
+            release(args.npu, pid=args.pid or os.getppid(), force=args.force)
+        else:
+            leases = list_leases()
+            if args.json:
+                json.dump([leases[i].jsonify() for i in sorted(leases)],
+                          sys.stdout, indent=4)
+                sys.stdout.write(os.linesep)
+            for i in sorted(leases) if not args.json else ():
+                lease = leases[i]
+                acquired = time.strftime('%Y-%m-%d %H:%M:%S',
+                                         time.localtime(lease.acquired))
+                print(f'[N{i}] {lease}  since {acquired}  {lease.note}'
+                      .rstrip())
+    except LeaseError as e:
+        sys.stderr.write(f'npustat lease: {e}\n')
+        return 1
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        sys.stderr.write(f'npustat lease: cannot query the NPUs: {e}\n')
+        return 2
+    return 0
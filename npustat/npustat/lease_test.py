@@ -0,0 +1,149 @@
+import json
+import os
+import stat
+import subprocess
+import sys
+
+import pytest
+
+from npustat import cli, lease
+from npustat.conftest import aries, process_info
+from npustat.core_npu import NPUStatCollection
+
+# stale leases are reclaimed under a file lock
+needs_fcntl = pytest.mark.skipif(lease.fcntl is None, reason='no fcntl')
+
+
+@pytest.fixture
+def lease_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('NPUSTAT_LEASE_DIR', str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def dead_pid():
+    p = subprocess.Popen([sys.executable, '-c', 'pass'])
+    p.wait()
+    return p.pid
+
+
+def test_acquire_and_release(fake_mbltml, lease_dir):
+    leases = lease.acquire([1, 0], note='train')
+    assert [l.index for l in leases] == [0, 1]
+    assert sorted(lease.list_leases()) == [0, 1]
+    assert lease.list_leases()[0].pid == os.getpid()
+
+    # another live process cannot take them
+    with pytest.raises(lease.LeaseError, match='NPU 0 is leased by .*train'):
+        lease.acquire([0], pid=os.getppid())
+    # acquiring again is a no-op for the holder
+    assert lease.acquire([0])[0].index == 0
+
+    with pytest.raises(lease.LeaseError):
+        lease.release([0], pid=os.getppid())
+    assert lease.release([0, 1]) == [0, 1]
+    assert lease.list_leases() == {}
+
+
+def test_all_or_nothing(fake_mbltml, lease_dir):
+    lease.acquire([1], pid=os.getppid())
+    with pytest.raises(lease.LeaseError):
+        lease.acquire([0, 1])
+    # N0 was rolled back
+    assert sorted(lease.list_leases()) == [1]
+
+
+@needs_fcntl
+def test_stale_lease_is_reclaimed(fake_mbltml, lease_dir,
+                                  dead_pid):
+    lease.acquire([0], pid=dead_pid, check_processes=False)
+    assert os.listdir(lease_dir) == ['N0.lease']
+    assert lease.acquire([0])[0].pid == os.getpid()
+
+    lease.release([0])
+    lease.acquire([0], pid=dead_pid, check_processes=False)
+    assert lease.list_leases() == {}
+    assert 'N0.lease' not in os.listdir(lease_dir)
+
+
+@needs_fcntl
+def test_reused_pid_does_not_hold(fake_mbltml, lease_dir):
+    held = lease.acquire([0], check_processes=False)[0]
+    assert held.create_time > 0
+    # as if this process had exited and its PID had been reused
+    with open(os.path.join(lease_dir, 'N0.lease'), 'w') as f:
+        json.dump(dict(held.jsonify(), create_time=1.0), f)
+    assert lease.list_leases(reclaim=False) == {}
+    assert os.listdir(lease_dir) == ['N0.lease']
+    assert lease.list_leases() == {}
+    assert 'N0.lease' not in os.listdir(lease_dir)
+
+
+@needs_fcntl
+def test_reclaim_across_users(fake_mbltml, tmp_path, monkeypatch, dead_pid):
+    directory = str(tmp_path / 'leases')
+    monkeypatch.setenv('NPUSTAT_LEASE_DIR', directory)
+    lease.acquire([0], pid=dead_pid, check_processes=False)
+    # not sticky: anyone may remove another user's stale lease
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o777
+
+    flags = []
+    real_open = os.open
+
+    def open_(path, flag, *args, **kwargs):
+        if os.path.basename(path) == '.reclaim.lock':
+            flags.append(flag)
+        return real_open(path, flag, *args, **kwargs)
+    monkeypatch.setattr(lease.os, 'open', open_)
+    assert lease.acquire([0])[0].pid == os.getpid()
+    # the reclaim lock may be another user's read-only file
+    assert flags and not any(f & (os.O_WRONLY | os.O_RDWR) for f in flags)
+
+
+def test_stale_lease_not_removable(fake_mbltml, lease_dir, dead_pid,
+                                   monkeypatch):
+    lease.acquire([0], pid=dead_pid, check_processes=False)
+
+    def _reclaim(path, stale):
+        raise PermissionError(13, 'Permission denied', path)
+    monkeypatch.setattr(lease, '_reclaim', _reclaim)
+    with pytest.raises(lease.LeaseError, match='cannot remove the stale'):
+        lease.acquire([0])
+
+
+def test_busy_npu_is_refused(fake_mbltml, lease_dir):
+    fake_mbltml.devices[0] = aries(0, processes=[process_info(4242, 100, 50)])
+    with pytest.raises(lease.LeaseError, match='in use by process.* 4242'):
+        lease.acquire([0])
+    assert lease.list_leases() == {}
+    lease.acquire([0], check_processes=False)
+
+
+def test_lease_shown_in_query(fake_mbltml, lease_dir):
+    lease.acquire([1], note='bench')
+    assert NPUStatCollection.new_query()[1].lease is None  # not asked for
+    npus = NPUStatCollection.new_query(leases=True)
+    assert npus[0].lease is None
+    assert npus[1].lease.pid == os.getpid()
+    assert npus[1].jsonify()['lease']['note'] == 'bench'
+
+
+def test_lease_cli(fake_mbltml, lease_dir, capsys):
+    assert cli.main('npustat', 'lease', 'acquire', '--npu', '0,1',
+                    '--pid', str(os.getpid())) == 0
+    assert capsys.readouterr().out == '0,1\n'
+    assert cli.main('npustat', 'lease', 'acquire', '--npu', '1') == 1
+    assert 'NPU 1 is leased by' in capsys.readouterr().err
+
+    assert cli.main('npustat', 'lease', 'list', '--json') == 0
+    listed = json.loads(capsys.readouterr().out)
+    assert [l['index'] for l in listed] == [0, 1]
+
+    assert cli.main('npustat', 'lease', 'release', '--npu', '0,1',
+                    '--pid', str(os.getpid())) == 0
+    assert cli.main('npustat', 'lease', 'list') == 0
+    assert capsys.readouterr().out == ''
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
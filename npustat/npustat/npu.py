@@ -121,6 +121,16 @@ class NPUInfo:
     pcie: Dict[str, int] = field(default_factory=dict)
     cores: List[NPUCore] = field(default_factory=list)
     processes: List[NPUProcess] = field(default_factory=list)
+    # seconds since each field group (see FIELD_GROUPS) was read; only
+    # filled in by an NPUPoller, which may reuse values of earlier ticks
+    field_ages: Dict[str, float] = field(default_factory=dict)
+    # rolling utilization averages by window (e.g. '10s'), for the device
+    # ('utilization') and each core label; filled in by RollingAverages
+    averages: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    # alert rules firing on this device; filled in by an AlertEngine
+    alerts: List[str] = field(default_factory=list)
+    # the npustat.lease.Lease holding this NPU, if any
+    lease: Optional[Any] = None
 
     @property
     def device_name(self) -> str:
@@ -192,8 +202,19 @@ class NPUDriverVersions:
     regulus_usb: Optional[str] = None
 
 
-def _safe(fn, *args, default=None):
-    """Call an mbltml getter, returning ``default`` when it is unsupported."""
+def _safe(fn, *args, default=None, strict=False):
+    """Call an mbltml getter, returning ``default`` when it is unsupported.
+
+    With strict, the getter's exceptions propagate and a missing value
+    raises, for callers that must not mistake a device they cannot read for
+    an idle one.
+    """
+    if strict:
+        value = fn(*args)
+        if value is None:
+            raise RuntimeError(
+                f"{getattr(fn, '__name__', 'mbltml')} returned no value")
+        return value
     try:
         return fn(*args)
     except Exception:
@@ -263,9 +284,10 @@ def _query_driver_versions() -> NPUDriverVersions:
     return drivers
 
 
-def _query_cores(dev_no: int) -> List[NPUCore]:
+def _query_cores(dev_no: int, strict: bool = False) -> List[NPUCore]:
     cores = []
-    for info in _safe(mbltml.mbltmlGetCoreInfos, dev_no, default=[]) or []:
+    for info in _safe(mbltml.mbltmlGetCoreInfos, dev_no, default=[],
+                      strict=strict) or []:
         cluster = _cluster_index(info.core_id.cluster)
         if cluster < 0:
             continue  # MBLTML_CLUSTER_ERROR
@@ -278,9 +300,10 @@ def _query_cores(dev_no: int) -> List[NPUCore]:
     return cores
 
 
-def _query_processes(dev_no: int) -> List[NPUProcess]:
+def _query_processes(dev_no: int, strict: bool = False) -> List[NPUProcess]:
     processes = []
-    for info in _safe(mbltml.mbltmlGetProcessInfos, dev_no, default=[]) or []:
+    for info in _safe(mbltml.mbltmlGetProcessInfos, dev_no, default=[],
+                      strict=strict) or []:
         # The binding over-allocates its output array; skip the empty slots.
         if info.pid <= 0:
             continue
@@ -298,10 +321,8 @@ def _query_processes(dev_no: int) -> List[NPUProcess]:
     return processes
 
 
-def _query_device(dev_no: int) -> NPUInfo:
-    memory_used = _safe(mbltml.mbltmlGetMemoryUsage, dev_no, default=0) or 0
-    memory_total = _safe(mbltml.mbltmlGetMemoryTotal, dev_no, default=0) or 0
-
+def _read_static(dev_no: int, strict: bool = False) -> Dict[str, Any]:
+    """Identity, firmware and PCIe properties; these never change at runtime."""
     pcie = {}
     for key, fn in (
         ('vendor_id', mbltml.mbltmlGetVendorId),
@@ -317,10 +338,11 @@ def _query_device(dev_no: int) -> NPUInfo:
         if value is not None:
             pcie[key] = value
 
-    return NPUInfo(
-        index=dev_no,
-        node_name=_safe(mbltml.mbltmlGetNodeName, dev_no, default='') or '',
-        device_type=_safe(mbltml.mbltmlGetDeviceType, dev_no, default=0) or 0,
+    return dict(
+        node_name=_safe(mbltml.mbltmlGetNodeName, dev_no, default='',
+                        strict=strict) or '',
+        device_type=_safe(mbltml.mbltmlGetDeviceType, dev_no, default=0,
+                          strict=strict) or 0,
         hardware_version=_safe(
             mbltml.mbltmlGetHardwareVersion, dev_no, default=0) or 0,
         firmware_version=_safe(
@@ -328,30 +350,93 @@ def _query_device(dev_no: int) -> NPUInfo:
         firmware_revision=_safe(
             mbltml.mbltmlGetFirmwareRevision, dev_no, default=0) or 0,
         firmware_crc=_safe(mbltml.mbltmlGetFirmwareCRC, dev_no, default=0) or 0,
-        temperature=_safe(mbltml.mbltmlGetTemperature, dev_no, default=0) or 0,
         signal_type=_safe(mbltml.mbltmlGetSignalType, dev_no, default=0) or 0,
-        clock_npu=_safe(mbltml.mbltmlGetNPUClock, dev_no, default=0) or 0,
-        clock_bus=_safe(mbltml.mbltmlGetBusClock, dev_no, default=0) or 0,
-        fan_duty=_safe(mbltml.mbltmlGetFanDuty, dev_no),
-        power_total=_safe(mbltml.mbltmlGetTotalPower, dev_no, default=0.0) or 0.0,
-        current_total=_safe(
-            mbltml.mbltmlGetTotalCurrent, dev_no, default=0.0) or 0.0,
-        voltage_total=_safe(
-            mbltml.mbltmlGetTotalVoltage, dev_no, default=0.0) or 0.0,
+        pcie=pcie,
+    )
+
+
+def _read_temperature(dev_no: int, strict: bool = False) -> Dict[str, Any]:
+    return dict(
+        temperature=_safe(mbltml.mbltmlGetTemperature, dev_no, default=0,
+                          strict=strict) or 0,
+    )
+
+
+def _read_fan(dev_no: int, strict: bool = False) -> Dict[str, Any]:
+    # None where there is no fan, strict or not
+    return dict(fan_duty=_safe(mbltml.mbltmlGetFanDuty, dev_no))
+
+
+def _read_clock(dev_no: int, strict: bool = False) -> Dict[str, Any]:
+    return dict(
+        clock_npu=_safe(mbltml.mbltmlGetNPUClock, dev_no, default=0,
+                        strict=strict) or 0,
+        clock_bus=_safe(mbltml.mbltmlGetBusClock, dev_no, default=0,
+                        strict=strict) or 0,
+    )
+
+
+def _read_power(dev_no: int, strict: bool = False) -> Dict[str, Any]:
+    return dict(
+        power_total=_safe(mbltml.mbltmlGetTotalPower, dev_no, default=0.0,
+                          strict=strict) or 0.0,
+        current_total=_safe(mbltml.mbltmlGetTotalCurrent, dev_no,
+                            default=0.0, strict=strict) or 0.0,
+        voltage_total=_safe(mbltml.mbltmlGetTotalVoltage, dev_no,
+                            default=0.0, strict=strict) or 0.0,
         extra_rail=_safe(mbltml.mbltmlGetExtraPmicId, dev_no),
         extra_rail_power=_safe(mbltml.mbltmlGetExtraPmicPower, dev_no),
         extra_rail_current=_safe(mbltml.mbltmlGetExtraPmicCurrent, dev_no),
         extra_rail_voltage=_safe(mbltml.mbltmlGetExtraPmicVoltage, dev_no),
-        memory_used=memory_used // _MB,
-        memory_total=memory_total // _MB,
-        utilization=_safe(
-            mbltml.mbltmlGetTotalUtilization, dev_no, default=0.0) or 0.0,
-        pcie=pcie,
-        cores=_query_cores(dev_no),
-        processes=_query_processes(dev_no),
     )
 
 
+def _read_memory(dev_no: int, strict: bool = False) -> Dict[str, Any]:
+    memory_used = _safe(mbltml.mbltmlGetMemoryUsage, dev_no, default=0,
+                        strict=strict) or 0
+    memory_total = _safe(mbltml.mbltmlGetMemoryTotal, dev_no, default=0,
+                         strict=strict) or 0
+    return dict(memory_used=memory_used // _MB, memory_total=memory_total // _MB)
+
+
+def _read_utilization(dev_no: int, strict: bool = False) -> Dict[str, Any]:
+    return dict(utilization=_safe(
+        mbltml.mbltmlGetTotalUtilization, dev_no, default=0.0,
+        strict=strict) or 0.0)
+
+
+def _read_cores(dev_no: int, strict: bool = False) -> Dict[str, Any]:
+    return dict(cores=_query_cores(dev_no, strict))
+
+
+def _read_processes(dev_no: int, strict: bool = False) -> Dict[str, Any]:
+    return dict(processes=_query_processes(dev_no, strict))
+
+
+# NPUInfo fields grouped by the mbltml calls that fill them in. A group is
+# the unit a PollingPolicy (npustat.policy) schedules; 'static' comes first
+# because the device type decides the polling class of the others. Each
+# reader takes the device number and, optionally, strict (see _safe).
+FIELD_GROUPS = {
+    'static': _read_static,
+    'temperature': _read_temperature,
+    'fan': _read_fan,
+    'clock': _read_clock,
+    'power': _read_power,
+    'memory': _read_memory,
+    'utilization': _read_utilization,
+    'cores': _read_cores,
+    'processes': _read_processes,
+}
+
+
+def _query_device(dev_no: int) -> NPUInfo:
+    values: Dict[str, Any] = {}
+    for read in FIELD_GROUPS.values():
+        values.update(read(dev_no))
+    return NPUInfo(index=dev_no, **values)
+
+
 def query_npu_status() -> "tuple[List[NPUInfo], NPUDriverVersions]":
     """
     Query every Mobilint NPU on the local machine through mbltml.
@@ -0,0 +1,111 @@
+"""
+Tests for the Mobilint NPU backend, against a fake mbltml module.
+"""
+# pylint: disable=redefined-outer-name
+
+import sys
+
+import pytest
+
+from npustat import cli, npu
+from npustat.conftest import FakeClock
+from npustat.policy import DEFAULT_POLICY, NPUPoller, PollingPolicy
+
+
+def test_query_npu_status(fake_mbltml):
+    npus, drivers = npu.query_npu_status()
+    assert [n.name for n in npus] == ['Aries(aries0)', 'Regulus(USB)(regulus1)']
+    assert drivers.aries == '1.13.0(Rev:1)'
+
+    n = npus[0]
+    assert n.memory_used == 426 and n.memory_free == 16384 - 426
+    assert n.pcie == {'generation': 4, 'lanes': 8}
+    assert n.power_npu == 6.95
+    assert n.fan_duty is None  # not supported
+    assert sorted(n.clusters) == [0, 1]
+    assert n.clusters[0][1].label == 'C0/c0'
+    assert n.clusters[0][1].utilization == pytest.approx(67.6)
+    assert n.processes == []  # pid 0 slots are skipped
+
+
+def test_polling_policy_parse():
+    policy = PollingPolicy.parse('Regulus(USB)=2, temperature=5')
+    assert policy.interval('Regulus(USB)', 'utilization') == 2
+    assert policy.interval('Regulus(USB)', 'temperature') == 5
+    assert policy.interval('Aries', 'utilization') == 0
+    assert policy.interval('Aries', 'temperature') == 5
+
+    with pytest.raises(ValueError, match='Unknown'):
+        PollingPolicy.parse('Gaudi=1')
+    with pytest.raises(ValueError):
+        PollingPolicy.parse('temperature')
+    with pytest.raises(SystemExit):  # ignored in a one-shot run
+        cli.main('npustat', '--npu-poll-policy', 'temperature=5')
+
+
+def test_poller_per_device_class_and_field(fake_mbltml):
+    clock = FakeClock()
+    policy = PollingPolicy.parse('Regulus(USB)=2,temperature=5,static=inf')
+    poller = NPUPoller(policy, clock=clock)
+
+    for _ in range(4):  # four ticks, 0.5 seconds apart
+        npus, _ = poller.poll()
+        clock.now += 0.5
+
+    calls = fake_mbltml.calls
+    assert calls[(0, 'TotalUtilization')] == 4  # Aries: every tick
+    assert calls[(0, 'Temperature')] == 1
+    assert calls[(0, 'FirmwareVersion')] == 1
+    assert calls[(1, 'TotalUtilization')] == 1  # USB Regulus: every 2 s
+
+    # consumers get the latest value with its age
+    fake_mbltml.devices[0]['Temperature'] = 80
+    npus, _ = poller.poll()
+    assert npus[0].temperature == 46
+    assert npus[0].field_ages['temperature'] == 2.0
+    assert npus[0].field_ages['utilization'] == 0.0
+    assert poller.latest(1, 'utilization') == ({'utilization': 8.0}, 0.0)
+
+    clock.now += 3.0
+    npus, _ = poller.poll()
+    assert npus[0].temperature == 80
+
+
+
+def test_poller_rereads_another_device(fake_mbltml):
+    clock = FakeClock()
+    poller = NPUPoller(clock=clock)
+    npus, _ = poller.poll()
+    assert npus[0].name == 'Aries(aries0)'
+
+    # the same index now names another device, e.g. after a hot-plug
+    fake_mbltml.devices[0], fake_mbltml.devices[1] = \
+        fake_mbltml.devices[1], fake_mbltml.devices[0]
+    clock.now += 0.5
+    npus, _ = poller.poll()
+    assert npus[0].name == 'Regulus(USB)(regulus1)'
+    assert npus[0].field_ages['static'] == 0.0
+
+    # an unplugged device leaves nothing behind
+    del fake_mbltml.devices[1]
+    clock.now += 0.5
+    npus, _ = poller.poll()
+    assert len(npus) == 1 and poller.latest(1, 'static') == (None, None)
+
+
+def test_poll_policy_is_opt_in(fake_mbltml, monkeypatch):
+    pollers = []
+    monkeypatch.setattr(cli, 'loop_gpustat',
+                        lambda **kwargs: pollers.append(
+                            kwargs['npu_poll_policy']))
+    cli.main('npustat', '--npu-only', '-i', '1')
+    cli.main('npustat', '--npu-only', '-i', '1', '--npu-poll-policy')
+    cli.main('npustat', '--npu-only', '-i', '1', '--npu-poll-policy',
+             'temperature=10')
+    assert pollers[0] is None  # every value read on every tick
+    assert pollers[1] == DEFAULT_POLICY
+    assert pollers[2].interval('Regulus(USB)', 'temperature') == 10
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -8,6 +8,7 @@ import os
 import sys
 import textwrap
 import warnings
+from typing import Any, Dict, Set
 
 # If this environment variable is set, we will bypass pynvml version validation
 # so that legacy pynvml (nvidia-ml-py3) can be used. This would be useful
@@ -233,8 +234,79 @@ def ensure_initialized():
         raise _init_error  # type: ignore
 
 
+# Whether the driver implements nvmlDeviceGetFieldValues (None: not probed yet)
+_has_field_values = None
+
+# Per device: the keys of the fields it reported as not supported, which are
+# not requested again
+_unsupported_fields: Dict[Any, Set[Any]] = {}
+
+_FIELD_VALUE_ATTRS = {
+    pynvml.NVML_VALUE_TYPE_DOUBLE: 'dVal',
+    pynvml.NVML_VALUE_TYPE_UNSIGNED_INT: 'uiVal',
+    pynvml.NVML_VALUE_TYPE_UNSIGNED_LONG: 'ulVal',
+    pynvml.NVML_VALUE_TYPE_UNSIGNED_LONG_LONG: 'ullVal',
+    pynvml.NVML_VALUE_TYPE_SIGNED_LONG_LONG: 'sllVal',
+    getattr(pynvml, 'NVML_VALUE_TYPE_SIGNED_INT', 5): 'siVal',
+    getattr(pynvml, 'NVML_VALUE_TYPE_UNSIGNED_SHORT', 6): 'usVal',
+}
+
+
+def decode_value(value, value_type):
+    """Extract a python number from a c_nvmlValue_t union of the given type."""
+    attr = _FIELD_VALUE_ATTRS.get(value_type)
+    return getattr(value, attr) if attr is not None else None
+
+
+def get_field_values(handle, field_ids, device=None):
+    """Read several NVML field values with one nvmlDeviceGetFieldValues call.
+
+    `field_ids` maps arbitrary keys to a field id or a (field id, scope id)
+    pair. Returns the values that were read successfully under the same keys;
+    fields the device or driver cannot serve are left out, so the caller can
+    fall back to the dedicated getter for them. With a `device` key (e.g. the
+    UUID), fields the device reports as not supported are remembered and not
+    requested from it again.
+    """
+    global _has_field_values
+
+    if not field_ids or _has_field_values is False:
+        return {}
+
+    unsupported = _unsupported_fields.setdefault(device, set()) \
+        if device is not None else set()
+    keys = [k for k in field_ids if k not in unsupported]
+    if not keys:
+        return {}
+    try:
+        values = pynvml.nvmlDeviceGetFieldValues(
+            handle, [field_ids[k] for k in keys])
+    except (pynvml.NVMLError_FunctionNotFound,  # type: ignore
+            pynvml.NVMLError_NotSupported):  # type: ignore
+        # Drivers older than R384 do not have the API at all; stop trying.
+        _has_field_values = False
+        return {}
+    except pynvml.NVMLError:
+        return {}
+    _has_field_values = True
+
+    result = {}
+    for key, fv in zip(keys, values):
+        if fv.nvmlReturn != pynvml.NVML_SUCCESS:
+            if fv.nvmlReturn in (pynvml.NVML_ERROR_NOT_SUPPORTED,
+                                 pynvml.NVML_ERROR_INVALID_ARGUMENT):
+                unsupported.add(key)  # e.g. a field id unknown to the driver
+            continue
+        value = decode_value(fv.value, fv.valueType)
+        if value is not None:
+            result[key] = value
+    return result
+
+
 __all__ = [
     'pynvml',
     'check_driver_nvml_version',
     'ensure_initialized',
+    'decode_value',
+    'get_field_values',
 ]
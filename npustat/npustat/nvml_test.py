@@ -0,0 +1,77 @@
+import sys
+import types
+
+import pytest
+from mockito import unstub, when
+
+from npustat import nvml
+from npustat.core import BATCHED_FIELD_IDS
+from npustat.nvml import pynvml as N
+
+
+def _field_value(field_id, value, ret=N.NVML_SUCCESS):
+    fv = N.c_nvmlFieldValue_t()
+    fv.fieldId = field_id
+    fv.nvmlReturn = ret
+    fv.valueType = N.NVML_VALUE_TYPE_UNSIGNED_INT
+    fv.value.uiVal = value
+    return fv
+
+
+@pytest.fixture(autouse=True)
+def reset_field_values_probe():
+    nvml._has_field_values = None
+    nvml._unsupported_fields.clear()
+    yield
+    nvml._has_field_values = None
+    nvml._unsupported_fields.clear()
+    unstub()
+
+
+def test_get_field_values():
+    handle = types.SimpleNamespace(index=0)
+    ids = [BATCHED_FIELD_IDS['power.draw'],
+           BATCHED_FIELD_IDS['enforced.power.limit']]
+    when(N).nvmlDeviceGetFieldValues(handle, ids).thenReturn([
+        _field_value(ids[0][0], 125000),
+        _field_value(ids[1][0], 0, ret=N.NVML_ERROR_NOT_SUPPORTED),
+    ])
+
+    values = nvml.get_field_values(handle, BATCHED_FIELD_IDS)
+    # unsupported fields are left out so that the caller can fall back
+    assert values == {'power.draw': 125000}
+    assert nvml._has_field_values is True
+
+
+def test_get_field_values_unsupported_fields():
+    handle = types.SimpleNamespace(index=0)
+    ids = [BATCHED_FIELD_IDS['power.draw'],
+           BATCHED_FIELD_IDS['enforced.power.limit']]
+    when(N).nvmlDeviceGetFieldValues(handle, ids).thenReturn([
+        _field_value(ids[0][0], 0, ret=N.NVML_ERROR_NOT_SUPPORTED),
+        _field_value(ids[1][0], 0, ret=N.NVML_ERROR_NOT_SUPPORTED),
+    ])
+    assert nvml.get_field_values(handle, BATCHED_FIELD_IDS, device='GPU-0') \
+        == {}
+
+    # the device is not asked for them again, on later refreshes
+    unstub()
+    assert nvml.get_field_values(handle, BATCHED_FIELD_IDS, device='GPU-0') \
+        == {}
+
+
+def test_get_field_values_unsupported_driver():
+    handle = types.SimpleNamespace(index=0)
+    when(N).nvmlDeviceGetFieldValues(...)\
+        .thenRaise(N.NVMLError(N.NVML_ERROR_FUNCTION_NOT_FOUND))
+
+    assert nvml.get_field_values(handle, BATCHED_FIELD_IDS) == {}
+    assert nvml._has_field_values is False
+
+    # once known to be missing, the driver is not asked again
+    unstub()
+    assert nvml.get_field_values(handle, BATCHED_FIELD_IDS) == {}
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,196 @@
+"""
+``npustat pick``: choose the least-loaded devices (or NPU clusters) for the
+next job.
+
+Devices are ranked by their utilization averaged over a short window of
+samples rather than a single reading, then by the number of processes
+already running on them and by free memory. The result prints as a plain
+comma-separated list, ready for an environment variable:
+
+    export NPU_DEVICES=$(npustat pick --npu --count 2 --mem 4096)
+"""
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from npustat.util import parse_duration
+from npustat.wait import gpu_reader, npu_reader
+
+
+@dataclass
+class Candidate:
+    """A device, or one cluster of an NPU, with its load over the window."""
+    family: str  # 'npu' or 'gpu'
+    index: int
+    cluster: Optional[int]  # NPU cluster index when ranking clusters
+    utilization: float  # mean over the window, percent
+    memory_free: int  # lowest over the window, MB
+    processes: int  # processes running on the device at the last sample
+
+    @property
+    def label(self) -> str:
+        """'2' for a device, '2:1' for cluster 1 of device 2."""
+        if self.cluster is None:
+            return str(self.index)
+        return f'{self.index}:{self.cluster}'
+
+    @property
+    def sort_key(self):
+        return (self.utilization, self.processes, -self.memory_free,
+                self.index, self.cluster or 0)
+
+
+def rank_devices(family: str = 'npu', *,
+                 indices: Optional[Sequence[int]] = None,
+                 mem: int = 0,
+                 per_cluster: bool = False,
+                 window: float = 1.0,
+                 samples: int = 5,
+                 sleep: Callable[[float], None] = time.sleep,
+                 ) -> List[Candidate]:
+    """Rank devices (or NPU clusters) from the least loaded.
+
+    Args:
+        family: 'npu' or 'gpu'
+        indices: Devices to consider (default: all of the family)
+        mem: Drop devices with less than `mem` MB free at any sample
+        per_cluster: Rank the clusters of each NPU instead of whole devices
+        window: Seconds over which utilization is averaged
+        samples: Number of samples taken over the window
+        sleep: Sleep function, for testing
+
+    Returns:
+        The candidates, least loaded first. Devices that could not be read
+        at every sample are left out: a failing read is not an idle device.
+    """
+    if family not in ('npu', 'gpu'):
+        raise ValueError(f"Unknown device family: {family!r}")
+    if per_cluster and family != 'npu':
+        raise ValueError("Only NPUs have clusters.")
+
+    groups = ['memory', 'utilization', 'processes']
+    if per_cluster:
+        groups.append('cores')
+    if family == 'npu':
+        from npustat.npu import npu_count
+        read = npu_reader(groups, strict=True)
+        count = npu_count()
+    else:
+        from npustat.nvml import pynvml as N
+        read = gpu_reader(groups)
+        count = N.nvmlDeviceGetCount()
+    if indices is None:
+        indices = range(count)
+
+    samples = max(samples, 1)
+    utilization: Dict[tuple, List[float]] = {}
+    memory_free: Dict[int, int] = {}
+    processes: Dict[int, int] = {}
+    unreadable = set()
+    for n in range(samples):
+        if n:
+            sleep(window / (samples - 1))
+        for index in indices:
+            if index in unreadable:
+                continue
+            try:
+                values = read(index)
+            except Exception:  # pylint: disable=broad-exception-caught
+                unreadable.add(index)
+                continue
+            free = values['memory_total'] - values['memory_used']
+            memory_free[index] = min(memory_free.get(index, free), free)
+            processes[index] = len(values['processes'])
+            if not per_cluster:
+                utilization.setdefault((index, None), []).append(
+                    values['utilization'])
+                continue
+            # a cluster's load is that of its global core
+            for core in values['cores']:
+                if core.is_global:
+                    utilization.setdefault((index, core.cluster), []).append(
+                        core.utilization)
+
+    candidates = [
+        Candidate(family=family, index=index, cluster=cluster,
+                  utilization=sum(values) / len(values),
+                  memory_free=memory_free[index],
+                  processes=processes[index])
+        for (index, cluster), values in utilization.items()
+        if index not in unreadable and memory_free[index] >= mem
+    ]
+    return sorted(candidates, key=lambda c: c.sort_key)
+
+
+def pick_devices(count: int = 1, family: str = 'npu',
+                 **kwargs) -> List[Candidate]:
+    """The `count` least-loaded devices (or clusters), see rank_devices.
+
+    Fewer are returned if not enough of them satisfy the memory requirement.
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+    return rank_devices(family, **kwargs)[:count]
+
+
+def main(argv: List[str]) -> int:
+    """Entry point of ``npustat pick``; argv[0] is the subcommand name."""
+    parser = argparse.ArgumentParser(
+        'npustat pick',
+        description='Print the least-loaded devices for the next job, e.g. '
+                    '`export NPU_DEVICES=$(npustat pick --npu --count 2 '
+                    '--mem 4096)`. Exits 1 if not enough devices qualify.')
+    family = parser.add_mutually_exclusive_group()
+    family.add_argument('--npu', dest='family', action='store_const',
+                        const='npu', default='npu',
+                        help='Pick NPUs (the default)')
+    family.add_argument('--gpu', dest='family', action='store_const',
+                        const='gpu', help='Pick GPUs')
+    parser.add_argument('-n', '--count', type=int, default=1,
+                        help='Number of devices to pick (default: 1)')
+    parser.add_argument('-m', '--mem', type=int, default=0, metavar='MB',
+                        help='Minimum free device memory in MB')
+    parser.add_argument('--cluster', action='store_true',
+                        help='Pick NPU clusters (printed as DEVICE:CLUSTER) '
+                             'instead of whole devices')
+    parser.add_argument('--window', type=parse_duration, default=1.0,
+                        metavar='DURATION',
+                        help='Average utilization over DURATION '
+                             '(default: 1s)')
+    parser.add_argument('--samples', type=int, default=5,
+                        help='Number of samples over the window (default: 5)')
+    parser.add_argument('--export', metavar='VAR', default=None,
+                        help='Print VAR=LIST instead of LIST')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Also print the ranking to standard error')
+    args = parser.parse_args(argv[1:])
+    if args.count < 1:
+        parser.error('--count must be at least 1')
+
+    try:
+        ranked = rank_devices(args.family, mem=args.mem,
+                              per_cluster=args.cluster, window=args.window,
+                              samples=args.samples)
+    except ValueError as e:
+        parser.error(str(e))
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        sys.stderr.write(f'npustat pick: cannot query the devices: {e}\n')
+        return 2
+
+    if args.verbose:
+        for c in ranked:
+            sys.stderr.write(f'{args.family}{c.label}: {c.utilization:.1f}% '
+                             f'over {args.window:g}s, {c.memory_free} MB free, '
+                             f'{c.processes} processes\n')
+
+    picked = ranked[:args.count]
+    value = ','.join(c.label for c in picked)
+    print(f'{args.export}={value}' if args.export else value)
+    if len(picked) < args.count:
+        sys.stderr.write(f'npustat pick: only {len(picked)} of {args.count} '
+                         f'devices qualify.\n')
+        return 1
+    return 0
@@ -0,0 +1,68 @@
+import sys
+
+import pytest
+
+from npustat import cli
+from npustat.conftest import aries, core_info
+from npustat.pick import pick_devices, rank_devices
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def three_npus(fake_mbltml):
+    fake_mbltml.devices[:] = [
+        aries(0, utilization=50.0),
+        aries(1, utilization=5.0, memory_used=15000, cores=[
+            core_info(0, -1, 900_000), core_info(1, -1, 100_000)]),
+        aries(2, utilization=20.0),
+    ]
+    return fake_mbltml
+
+
+def test_rank_by_windowed_utilization(three_npus):
+    devices = three_npus.devices
+    readings = iter([0.0, 0.0, 0.0])  # N0 was busy, then goes idle
+
+    def sleep(_):
+        devices[0]['TotalUtilization'] = next(readings)
+
+    ranked = rank_devices('npu', window=1.0, samples=4, sleep=sleep)
+    # N0 averages 12.5% over the window: less loaded than N2's steady 20%
+    assert [c.label for c in ranked] == ['1', '0', '2']
+    assert ranked[1].utilization == pytest.approx(12.5)
+
+    # N1 has only 1384 MB free
+    assert [c.label for c in pick_devices(2, mem=4096, samples=1)] == \
+        ['0', '2']
+
+
+def test_rank_clusters(three_npus):
+    ranked = rank_devices('npu', indices=[1], per_cluster=True, samples=1)
+    assert [(c.label, c.utilization) for c in ranked] == \
+        [('1:1', 10.0), ('1:0', 90.0)]
+
+
+def test_unreadable_device_is_not_picked(three_npus):
+    # would read as 0 % utilization and 0 MB used: the least loaded
+    del three_npus.devices[0]['TotalUtilization']
+    del three_npus.devices[0]['MemoryUsage']
+    assert [c.label for c in rank_devices('npu', samples=1)] == ['1', '2']
+    with pytest.raises(ValueError):
+        pick_devices(0)
+
+
+def test_pick_cli(three_npus, capsys):
+    assert cli.main('npustat', 'pick', '--count', '2', '--samples', '1',
+                    '--export', 'NPU_DEVICES') == 0
+    assert capsys.readouterr().out == 'NPU_DEVICES=1,2\n'
+    assert cli.main('npustat', 'pick', '-n', '3', '--mem', '4096',
+                    '--samples', '1') == 1
+    assert capsys.readouterr().out == '2,0\n'
+    for count in ('0', '-1'):  # would print nothing
+        with pytest.raises(SystemExit):
+            cli.main('npustat', 'pick', '--count', count)
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,148 @@
+"""
+Per-device-class, per-field polling of Mobilint NPUs.
+
+USB-attached Regulus boards answer much more slowly than PCIe Aries cards,
+and some values (temperature, clocks) change far more slowly than the core
+activity. An NPUPoller reads each field group of each device only when the
+PollingPolicy says it is due, and hands out the latest value of every group
+together with its age, so one slow device does not set the pace for all.
+"""
+
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from npustat import npu
+from npustat.npu import DEVICE_TYPE_NAMES, FIELD_GROUPS, NPUDriverVersions, NPUInfo
+
+
+@dataclass
+class PollingPolicy:
+    """Minimum interval (in seconds) between two reads of a field group.
+
+    The interval of a field group on a device is the larger of the interval
+    of the device class (e.g. ``Regulus(USB)``) and that of the field group
+    (e.g. ``temperature``); 0 means every tick.
+    """
+    device_class_intervals: Dict[str, float] = field(default_factory=dict)
+    field_intervals: Dict[str, float] = field(default_factory=dict)
+
+    def interval(self, device_class: str, group: str) -> float:
+        return max(self.device_class_intervals.get(device_class, 0.0),
+                   self.field_intervals.get(group, 0.0))
+
+    @classmethod
+    def parse(cls, spec: str, base: Optional['PollingPolicy'] = None
+              ) -> 'PollingPolicy':
+        """Parse a policy like ``Regulus(USB)=2,temperature=5,clock=10``.
+
+        Keys are either a device class name (see DEVICE_TYPE_NAMES) or a
+        field group name (see FIELD_GROUPS). Settings override `base`.
+        """
+        policy = cls(dict(base.device_class_intervals) if base else {},
+                     dict(base.field_intervals) if base else {})
+        for item in filter(None, (s.strip() for s in spec.split(','))):
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise ValueError(f"Invalid polling policy entry: {item!r}")
+            key = key.strip()
+            interval = float(value)
+            if interval < 0:
+                raise ValueError(f"Negative polling interval: {item!r}")
+            if key in DEVICE_TYPE_NAMES.values():
+                policy.device_class_intervals[key] = interval
+            elif key in FIELD_GROUPS:
+                policy.field_intervals[key] = interval
+            else:
+                raise ValueError(
+                    f"Unknown device class or field group: {key!r} "
+                    f"(expected one of {', '.join(DEVICE_TYPE_NAMES.values())}"
+                    f", {', '.join(FIELD_GROUPS)})")
+        return policy
+
+
+DEFAULT_POLICY = PollingPolicy(
+    device_class_intervals={'Regulus(USB)': 2.0},
+    field_intervals={
+        'static': math.inf,  # identity, firmware and PCIe are read once
+        'temperature': 5.0,
+        'fan': 5.0,
+        'clock': 5.0,
+    },
+)
+
+
+class NPUPoller:
+    """Polls NPUs field group by field group according to a PollingPolicy.
+
+    Keep one poller alive across refreshes (e.g. in watch mode); every call
+    to poll() only talks to the driver for the field groups that are due.
+    """
+
+    def __init__(self, policy: Optional[PollingPolicy] = None, *,
+                 clock: Callable[[], float] = time.monotonic):
+        self.policy = policy if policy is not None else DEFAULT_POLICY
+        self.clock = clock
+        # dev_no -> group -> (values, monotonic read time)
+        self._cache: Dict[int, Dict[str, Tuple[Dict[str, Any], float]]] = {}
+        self._drivers: Optional[NPUDriverVersions] = None
+
+    def latest(self, dev_no: int, group: str
+               ) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+        """The latest values of a field group and their age in seconds."""
+        entry = self._cache.get(dev_no, {}).get(group)
+        if entry is None:
+            return None, None
+        values, read_at = entry
+        return values, self.clock() - read_at
+
+    def poll(self) -> Tuple[List[NPUInfo], NPUDriverVersions]:
+        """Query every NPU, reading only the field groups that are due."""
+        try:
+            npu.ensure_initialized()
+            count = npu.mbltml.mbltmlGetDeviceCount()
+            for dev_no in [d for d in self._cache if d >= count]:
+                del self._cache[dev_no]  # unplugged
+            npus = [self._poll_device(dev_no) for dev_no in range(count)]
+            if self._drivers is None:
+                self._drivers = npu._query_driver_versions()
+            return npus, self._drivers
+        except RuntimeError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to query Mobilint NPUs: {e}") from e
+
+    def _poll_device(self, dev_no: int) -> NPUInfo:
+        cache = self._cache.setdefault(dev_no, {})
+        now = self.clock()
+        static = cache.get('static')
+        device_class = DEVICE_TYPE_NAMES.get(
+            static[0]['device_type'], '') if static else ''
+        due = [group for group in FIELD_GROUPS if group not in cache
+               or now - cache[group][1] >= self.policy.interval(device_class,
+                                                                group)]
+        # The cached values belong to the device that dev_no named when they
+        # were read; another device (e.g. after a hot-plug) starts afresh.
+        if static is not None and due and 'static' not in due and \
+                self._node_name(dev_no) != static[0]['node_name']:
+            cache.clear()
+            due = list(FIELD_GROUPS)
+
+        values: Dict[str, Any] = {}
+        ages: Dict[str, float] = {}
+        for group, read in FIELD_GROUPS.items():
+            if group in due:
+                cache[group] = (read(dev_no), now)
+            group_values, read_at = cache[group]
+            values.update(group_values)
+            ages[group] = now - read_at
+        return NPUInfo(index=dev_no, field_ages=ages, **values)
+
+    @staticmethod
+    def _node_name(dev_no: int) -> Optional[str]:
+        """The device node of dev_no, one cheap call; None if unreadable."""
+        try:
+            return npu.mbltml.mbltmlGetNodeName(dev_no) or ''
+        except Exception:  # pylint: disable=broad-exception-caught
+            return None
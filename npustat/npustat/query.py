@@ -0,0 +1,302 @@
+"""
+``npustat --format csv|tsv --query COLUMNS``: selected columns as rows, in
+the spirit of ``nvidia-smi --query-gpu``.
+
+    $ npustat --format csv --query index,name,utilization,core.* -i 1
+    index,name,utilization,core.label,core.cluster,core.core,...
+    0,Aries(aries0),8.00,C0/G,0,-1,...
+
+The header is the list of columns as given (``core.*`` expanded) and never
+changes during a run. Rows are written and flushed tick by tick, one per
+device, or one per NPU core when a ``core.*`` column is selected. Only the
+field groups behind the selected columns are read (see npu.FIELD_GROUPS and
+wait.gpu_reader); the static ones, which never change at runtime, only once.
+A column that does not apply to a device is left empty.
+
+``utilization.avg.WINDOW`` (and ``core.utilization.avg.WINDOW``) is the
+rolling average of the utilization over WINDOW, e.g. ``10s``, as ``--avg``
+shows it (see rolling.py); it settles over the ticks of a ``-i`` run.
+"""
+
+import csv
+import os
+import sys
+from datetime import datetime
+from typing import (IO, Any, Callable, Dict, Iterator, List, Optional,
+                    Sequence, Tuple)
+
+from npustat.npu import DEVICE_TYPE_NAMES, HARDWARE_VERSION_NAMES
+from npustat.rolling import RollingAverages
+from npustat.scheduler import FixedRateScheduler
+from npustat.util import parse_duration
+
+FORMATS = {'csv': ',', 'tsv': '\t'}
+
+DEFAULT_QUERY = 'timestamp,device,name,utilization,memory.used,' \
+    'memory.total,power.total'
+
+# column -> (field group read for it, its value from the values read)
+Column = Tuple[str, Callable[[Dict[str, Any]], Any]]
+
+NPU_COLUMNS: Dict[str, Column] = {
+    'name': ('static', lambda v: '{}({})'.format(
+        DEVICE_TYPE_NAMES.get(v['device_type'], 'NPU'),
+        os.path.basename(v['node_name']))),
+    'node_name': ('static', lambda v: v['node_name']),
+    'chip': ('static', lambda v: HARDWARE_VERSION_NAMES.get(
+        v['hardware_version'], 'Unknown')),
+    'firmware_version': ('static', lambda v: v['firmware_version']),
+    'firmware_revision': ('static', lambda v: v['firmware_revision']),
+    'temperature': ('temperature', lambda v: v['temperature']),
+    'fan_duty': ('fan', lambda v: v['fan_duty']),
+    'memory.used': ('memory', lambda v: v['memory_used']),
+    'memory.total': ('memory', lambda v: v['memory_total']),
+    'utilization': ('utilization', lambda v: v['utilization']),
+    'power.npu': ('power', lambda v: v['extra_rail_power']
+                  if v['extra_rail'] == 0 else None),
+    'power.total': ('power', lambda v: v['power_total']),
+    'current.total': ('power', lambda v: v['current_total']),
+    'voltage.total': ('power', lambda v: v['voltage_total']),
+    'clock.npu': ('clock', lambda v: v['clock_npu']),
+    'clock.bus': ('clock', lambda v: v['clock_bus']),
+}
+
+GPU_COLUMNS: Dict[str, Column] = {
+    'name': ('static', lambda v: v['name']),
+    'uuid': ('static', lambda v: v['uuid']),
+    'temperature': ('temperature', lambda v: v['temperature']),
+    'memory.used': ('memory', lambda v: v['memory_used']),
+    'memory.total': ('memory', lambda v: v['memory_total']),
+    'utilization': ('utilization', lambda v: v['utilization']),
+    'power.total': ('power', lambda v: v['power_total']),
+}
+
+# core.<name>: attributes of an npu.NPUCore, in the order of ``core.*``
+CORE_COLUMNS = ('label', 'cluster', 'core', 'is_global', 'is_active',
+                'utilization', 'npu_time_us', 'interval_us')
+
+# the same for every device
+COMMON_COLUMNS = ('timestamp', 'device', 'index')
+
+# utilization.avg.<window> and core.utilization.avg.<window>, e.g. 10s
+AVG_PREFIX = 'utilization.avg.'
+
+
+def _avg_window(column: str) -> Optional[str]:
+    """The window of a rolling average column, e.g. '10s'; else None."""
+    if column.startswith('core.'):
+        column = column[len('core.'):]
+    if column.startswith(AVG_PREFIX):
+        return column[len(AVG_PREFIX):]
+    return None
+
+
+def parse_columns(spec: str) -> List[str]:
+    """The columns of a --query, e.g. 'index,utilization,core.*'."""
+    known = set(COMMON_COLUMNS) | set(NPU_COLUMNS) | set(GPU_COLUMNS) | \
+        {f'core.{c}' for c in CORE_COLUMNS}
+    columns = []
+    for column in (c.strip() for c in spec.split(',')):
+        window = _avg_window(column)
+        if column == 'core.*':
+            columns.extend(f'core.{c}' for c in CORE_COLUMNS)
+        elif column in known:
+            columns.append(column)
+        elif window is not None:
+            if not parse_duration(window) > 0:
+                raise ValueError(f"Window must be positive: '{column}'")
+            columns.append(column)
+        else:
+            raise ValueError(
+                f"Unknown column '{column}' (expected one of: "
+                f"{', '.join(sorted(known))}, core.*, "
+                f"{AVG_PREFIX}WINDOW, core.{AVG_PREFIX}WINDOW)")
+    if not columns:
+        raise ValueError('No column given')
+    return columns
+
+
+def _format(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return str(value)
+
+
+class _Device:
+    """Reads the columns of one device; its static group only once."""
+
+    def __init__(self, label: str, index: int, columns: Dict[str, Column],
+                 read: Optional[Callable[[int], Dict[str, Any]]],
+                 read_static: Optional[Callable[[int], Dict[str, Any]]]):
+        self.label = label
+        self.index = index
+        self.columns = columns
+        self._read = read
+        self._read_static = read_static
+        self._static: Optional[Dict[str, Any]] = None
+
+    def read(self) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        if self._read_static is not None:
+            if self._static is None:
+                self._static = self._read_static(self.index)
+            values.update(self._static)
+        if self._read is not None:
+            values.update(self._read(self.index))
+        return values
+
+
+class QueryTable:
+    """The rows of the selected columns of every device, tick by tick.
+
+    Usage:
+        table = QueryTable(parse_columns('index,utilization,core.*'))
+        for row in table.rows():
+            ...
+    """
+
+    def __init__(self, columns: Sequence[str], *, gpu: bool = True,
+                 npu: bool = True, gpu_ids: Optional[Sequence[int]] = None,
+                 clock: Callable[[], datetime] = datetime.now):
+        self.columns = list(columns)
+        self.clock = clock
+        self.per_core = any(c.startswith('core.') for c in self.columns)
+        # column -> window of the rolling averages, kept across ticks
+        self._avg_columns = {c: _avg_window(c) for c in self.columns
+                             if _avg_window(c) is not None}
+        self._core_averages = any(c.startswith('core.')
+                                  for c in self._avg_columns)
+        self.averages: Optional[RollingAverages] = None
+        if self._avg_columns:
+            self.averages = RollingAverages(
+                list(dict.fromkeys(self._avg_columns.values())))
+        self.devices: List[_Device] = []
+        if gpu:
+            self._add_family('G', GPU_COLUMNS, self._gpus, gpu_ids)
+        if npu:
+            self._add_family('N', NPU_COLUMNS, self._npus)
+
+    @staticmethod
+    def _gpus():
+        from npustat.nvml import pynvml as N
+        from npustat.wait import gpu_reader
+        return gpu_reader, N.nvmlDeviceGetCount()
+
+    @staticmethod
+    def _npus():
+        from npustat.npu import npu_count
+        from npustat.wait import npu_reader
+        return npu_reader, npu_count()
+
+    def _add_family(self, prefix: str, family_columns: Dict[str, Column],
+                    family, indices: Optional[Sequence[int]] = None):
+        groups = {family_columns[c][0] for c in self.columns
+                  if c in family_columns}
+        if any(not c.startswith('core.') for c in self._avg_columns):
+            groups.add('utilization')
+        if prefix == 'N' and self.per_core:
+            groups.add('cores')
+        try:
+            reader, count = family()
+            dynamic = sorted(groups - {'static'})
+            read = reader(dynamic) if dynamic else None
+            read_static = reader(['static']) if 'static' in groups else None
+        except Exception:  # pylint: disable=broad-exception-caught
+            reader, count = None, 0  # e.g. no NVIDIA driver
+        if indices is not None:
+            invalid = [i for i in indices if not 0 <= i < count]
+            if invalid:
+                name = 'GPU' if prefix == 'G' else 'NPU'
+                raise ValueError(
+                    f"No {name} with index {', '.join(map(str, invalid))} "
+                    f"({count} {name}s found)")
+        if reader is None:
+            return  # show the other family only
+        for index in range(count) if indices is None else indices:
+            self.devices.append(_Device(f'{prefix}{index}', index,
+                                        family_columns, read, read_static))
+
+    def rows(self) -> Iterator[List[str]]:
+        """Read every device once and yield its rows, formatted."""
+        now = self.clock()
+        timestamp = now.isoformat(timespec='milliseconds')
+        for device in self.devices:
+            try:
+                values = device.read()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                sys.stderr.write(f'npustat: cannot read {device.label}: '
+                                 f'{e}\n')
+                continue
+            common = {'timestamp': timestamp, 'device': device.label,
+                      'index': device.index}
+            averages = None
+            if self.averages is not None:
+                averages = self.averages.update(
+                    device.label, now.timestamp(), values.get('utilization'))
+            row = []
+            for column in self.columns:
+                if column in common:
+                    row.append(_format(common[column]))
+                elif column in device.columns:
+                    _, value = device.columns[column]
+                    row.append(_format(value(values)))
+                elif averages and not column.startswith('core.') and \
+                        column in self._avg_columns:
+                    row.append(_format(averages[self._avg_columns[column]]))
+                else:
+                    row.append('')  # a core column, or n/a for the device
+            cores = values.get('cores') if self.per_core else None
+            if not cores:
+                yield row
+                continue
+            for core in cores:
+                core_averages = None
+                if self._core_averages:
+                    core_averages = self.averages.update(  # type: ignore
+                        f'{device.label}/{core.label}', now.timestamp(),
+                        core.utilization)
+                yield [self._core_cell(core, column, core_averages)
+                       if column.startswith('core.') else cell
+                       for column, cell in zip(self.columns, row)]
+
+    def _core_cell(self, core, column: str,
+                   averages: Optional[Dict[str, float]]) -> str:
+        window = self._avg_columns.get(column)
+        if window is None:
+            return _format(getattr(core, column[len('core.'):]))
+        return _format(averages[window] if averages else None)
+
+
+def write_table(table: QueryTable, fmt: str = 'csv', interval: float = 0,
+                *, fp: Optional[IO[str]] = None) -> int:
+    """Write the header, then the rows of every tick as they are read.
+
+    Args:
+        table: The devices and columns, e.g.
+            ``QueryTable(parse_columns(...), gpu_ids=[0, 2])``
+        fmt: 'csv' or 'tsv'
+        interval: Seconds between ticks; 0 for a single one
+        fp: Where to write (default: sys.stdout)
+
+    Returns:
+        The exit status: 1 if there is no device, else 0.
+    """
+    fp = fp or sys.stdout
+    if not table.devices:
+        sys.stderr.write('No GPU or NPU was detected.\n')
+        return 1
+    writer = csv.writer(fp, delimiter=FORMATS[fmt], lineterminator='\n')
+    writer.writerow(table.columns)
+    scheduler = FixedRateScheduler(interval) if interval > 0 else None
+    try:
+        while True:
+            if scheduler is not None:
+                scheduler.wait()
+            writer.writerows(table.rows())
+            fp.flush()
+            if scheduler is None:
+                return 0
+    except KeyboardInterrupt:
+        return 0
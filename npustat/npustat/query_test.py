@@ -0,0 +1,110 @@
+import csv
+import io
+import sys
+from datetime import datetime
+
+import pytest
+
+from npustat import cli
+from npustat.conftest import aries, core_info, regulus_usb
+from npustat.query import CORE_COLUMNS, QueryTable, parse_columns
+
+
+def test_parse_columns():
+    assert parse_columns('index, name,core.*') == \
+        ['index', 'name'] + [f'core.{c}' for c in CORE_COLUMNS]
+    with pytest.raises(ValueError, match="'memory.usd'"):
+        parse_columns('index,memory.usd')
+
+
+def test_only_selected_groups(fake_mbltml):
+    table = QueryTable(parse_columns('device,utilization,memory.used'),
+                       gpu=False)
+    rows = list(table.rows())
+    assert [row[0] for row in rows] == ['N0', 'N1']
+    assert rows[0] == ['N0', '8.00', '426']
+    calls = fake_mbltml.calls
+    assert calls[(0, 'TotalUtilization')] == 1
+    assert calls[(0, 'MemoryUsage')] == 1
+    for getter in ('Temperature', 'TotalPower', 'CoreInfos', 'ProcessInfos',
+                   'NodeName', 'FirmwareVersion'):
+        assert calls[(0, getter)] == 0, getter
+
+
+def test_static_read_once(fake_mbltml):
+    table = QueryTable(parse_columns('name,temperature'), gpu=False)
+    for _ in range(3):
+        rows = list(table.rows())
+    assert rows[0] == ['Aries(aries0)', '46']
+    assert fake_mbltml.calls[(0, 'NodeName')] == 1
+    assert fake_mbltml.calls[(0, 'Temperature')] == 3
+
+
+def test_row_per_core(fake_mbltml):
+    fake_mbltml.devices[:] = [
+        aries(0, cores=[core_info(0, -1, 250_000), core_info(0, 0, 0)]),
+        regulus_usb(1)]
+    fake_mbltml.devices[1]['CoreInfos'] = []
+    table = QueryTable(parse_columns('index,core.label,core.utilization'),
+                       gpu=False)
+    assert list(table.rows()) == [
+        ['0', 'C0/G', '25.00'], ['0', 'C0/c0', '0.00'],
+        ['1', '', '']]
+
+
+def test_rolling_average_columns(fake_mbltml):
+    fake_mbltml.devices[:] = [
+        aries(0, cores=[core_info(0, 0, 250_000)], utilization=10)]
+    times = iter([datetime(2026, 1, 1, 0, 0, s) for s in (0, 1)])
+    table = QueryTable(
+        parse_columns('device,utilization.avg.1s,utilization.avg.60s,'
+                      'core.label,core.utilization.avg.1s'),
+        gpu=False, clock=lambda: next(times))
+    assert list(table.rows()) == [['N0', '10.00', '10.00', 'C0/c0', '25.00']]
+
+    fake_mbltml.devices[0]['TotalUtilization'] = 100
+    (row,) = table.rows()
+    # the short window follows the new value faster than the long one
+    assert 10 < float(row[2]) < 100 and float(row[2]) < float(row[1])
+    assert fake_mbltml.calls[(0, 'TotalUtilization')] == 2
+
+    with pytest.raises(ValueError, match='utilization.avg.0s'):
+        parse_columns('utilization.avg.0s')
+    with pytest.raises(ValueError, match='Invalid duration'):
+        parse_columns('utilization.avg.soon')
+
+
+def test_format_cli(fake_mbltml, capsys):
+    status = cli.main('npustat', '--npu-only', '--format', 'tsv',
+                      '--query', 'index,name,power.total')
+    assert status == 0
+    out = capsys.readouterr().out
+    rows = list(csv.reader(io.StringIO(out), delimiter='\t'))
+    assert rows[0] == ['index', 'name', 'power.total']
+    assert [r[0] for r in rows[1:]] == ['0', '1']
+
+    with pytest.raises(SystemExit):
+        cli.main('npustat', '--query', 'index')  # without --format
+    for option in ('--max-age=10', '--shm', '--compact', '--show-pid',
+                   '--alert=npu.temperature > 85', '--json'):
+        with pytest.raises(SystemExit):  # would be silently ignored
+            cli.main('npustat', '--npu-only', '--format', 'csv', option)
+    assert option in capsys.readouterr().err
+
+
+def test_gpu_ids(fake_mbltml, monkeypatch, capsys):
+    monkeypatch.setattr(QueryTable, '_gpus',
+                        staticmethod(lambda: (lambda groups: None, 4)))
+    table = QueryTable(['device'], npu=False, gpu_ids=[3, 1])
+    assert [d.label for d in table.devices] == ['G3', 'G1']
+
+    with pytest.raises(ValueError, match='No GPU with index 4, -1'):
+        QueryTable(['device'], npu=False, gpu_ids=[4, 0, -1])
+    with pytest.raises(SystemExit):  # before the header is written
+        cli.main('npustat', '--format', 'csv', '--id', '1,7')
+    out, err = capsys.readouterr()
+    assert out == '' and 'No GPU with index 7 (4 GPUs found)' in err
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,119 @@
+"""
+Load-average style rolling utilization (1 s / 10 s / 60 s by default).
+
+Each window is an exponentially weighted moving average whose decay depends
+on the time elapsed between samples, like the kernel's load average, so it
+stays correct when ticks are late or irregular. An update costs O(1) per
+window and keeps no sample history.
+"""
+
+import math
+from typing import Dict, Optional, Sequence, Tuple
+
+from npustat.util import parse_duration
+
+DEFAULT_WINDOWS = ('1s', '10s', '60s')
+
+
+class EWMA:
+    """A time-decayed exponentially weighted moving average."""
+
+    __slots__ = ('window', 'value', 'timestamp')
+
+    def __init__(self, window: float):
+        if window <= 0:
+            raise ValueError("window must be positive.")
+        self.window = window  # seconds; the time constant of the decay
+        self.value: Optional[float] = None
+        self.timestamp: Optional[float] = None
+
+    def update(self, timestamp: float, value: float) -> float:
+        if self.value is None or self.timestamp is None:
+            self.value = float(value)
+        else:
+            elapsed = timestamp - self.timestamp
+            if elapsed <= 0:
+                return self.value  # duplicate or out-of-order sample
+            decay = math.exp(-elapsed / self.window)
+            self.value = decay * self.value + (1.0 - decay) * value
+        self.timestamp = timestamp
+        return self.value
+
+
+class RollingAverages:
+    """Rolling averages of many series, keyed by device or core.
+
+    Usage:
+        averages = RollingAverages(['1s', '10s', '60s'])
+        averages.update('N0', time.time(), 42.0)  # {'1s': .., '10s': .., ..}
+    """
+
+    def __init__(self, windows: Sequence[str] = DEFAULT_WINDOWS):
+        if not windows:
+            raise ValueError("At least one window is required.")
+        # validate the window names once, keep them as given for display
+        self.windows: Tuple[Tuple[str, float], ...] = tuple(
+            (name, parse_duration(name)) for name in windows)
+        for name, seconds in self.windows:
+            if seconds <= 0:
+                raise ValueError(f"Window must be positive: {name!r}")
+        self._series: Dict[str, Tuple[EWMA, ...]] = {}
+
+    @classmethod
+    def parse(cls, spec: str) -> 'RollingAverages':
+        """Build from a comma-separated list such as '1s,10s,60s'."""
+        return cls([w.strip() for w in spec.split(',') if w.strip()])
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return tuple(name for name, _ in self.windows)
+
+    def update(self, key: str, timestamp: float,
+               value: Optional[float]) -> Optional[Dict[str, float]]:
+        """Add a sample to the series `key`; returns its averages, by window.
+
+        A None value (not supported) leaves the series as it is.
+        """
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = tuple(
+                EWMA(seconds) for _, seconds in self.windows)
+        if value is not None:
+            for ewma in series:
+                ewma.update(timestamp, value)
+        if series[0].value is None:
+            return None
+        return {name: ewma.value for (name, _), ewma in  # type: ignore
+                zip(self.windows, series)}
+
+    def get(self, key: str) -> Optional[Dict[str, float]]:
+        series = self._series.get(key)
+        if series is None or series[0].value is None:
+            return None
+        return {name: ewma.value for (name, _), ewma in  # type: ignore
+                zip(self.windows, series)}
+
+    def observe(self, snapshot):
+        """Update from a sampler Snapshot and attach the averages to it.
+
+        GPUs get a 'utilization.avg' entry; NPUs get `averages` for the
+        device ('utilization') and for every core by label (e.g. 'C0/c1';
+        'C0/G' is the cluster as a whole).
+        """
+        timestamp = snapshot.query_time.timestamp()
+        for g in snapshot.gpu_stats or ():
+            g.entry['utilization.avg'] = self.update(
+                f'G{g.index}', timestamp, g.utilization)
+
+        for n in snapshot.npu_stats or ():
+            key = f'N{n.index}'
+            averages = {}
+            device = self.update(key, timestamp, n.utilization)
+            if device is not None:
+                averages['utilization'] = device
+            for core in n.cores:
+                core_avg = self.update(f'{key}/{core.label}', timestamp,
+                                       core.utilization)
+                if core_avg is not None:
+                    averages[core.label] = core_avg
+            n.entry.averages = averages
@@ -0,0 +1,76 @@
+import math
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from npustat import cli
+from npustat.conftest import aries
+from npustat.core_npu import NPUStatCollection
+from npustat.rolling import EWMA, RollingAverages
+from npustat.sampler import Snapshot
+from npustat.util import parse_duration
+
+
+def test_parse_duration():
+    assert parse_duration('500ms') == 0.5
+    assert parse_duration('10s') == 10
+    assert parse_duration('5m') == 300
+    assert parse_duration('2.5') == 2.5
+    with pytest.raises(ValueError):
+        parse_duration('ten seconds')
+
+
+def test_ewma_decays_with_elapsed_time():
+    ewma = EWMA(10.0)
+    assert ewma.update(0.0, 100.0) == 100.0
+    # one time constant later, 1/e of the old value remains
+    assert ewma.update(10.0, 0.0) == pytest.approx(100.0 / math.e)
+    assert ewma.update(10.0, 50.0) == pytest.approx(100.0 / math.e)  # dup
+    # two 5 s steps decay as much as one 10 s step
+    a, b = EWMA(10.0), EWMA(10.0)
+    a.update(0, 100.0), b.update(0, 100.0)
+    a.update(5, 0.0)
+    assert a.update(10, 0.0) == pytest.approx(b.update(10, 0.0))
+
+
+def test_rolling_averages_windows():
+    averages = RollingAverages.parse('1s,60s')
+    assert averages.update('N0', 0.0, None) is None
+    for t in range(1, 11):
+        avg = averages.update('N0', float(t), 100.0 if t > 5 else 0.0)
+    assert avg['1s'] > 99 and 0 < avg['60s'] < 10  # type: ignore
+    assert averages.get('N0') == avg
+    with pytest.raises(ValueError):
+        RollingAverages.parse('0s')
+
+
+def test_observe_snapshot(fake_mbltml):
+    fake_mbltml.devices[:] = [aries(0)]
+    averages = RollingAverages()
+    snapshot = Snapshot(seq=1, npu_stats=NPUStatCollection.new_query(),
+                        query_time=datetime(2026, 1, 1))
+    averages.observe(snapshot)
+    n = snapshot.npu_stats[0]
+    assert n.averages['utilization'] == {'1s': 8.0, '10s': 8.0, '60s': 8.0}
+    assert n.averages['C0/c0']['10s'] == pytest.approx(67.6)
+
+    o = n.jsonify()
+    assert o['utilization.avg']['60s'] == 8.0
+    assert o['cores'][1]['utilization.avg']['1s'] == pytest.approx(67.6)
+
+    fake_mbltml.devices[0]['TotalUtilization'] = 100.0
+    snapshot = Snapshot(seq=2, npu_stats=NPUStatCollection.new_query(),
+                        query_time=datetime(2026, 1, 1) + timedelta(seconds=1))
+    averages.observe(snapshot)
+    avg = snapshot.npu_stats[0].averages['utilization']
+    assert avg['1s'] > avg['10s'] > avg['60s'] > 8.0
+
+
+def test_avg_requires_interval(fake_mbltml):
+    with pytest.raises(SystemExit):  # would be silently ignored
+        cli.main('npustat', '--npu-only', '--avg')
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,280 @@
+"""
+``npustat run -- CMD``: perf-stat-style device accounting for a command.
+
+The command runs as a child process. At every tick, the process lists of
+the devices are matched against the PIDs of the child and all of its
+descendants; a device shows up in the report once one of them uses it, and
+only such devices get their utilization, memory, power and cores read.
+
+Attribution:
+
+- device time: on NPUs, the utilization mbltml attributes to the processes
+  of the tree; on GPUs (no per-process utilization in the process list),
+  the device utilization while the tree runs on it;
+- peak memory: the device memory of the tree's processes;
+- energy and per-core utilization: those of the whole device while the
+  tree runs on it.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import psutil
+
+from npustat.scheduler import FixedRateScheduler
+
+
+@dataclass
+class DeviceAccount:
+    """What the process tree used of one device."""
+    label: str  # e.g. N0
+    device_time: float = 0.0  # seconds of full utilization
+    memory_peak: int = 0  # MB, of the tree's processes
+    energy: float = 0.0  # joules, of the whole device while in use
+    samples: int = 0  # ticks the tree was on the device
+    utilization_total: float = 0.0  # sum over those ticks, percent
+    # core label -> (sum of the utilization, ticks)
+    cores: Dict[str, Tuple[float, int]] = field(default_factory=dict)
+    pids: Set[int] = field(default_factory=set)
+    # (time, power) of the previous tick on the device, for the energy
+    last_power: Optional[Tuple[float, float]] = field(default=None,
+                                                      repr=False)
+
+    @property
+    def utilization(self) -> float:
+        """Mean device utilization while the tree ran on it, percent."""
+        return self.utilization_total / self.samples if self.samples else 0.0
+
+    def jsonify(self) -> Dict[str, Any]:
+        return {
+            'device': self.label,
+            'device_time': self.device_time,
+            'memory.peak': self.memory_peak,
+            'energy': self.energy,
+            'utilization': self.utilization,
+            'cores': {label: total / n
+                      for label, (total, n) in sorted(self.cores.items())},
+            'pids': sorted(self.pids),
+        }
+
+
+class Accountant:
+    """Attributes device usage to the process tree of `root_pid`.
+
+    Usage:
+        accountant = Accountant(child.pid)
+        while child.poll() is None:
+            accountant.tick()
+        accountant.accounts   # {'N0': DeviceAccount(...), ...}
+    """
+
+    def __init__(self, root_pid: int, *, gpu: bool = True, npu: bool = True,
+                 clock: Callable[[], float] = time.monotonic):
+        self.root_pid = root_pid
+        self.clock = clock
+        self.accounts: Dict[str, DeviceAccount] = {}
+        # every live process seen in the tree, so that descendants that
+        # outlive their parent (and get re-parented) are still recognized;
+        # psutil.Process compares start times, so a PID reused after one of
+        # them exited is not taken for it
+        self.processes: Dict[int, psutil.Process] = {}
+        try:
+            self.processes[root_pid] = psutil.Process(root_pid)
+        except psutil.Error:
+            pass
+        # (label, read the processes, read the device values)
+        self.devices: List[Tuple[str, Callable[[], Any],
+                                 Callable[[], Dict[str, Any]]]] = []
+        self._last_tick: Optional[float] = None
+
+        from npustat.wait import gpu_reader, npu_reader
+        if npu:
+            try:
+                from npustat.npu import npu_count
+                procs = npu_reader(['processes'])
+                values = npu_reader(['utilization', 'memory', 'power',
+                                     'cores'])
+                for i in range(npu_count()):
+                    self.devices.append((f'N{i}',
+                                         lambda i=i: procs(i)['processes'],
+                                         lambda i=i: values(i)))
+            except Exception:  # pylint: disable=broad-exception-caught
+                pass  # no NPU: account the GPUs only
+        if gpu:
+            try:
+                from npustat.nvml import pynvml as N
+                gprocs = gpu_reader(['processes'])
+                gvalues = gpu_reader(['utilization', 'memory', 'power'])
+                for i in range(N.nvmlDeviceGetCount()):
+                    self.devices.append((f'G{i}',
+                                         lambda i=i: gprocs(i)['processes'],
+                                         lambda i=i: gvalues(i)))
+            except Exception:  # pylint: disable=broad-exception-caught
+                pass
+
+    def _tree(self) -> Set[int]:
+        self.processes = {pid: p for pid, p in self.processes.items()
+                          if p.is_running()}
+        root = self.processes.get(self.root_pid)
+        if root is None:
+            return set(self.processes)  # its known descendants may live on
+        try:
+            for p in root.children(recursive=True):
+                self.processes.setdefault(p.pid, p)
+        except psutil.Error:
+            pass  # the root exited meanwhile
+        return set(self.processes)
+
+    def tick(self):
+        """Match the device process lists against the tree once."""
+        now = self.clock()
+        dt = 0.0 if self._last_tick is None else now - self._last_tick
+        self._last_tick = now
+        tree = self._tree()
+
+        for label, read_processes, read_values in self.devices:
+            try:
+                ours = [p for p in read_processes() if p.pid in tree]
+            except Exception:  # pylint: disable=broad-exception-caught
+                continue
+            if not ours:
+                if label in self.accounts:
+                    # the energy is only counted while the tree is on it
+                    self.accounts[label].last_power = None
+                continue
+            try:
+                values = read_values()
+            except Exception:  # pylint: disable=broad-exception-caught
+                continue
+            account = self.accounts.get(label)
+            if account is None:
+                account = self.accounts[label] = DeviceAccount(label)
+            self._charge(account, ours, values, now, dt)
+
+    @staticmethod
+    def _charge(account: DeviceAccount, processes, values: Dict[str, Any],
+                now: float, dt: float):
+        account.pids.update(p.pid for p in processes)
+        if account.label.startswith('N'):
+            account.device_time += dt * sum(
+                p.utilization for p in processes) / 100.0
+            memory = sum(p.npu_memory for p in processes)
+        else:
+            account.device_time += dt * values['utilization'] / 100.0
+            memory = sum((p.usedGpuMemory or 0) for p in processes) \
+                // (1024 * 1024)
+        account.memory_peak = max(account.memory_peak, memory)
+
+        account.samples += 1
+        account.utilization_total += values['utilization']
+        for core in values.get('cores', ()):
+            total, n = account.cores.get(core.label, (0.0, 0))
+            account.cores[core.label] = (total + core.utilization, n + 1)
+
+        power = values.get('power_total')
+        if power is not None:
+            if account.last_power is not None:
+                last_time, last_power = account.last_power
+                account.energy += (last_power + power) / 2 * (now - last_time)
+            account.last_power = (now, power)
+
+
+def format_report(command: List[str], accounts: Dict[str, DeviceAccount],
+                  elapsed: float) -> str:
+    lines = ['', f" Device usage stats for '{' '.join(command)}':", '']
+    if not accounts:
+        lines.append('   (no GPU or NPU was used)')
+    for label in sorted(accounts):
+        a = accounts[label]
+        lines.append(f'   [{label}] {a.device_time:10.2f} s  device time   '
+                     f'{a.utilization:5.1f} % util   '
+                     f'{a.memory_peak:6d} MB peak   {a.energy:9.2f} J')
+        if a.cores:
+            lines.append('        ' + '  '.join(
+                f'{core} {total / n:5.1f}%'
+                for core, (total, n) in sorted(a.cores.items())))
+    lines += ['', f'   {elapsed:10.2f} s  elapsed', '']
+    return '\n'.join(lines)
+
+
+def main(argv: List[str]) -> int:
+    """Entry point of ``npustat run``; argv[0] is the subcommand name."""
+    parser = argparse.ArgumentParser(
+        'npustat run',
+        description='Run a command and report, when it exits, the GPU/NPU '
+                    'time, peak device memory, core utilization and energy '
+                    'of it and all of its child processes. Exits with the '
+                    "command's exit status.")
+    parser.add_argument('-i', '--interval', type=float, default=0.5,
+                        help='Seconds between samples (default: 0.5)')
+    family = parser.add_mutually_exclusive_group()
+    family.add_argument('--no-gpu', dest='gpu', action='store_false')
+    family.add_argument('--no-npu', dest='npu', action='store_false')
+    parser.add_argument('--json', action='store_true',
+                        help='Report in JSON instead of a table')
+    parser.add_argument('-o', '--output', default=None, metavar='FILE',
+                        help='Write the report to FILE instead of stderr')
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv[1:])
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not command:
+        parser.error('no command given, e.g. `npustat run -- python train.py`')
+
+    started = time.monotonic()
+    try:
+        child = subprocess.Popen(command)
+    except OSError as e:
+        sys.stderr.write(f'npustat run: {e}\n')
+        return 127
+    accountant = Accountant(child.pid, gpu=args.gpu, npu=args.npu)
+
+    def sleep(seconds):
+        # wake up as soon as the command exits
+        try:
+            child.wait(seconds)
+        except subprocess.TimeoutExpired:
+            pass
+
+    scheduler = FixedRateScheduler(args.interval, sleep=sleep)
+    interrupts = 0
+    while child.poll() is None:
+        try:
+            scheduler.wait()
+            if child.poll() is None:
+                accountant.tick()
+        except KeyboardInterrupt:
+            # The command got the signal too: report once it exits. Another
+            # Ctrl-C terminates it, in case it does not stop on its own.
+            interrupts += 1
+            if interrupts == 1:
+                sys.stderr.write('npustat run: waiting for the command to '
+                                 'exit (Ctrl-C again to terminate it)\n')
+            elif interrupts == 2:
+                child.terminate()
+            else:
+                child.kill()
+    elapsed = time.monotonic() - started
+
+    if args.json:
+        report = json.dumps({
+            'command': command, 'elapsed': elapsed,
+            'returncode': child.returncode,
+            'devices': [accountant.accounts[label].jsonify()
+                        for label in sorted(accountant.accounts)],
+        }, indent=4)
+    else:
+        report = format_report(command, accountant.accounts, elapsed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        sys.stderr.write(report + '\n')
+
+    if child.returncode < 0:  # killed by a signal, like a shell reports it
+        return 128 + -child.returncode
+    return child.returncode
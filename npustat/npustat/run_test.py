@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from npustat import cli
+from npustat.conftest import FakeClock, aries, core_info, process_info
+from npustat.run import Accountant
+
+
+def test_accounting(fake_mbltml):
+    me = os.getpid()
+    fake_mbltml.devices[:] = [
+        aries(0, utilization=80.0, processes=[
+            process_info(me, 300, 50), process_info(1, 100, 30)],
+            cores=[core_info(0, -1, 800_000)]),
+        aries(1, processes=[process_info(1, 100, 30)]),
+    ]
+    fake_mbltml.devices[0]['TotalPower'] = 10.0
+    clock = FakeClock()
+    accountant = Accountant(me, gpu=False, clock=clock)
+    for _ in range(3):
+        accountant.tick()
+        clock.now += 2.0
+
+    assert list(accountant.accounts) == ['N0']
+    n0 = accountant.accounts['N0']
+    assert n0.pids == {me}  # pid 1 is not ours
+    assert n0.device_time == pytest.approx(2 * 2.0 * 0.5)
+    assert n0.memory_peak == 300
+    assert n0.energy == pytest.approx(10.0 * 4.0)
+    assert n0.utilization == 80.0
+    assert n0.jsonify()['cores'] == {'C0/G': 80.0}
+    # N1 was never used by the tree: its values were never read
+    assert fake_mbltml.calls[(1, 'TotalUtilization')] == 0
+
+
+def test_exited_process_is_forgotten(fake_mbltml):
+    child = subprocess.Popen([sys.executable, '-c',
+                              'import time; time.sleep(5)'])
+    accountant = Accountant(os.getpid(), gpu=False)
+    accountant.tick()
+    assert child.pid in accountant.processes
+    child.kill()
+    child.wait()
+    # as if the PID were reused by an unrelated process on the NPU
+    fake_mbltml.devices[0] = aries(0, processes=[
+        process_info(child.pid, 100, 50)])
+    accountant.tick()
+    assert child.pid not in accountant.processes
+    assert accountant.accounts == {}
+
+
+def test_run_cli(fake_mbltml, tmp_path):
+    report = tmp_path / 'report.json'
+    status = cli.main('npustat', 'run', '-i', '0.01', '--no-gpu', '--json',
+                      '-o', str(report), '--', sys.executable, '-c',
+                      'import time, sys; time.sleep(0.05); sys.exit(3)')
+    assert status == 3
+    o = json.loads(report.read_text())
+    assert o['returncode'] == 3 and o['devices'] == []
+    assert o['command'][0] == sys.executable
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
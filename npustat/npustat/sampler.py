@@ -0,0 +1,166 @@
+"""
+Background sampling, decoupled from rendering.
+
+A Sampler thread queries the devices on a fixed-rate schedule and publishes
+each result as an immutable Snapshot into a LatestSlot. Readers (the watch
+mode renderer, the Python API) take whatever snapshot is newest without ever
+blocking on mbltml or NVML, so a slow or hung device call delays the data,
+never the screen or the keyboard.
+"""
+
+import collections
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Deque, List, Optional, Sequence
+
+from npustat.scheduler import FixedRateScheduler
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """The result of one sampling tick. Never modified once published."""
+    seq: int  # 1 for the first snapshot of a sampler, then increasing
+    gpu_stats: Any = None  # GPUStatCollection, or None if not queried/failed
+    npu_stats: Any = None  # NPUStatCollection, or None if not queried/failed
+    gpu_error: Optional[BaseException] = None
+    npu_error: Optional[BaseException] = None
+    sampled_at: float = field(default_factory=time.monotonic)
+    duration: float = 0.0  # seconds spent querying
+    query_time: datetime = field(default_factory=datetime.now)
+
+    def age(self, now: Optional[float] = None) -> float:
+        """Seconds since the snapshot was taken (monotonic clock)."""
+        if now is None:
+            now = time.monotonic()
+        return max(now - self.sampled_at, 0.0)
+
+
+class LatestSlot:
+    """Holds the most recent snapshot, plus a short ring of older ones.
+
+    Publishing swaps a single reference, so readers never see a partially
+    written value and never wait for the writer.
+    """
+
+    def __init__(self, maxlen: int = 1):
+        self._latest: Optional[Snapshot] = None
+        self._ring: Deque[Snapshot] = collections.deque(maxlen=maxlen)
+        self._updated = threading.Condition()
+
+    def publish(self, snapshot: Snapshot):
+        with self._updated:
+            self._ring.append(snapshot)
+            self._latest = snapshot
+            self._updated.notify_all()
+
+    def get(self) -> Optional[Snapshot]:
+        return self._latest
+
+    def recent(self) -> List[Snapshot]:
+        """The snapshots kept in the ring, oldest first."""
+        with self._updated:
+            return list(self._ring)
+
+    def wait_newer(self, seq: int,
+                   timeout: Optional[float] = None) -> Optional[Snapshot]:
+        """Block until a snapshot newer than `seq` is published.
+
+        Returns it, or None on timeout.
+        """
+        with self._updated:
+            self._updated.wait_for(
+                lambda: self._latest is not None and self._latest.seq > seq,
+                timeout)
+            latest = self._latest
+        return latest if latest is not None and latest.seq > seq else None
+
+
+class Sampler:
+    """Queries GPUs and/or NPUs on a background thread.
+
+    `gpu_query` and `npu_query` are called with no arguments and return a
+    stats collection; an exception is kept in the snapshot instead of
+    stopping the thread.
+
+    Usage:
+        sampler = Sampler(1.0, npu_query=NPUStatCollection.new_query).start()
+        snapshot = sampler.slot.get()   # None until the first tick is done
+        sampler.stop()
+    """
+
+    def __init__(self, interval: float, *,
+                 gpu_query: Optional[Callable[[], Any]] = None,
+                 npu_query: Optional[Callable[[], Any]] = None,
+                 wakeup: Optional[threading.Event] = None,
+                 maxlen: int = 1,
+                 observers: Sequence[Callable[[Snapshot], None]] = ()):
+        self.gpu_query = gpu_query
+        self.npu_query = npu_query
+        # An event (e.g. a GPUEventListener's) that triggers an extra sample
+        self.wakeup = wakeup
+        self.slot = LatestSlot(maxlen)
+        # Called with every snapshot before it is published, i.e. while it
+        # can still be annotated (see rolling.RollingAverages.observe)
+        self.observers = list(observers)
+
+        self._stop = threading.Event()
+        # sleeping on the stop event lets stop() interrupt a long interval
+        self.scheduler = FixedRateScheduler(interval, sleep=self._stop.wait)
+        self._thread: Optional[threading.Thread] = None
+        self._seq = 0
+
+    def start(self) -> 'Sampler':
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='npustat-sampler')
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop sampling; a query in progress is left to finish on its own."""
+        self._stop.set()
+        if self.wakeup is not None:
+            self.wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def sample(self) -> Snapshot:
+        """Query the devices once and publish the result."""
+        started = time.monotonic()
+        query_time = datetime.now()
+        results = {}
+        for name, query in (('gpu', self.gpu_query), ('npu', self.npu_query)):
+            if query is None:
+                continue
+            try:
+                results[f'{name}_stats'] = query()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                results[f'{name}_error'] = e
+
+        self._seq += 1
+        snapshot = Snapshot(seq=self._seq, sampled_at=started,
+                            duration=time.monotonic() - started,
+                            query_time=query_time, **results)
+        for observe in self.observers:
+            observe(snapshot)
+        self.slot.publish(snapshot)
+        return snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.scheduler.wait(self.wakeup)
+            if self._stop.is_set():
+                break
+            self.sample()
@@ -0,0 +1,76 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from npustat.sampler import LatestSlot, Sampler, Snapshot
+
+
+def test_slot_keeps_latest_and_ring():
+    slot = LatestSlot(maxlen=2)
+    assert slot.get() is None
+    for seq in (1, 2, 3):
+        slot.publish(Snapshot(seq=seq))
+    assert slot.get().seq == 3
+    assert [s.seq for s in slot.recent()] == [2, 3]
+    assert slot.wait_newer(3, timeout=0.01) is None
+    assert slot.wait_newer(2).seq == 3
+
+
+def test_snapshot_is_immutable():
+    snapshot = Snapshot(seq=1, sampled_at=10.0)
+    assert snapshot.age(now=12.5) == 2.5
+    with pytest.raises(AttributeError):
+        snapshot.seq = 2  # type: ignore
+
+
+def test_sampler_keeps_errors_in_snapshot():
+    def failing_gpu_query():
+        raise RuntimeError('NVML Shared Library Not Found')
+
+    sampler = Sampler(1.0, gpu_query=failing_gpu_query,
+                      npu_query=lambda: ['npu0'])
+    snapshot = sampler.sample()
+    assert snapshot.seq == 1
+    assert snapshot.gpu_stats is None
+    assert str(snapshot.gpu_error) == 'NVML Shared Library Not Found'
+    assert snapshot.npu_stats == ['npu0'] and snapshot.npu_error is None
+    assert sampler.slot.get() is snapshot
+
+
+def test_reader_does_not_wait_for_a_slow_query():
+    release = threading.Event()
+    calls = []
+
+    def slow_npu_query():
+        calls.append(len(calls))
+        if len(calls) > 1:
+            release.wait()  # a hung device call
+        return calls[-1]
+
+    sampler = Sampler(0.01, npu_query=slow_npu_query).start()
+    try:
+        first = sampler.slot.wait_newer(0, timeout=1.0)
+        assert first.npu_stats == 0
+
+        # while the second query hangs, readers still get the first snapshot
+        started = time.monotonic()
+        assert sampler.slot.get() is first
+        assert time.monotonic() - started < 0.01
+    finally:
+        release.set()
+        sampler.stop(timeout=1.0)
+    assert sampler.stopped
+
+
+def test_stop_interrupts_long_interval():
+    sampler = Sampler(60.0, npu_query=lambda: None).start()
+    sampler.slot.wait_newer(0, timeout=1.0)
+    started = time.monotonic()
+    sampler.stop(timeout=1.0)
+    assert time.monotonic() - started < 0.5
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
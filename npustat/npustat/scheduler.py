@@ -0,0 +1,111 @@
+"""
+Fixed-rate, drift-free scheduling for watch mode and background samplers.
+
+Ticks are due at ``start + k * interval`` on the monotonic clock, so a slow
+query delays one tick but never shifts the phase of the following ones.
+Ticks that are missed entirely (the work took longer than an interval) are
+coalesced into the next one and counted, and the lateness of every tick is
+recorded, so the effective sampling rate can be reported instead of guessed.
+"""
+
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass
+class SchedulerStats:
+    """Counters of a FixedRateScheduler since it was started."""
+    ticks: int = 0  # ticks that fired
+    missed: int = 0  # ticks skipped because the work overran them
+    jitter_total: float = 0.0  # sum of the lateness of all ticks, seconds
+    jitter_max: float = 0.0  # worst lateness, seconds
+    elapsed: float = 0.0  # seconds since the first tick
+
+    @property
+    def jitter_mean(self) -> float:
+        return self.jitter_total / self.ticks if self.ticks else 0.0
+
+    @property
+    def rate(self) -> float:
+        """Effective ticks per second."""
+        if self.elapsed <= 0:
+            return 0.0
+        return (self.ticks - 1) / self.elapsed if self.ticks > 1 else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.rate:.2f} Hz, jitter {self.jitter_mean * 1000:.1f}"
+                f"/{self.jitter_max * 1000:.1f} ms (mean/max), "
+                f"{self.missed} missed")
+
+
+class FixedRateScheduler:
+    """Fires ticks at a fixed phase of the monotonic clock.
+
+    Usage:
+        scheduler = FixedRateScheduler(0.05)
+        while True:
+            scheduler.wait()   # returns at the next tick
+            ...                # sample, draw, etc.
+    """
+
+    def __init__(self, interval: float, *,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if interval <= 0:
+            raise ValueError("interval must be positive.")
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = SchedulerStats()
+        self._start: Optional[float] = None
+        self._index = 0  # index of the next tick
+
+    @property
+    def next_deadline(self) -> Optional[float]:
+        if self._start is None:
+            return None
+        return self._start + self._index * self.interval
+
+    def wait(self, wakeup: Optional[threading.Event] = None) -> bool:
+        """Block until the next tick is due.
+
+        Returns True on a tick. If `wakeup` is set before that, returns False
+        right away (after clearing it) without consuming the tick, so that
+        the caller can react to an event and then wait again.
+        """
+        now = self.clock()
+        if self._start is None:  # the first tick fires immediately
+            self._start = now
+            self._index = 1
+            self.stats.ticks = 1
+            return True
+
+        deadline = self._start + self._index * self.interval
+        if now > deadline + self.interval:
+            # The work overran one or more whole ticks: coalesce them into
+            # the next one due, keeping the phase.
+            behind = math.floor((now - deadline) / self.interval)
+            self._index += behind
+            self.stats.missed += behind
+            deadline = self._start + self._index * self.interval
+
+        remaining = deadline - now
+        if remaining > 0:
+            if wakeup is not None:
+                if wakeup.wait(remaining):
+                    wakeup.clear()
+                    return False
+            else:
+                self.sleep(remaining)
+
+        fired = self.clock()
+        lateness = max(fired - deadline, 0.0)
+        self._index += 1
+        self.stats.ticks += 1
+        self.stats.jitter_total += lateness
+        self.stats.jitter_max = max(self.stats.jitter_max, lateness)
+        self.stats.elapsed = fired - self._start
+        return True
@@ -0,0 +1,72 @@
+import sys
+import threading
+
+import pytest
+
+from npustat.scheduler import FixedRateScheduler
+
+
+class FakeTime:
+    """A monotonic clock that only moves when slept on (or told to)."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_fixed_phase_without_drift():
+    t = FakeTime()
+    scheduler = FixedRateScheduler(0.1, clock=t.clock, sleep=t.sleep)
+
+    fired = []
+    for _ in range(5):
+        assert scheduler.wait()
+        fired.append(round(t.now - 1000.0, 6))
+        t.now += 0.03  # the work takes 30 ms each time
+
+    # ticks stay on the 100 ms grid, the work time is not added up
+    assert fired == [0.0, 0.1, 0.2, 0.3, 0.4]
+    assert scheduler.stats.missed == 0
+    assert scheduler.stats.rate == pytest.approx(10.0)
+
+
+def test_missed_ticks_are_coalesced():
+    t = FakeTime()
+    scheduler = FixedRateScheduler(0.1, clock=t.clock, sleep=t.sleep)
+
+    scheduler.wait()
+    t.now += 0.35  # overran the ticks at 0.1, 0.2 and 0.3
+    scheduler.wait()
+    # 0.1 and 0.2 are skipped, 0.3 fires right away (50 ms late)
+    assert round(t.now - 1000.0, 6) == 0.35
+    assert scheduler.stats.missed == 2
+    assert scheduler.stats.jitter_max == pytest.approx(0.05)
+
+    scheduler.wait()
+    assert round(t.now - 1000.0, 6) == 0.4  # back in phase
+    assert scheduler.stats.ticks == 3
+
+
+def test_wakeup_does_not_consume_the_tick():
+    t = FakeTime()
+    scheduler = FixedRateScheduler(0.1, clock=t.clock, sleep=t.sleep)
+    wakeup = threading.Event()
+
+    scheduler.wait(wakeup)
+    wakeup.set()
+    assert scheduler.wait(wakeup) is False
+    assert not wakeup.is_set()
+    assert scheduler.stats.ticks == 1
+    assert scheduler.next_deadline == pytest.approx(1000.1)
+
+    with pytest.raises(ValueError):
+        FixedRateScheduler(0)
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
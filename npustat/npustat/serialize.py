@@ -0,0 +1,172 @@
+"""
+Fast JSON serialization of query results.
+
+``json.dump`` to a file, with an indent or not, runs the pure Python
+encoder and calls a ``default`` hook for every datetime; at high sampling
+rates it costs more than the driver queries. Here the few datetimes of a
+result (the query times and GPU event times) are turned into ISO strings up
+front, so the whole document encodes in one call: with orjson when it is
+installed, indented or not, else with the C encoder of the standard json
+module (or its Python encoder, for an indent). The NPU objects are built
+from a Layout, whose keys are fixed once per type and whose values are read
+in a single call.
+
+The keys and values are those of ``jsonify()``, and both encoders give the
+same document. orjson would write non-finite floats as null and non-ASCII
+text unescaped, so such documents are left to json, which writes them as
+``--json`` always did; the floats are checked while the document is built,
+not by walking it afterwards.
+
+    from npustat import serialize
+    line = serialize.dumps(serialize.output(gpu_stats, npu_stats))
+"""
+
+import json
+import math
+import operator
+from typing import IO, Any, Dict, Iterable, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The encoder in use: 'orjson' or 'json'.
+BACKEND = 'json' if orjson is None else 'orjson'
+
+_COMPACT = (',', ':')
+_INDENTED = (',', ': ')
+
+
+def _iso(value: Any) -> Any:
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _finite(value: Any) -> bool:
+    return value.__class__ is not float or math.isfinite(value)
+
+
+def check_finite(values: Iterable[Any], non_finite: Optional[List[Any]],
+                 source: Any = None):
+    """Append `source` to `non_finite` if a value is a NaN or an infinity.
+
+    Nothing is checked when `non_finite` is None.
+    """
+    if non_finite is not None and not all(map(_finite, values)):
+        non_finite.append(source)
+
+
+class Layout:
+    """The keys of one type's JSON object and the attributes of their values.
+
+    Args:
+        fields: JSON key -> attribute (dotted) path, in output order
+    """
+
+    def __init__(self, fields: Dict[str, str]):
+        self.keys = tuple(fields)
+        self._values = operator.attrgetter(*fields.values())
+
+    def build(self, obj: Any,
+              non_finite: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """The JSON object of `obj`; see check_finite() for `non_finite`."""
+        values = self._values(obj)
+        check_finite(values, non_finite, obj)
+        return dict(zip(self.keys, values))
+
+
+class Document(dict):
+    """A document from output(), which knows if it holds non-finite floats."""
+
+    finite: Optional[bool] = None  # unknown
+
+
+def gpu_output(gpu_stats) -> Document:
+    """GPUStatCollection.jsonify(), with ISO strings for its datetimes."""
+    non_finite: List[Any] = []
+    o = Document(gpu_stats.jsonify(non_finite=non_finite))
+    o.finite = not non_finite
+    o['query_time'] = _iso(o['query_time'])
+    for event in o.get('events') or ():
+        event['time'] = _iso(event['time'])
+    return o
+
+
+def npu_output(npu_stats) -> Document:
+    """NPUStatCollection.jsonify(), with ISO strings for its datetimes."""
+    non_finite: List[Any] = []
+    o = Document(npu_stats.jsonify(non_finite=non_finite))
+    o.finite = not non_finite
+    o['query_time'] = _iso(o['query_time'])
+    return o
+
+
+def output(gpu_stats=None, npu_stats=None) -> Document:
+    """The document of ``npustat --json``: {'gpu': ..., 'npu': ...}."""
+    o = Document()
+    o.finite = True
+    if gpu_stats:
+        o['gpu'] = gpu_output(gpu_stats)
+        o.finite = o['gpu'].finite
+    if npu_stats and len(npu_stats) > 0:
+        o['npu'] = npu_output(npu_stats)
+        o.finite = o.finite and o['npu'].finite
+    return o
+
+
+def _has_non_finite(obj: Any) -> bool:
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(v) for v in obj)
+    return False
+
+
+def _orjson_dumps(obj: Any, indent: Optional[int]) -> Optional[bytes]:
+    option = orjson.OPT_NON_STR_KEYS
+    if indent is not None:
+        option |= orjson.OPT_INDENT_2
+    try:
+        encoded = orjson.dumps(obj, option=option)
+    except TypeError:
+        return None  # e.g. an integer too large for orjson
+    if not encoded.isascii():
+        return None  # json escapes non-ASCII characters
+    if indent is not None and indent != 2:
+        # orjson only indents by two spaces; a raw newline is never in a
+        # string, so every line starts with its indent
+        lines = encoded.split(b'\n')
+        encoded = b'\n'.join([
+            b' ' * ((len(line) - len(line.lstrip(b' '))) // 2 * indent)
+            + line.lstrip(b' ') for line in lines])
+    return encoded
+
+
+def dumps(obj: Any, indent: Optional[int] = None) -> str:
+    """Encode a document without datetimes, e.g. one from output().
+
+    Args:
+        obj: The document
+        indent: Indent nested values by that many spaces, as ``--json``
+            does (default: everything on one line)
+    """
+    if orjson is not None:
+        finite = getattr(obj, 'finite', None)
+        if finite is not False:
+            encoded = _orjson_dumps(obj, indent)
+            # a NaN became null; documents from output() were checked
+            # while being built, others only if there is a null at all
+            if encoded is not None and (
+                    finite or b'null' not in encoded
+                    or not _has_non_finite(obj)):
+                return encoded.decode()
+    if indent is None:
+        return json.dumps(obj, separators=_COMPACT)
+    return json.dumps(obj, indent=indent, separators=_INDENTED)
+
+
+def dump(obj: Any, fp: IO[str], indent: Optional[int] = None):
+    """Write dumps(obj, indent) to fp, in a single write."""
+    fp.write(dumps(obj, indent))
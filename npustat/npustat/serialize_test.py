@@ -0,0 +1,109 @@
+import io
+import json
+import sys
+from datetime import datetime
+
+import pytest
+
+from npustat import cli, serialize
+from npustat.core_npu import NPUStatCollection
+
+
+def _date_handler(obj):
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError(type(obj))
+
+
+class FakeGPUStats(list):
+    """Stands in for a GPUStatCollection with one event."""
+
+    def jsonify(self, non_finite=None):
+        return {
+            'hostname': 'node1', 'driver_version': '550.54',
+            'query_time': datetime(2024, 5, 1, 12, 0, 0, 123456),
+            'gpus': [{'index': 0, 'name': 'A100', 'processes': []}],
+            'events': [{'gpu_index': 0, 'type': 'xid', 'data': 79,
+                        'time': datetime(2024, 5, 1, 11, 59, 58)}],
+        }
+
+
+@pytest.fixture(params=['json', 'orjson'])
+def backend(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(serialize, 'orjson', None)
+    elif serialize.orjson is None:
+        pytest.skip('orjson is not installed')
+    return request.param
+
+
+def test_same_document(fake_mbltml, backend):
+    gpus = FakeGPUStats([None])
+    npus = NPUStatCollection.new_query()
+    before = json.dumps({'gpu': gpus.jsonify(), 'npu': npus.jsonify()},
+                        indent=4, separators=(',', ': '),
+                        default=_date_handler)
+
+    line = serialize.dumps(serialize.output(gpus, npus))
+    assert '\n' not in line
+    assert json.loads(line) == json.loads(before)
+    # the indented output is unchanged, to the byte
+    assert serialize.dumps(serialize.output(gpus, npus), indent=4) == before
+
+
+def test_non_finite_floats(backend):
+    doc = {'power': float('nan'), 'cores': [{'util': float('inf')}],
+           'fan': None}
+    assert serialize.dumps(doc) == \
+        '{"power":NaN,"cores":[{"util":Infinity}],"fan":null}'
+
+
+
+def test_non_finite_checked_while_building(fake_mbltml, backend,
+                                           monkeypatch):
+    fake_mbltml.devices[0]['TotalUtilization'] = float('nan')
+    doc = serialize.output(npu_stats=NPUStatCollection.new_query())
+    assert doc.finite is False
+    assert '"utilization":NaN' in serialize.dumps(doc)
+
+    fake_mbltml.devices[0]['TotalUtilization'] = 10.0
+    doc = serialize.output(npu_stats=NPUStatCollection.new_query())
+    assert doc.finite is True
+    assert 'null' in serialize.dumps(doc)  # fan_duty
+    # a null in a checked document does not send dumps() looking for NaN
+    monkeypatch.setattr(serialize, '_has_non_finite', None)
+    serialize.dumps(doc)
+    serialize.dumps(doc, indent=4)
+
+
+def test_indented_non_ascii(backend):
+    doc = {'name': 'Aries', 'processes': [{'full_command': 'python 학습.py'}],
+           'cores': [], 'pcie': {}}
+    assert serialize.dumps(doc, indent=4) == \
+        json.dumps(doc, indent=4, separators=(',', ': '))
+    assert serialize.dumps(doc) == json.dumps(doc, separators=(',', ':'))
+
+
+def test_print_json(fake_mbltml):
+    npus = NPUStatCollection.new_query()
+    fp = io.StringIO()
+    npus.print_json(fp, compact=True)
+    assert fp.getvalue().count('\n') == 1
+    o = json.loads(fp.getvalue())
+    assert o['query_time'] == npus.query_time.isoformat()
+    assert [n['index'] for n in o['npus']] == [0, 1]
+
+
+def test_compact_cli(fake_mbltml, capsys):
+    cli.main('npustat', '--npu-only', '--json')
+    indented = capsys.readouterr().out
+    cli.main('npustat', '--npu-only', '--json', '--compact')
+    compact = capsys.readouterr().out
+    assert compact.count('\n') == 1 < indented.count('\n')
+    a, b = json.loads(indented), json.loads(compact)
+    del a['npu']['query_time'], b['npu']['query_time']
+    assert a == b
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
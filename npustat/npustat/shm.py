@@ -0,0 +1,431 @@
+"""
+Shared-memory snapshot publication: ``npustat publish``.
+
+One publisher samples the NPUs and writes every snapshot into a file of fixed
+layout in ``/dev/shm``; any number of local readers (``npustat --shm``, the
+statusline, read_shared_snapshot()) then map that file and decode the latest
+snapshot with no mbltml call and no socket round trip.
+
+The region is protected by a seqlock: the publisher makes the sequence number
+odd while it writes and even again once done, and a reader retries until it
+copied the region between two reads of the same even number. Readers never
+block the publisher, and a reader never sees half of an update.
+
+Layout (little endian): a header (see _HEADER), then MAX_NPUS device records
+of DEVICE_SIZE bytes, each made of the device fields (_DEVICE), its PCIe
+properties (_PCIE), MAX_CORES core records (_CORE) and MAX_PROCESSES process
+records (_PROCESS). Cores and processes beyond those bounds are dropped.
+"""
+
+import argparse
+import fcntl
+import functools
+import math
+import mmap
+import os
+import signal
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+import psutil
+
+MAGIC = b'NPUSTSHM'
+LAYOUT_VERSION = 1
+
+MAX_NPUS = 16
+MAX_CORES = 64
+MAX_PROCESSES = 32
+
+# magic, layout version, region size, seq, query time (unix), query
+# duration, publishing interval, publisher pid, NPU count, driver versions
+# (aries, regulus, regulus_usb), error message
+_HEADER = struct.Struct('<8sIIQdddiI32s32s32s256s')
+_SEQ = struct.Struct('<Q')
+_SEQ_OFFSET = 16  # 8-byte aligned
+
+_DEVICE_FIELDS = (
+    ('index', 'i'), ('node_name', '64s'), ('device_type', 'i'),
+    ('hardware_version', 'i'), ('firmware_version', '32s'),
+    ('firmware_revision', 'i'), ('firmware_crc', 'I'), ('temperature', 'i'),
+    ('signal_type', 'i'), ('clock_npu', 'i'), ('clock_bus', 'i'),
+    ('fan_duty', 'i'), ('power_total', 'd'), ('current_total', 'd'),
+    ('voltage_total', 'd'), ('extra_rail', 'i'), ('extra_rail_power', 'd'),
+    ('extra_rail_current', 'd'), ('extra_rail_voltage', 'd'),
+    ('memory_used', 'i'), ('memory_total', 'i'), ('utilization', 'd'),
+    ('core_count', 'i'), ('process_count', 'i'),
+)
+# stored as -1 (ints) or NaN (floats) when None
+_OPTIONAL = frozenset(('fan_duty', 'extra_rail', 'extra_rail_power',
+                       'extra_rail_current', 'extra_rail_voltage'))
+_DEVICE = struct.Struct('<' + ''.join(f for _, f in _DEVICE_FIELDS))
+
+_PCIE_KEYS = ('vendor_id', 'device_id', 'sub_vendor_id', 'sub_device_id',
+              'generation', 'lanes', 'revision', 'class_code')
+_PCIE = struct.Struct('<' + 'i' * len(_PCIE_KEYS))  # -1 when unknown
+
+# cluster, core, npu_time_us, interval_us
+_CORE = struct.Struct('<iiqq')
+# pid, npu_memory, count, utilization, process_name, username, full_command
+# (NUL-separated)
+_PROCESS = struct.Struct('<iiid32s32s256s')
+
+DEVICE_SIZE = (_DEVICE.size + _PCIE.size + MAX_CORES * _CORE.size
+               + MAX_PROCESSES * _PROCESS.size)
+REGION_SIZE = _HEADER.size + MAX_NPUS * DEVICE_SIZE
+
+
+def shm_path() -> str:
+    """$NPUSTAT_SHM, or npustat.snapshot in /dev/shm (or the temp dir)."""
+    if os.environ.get('NPUSTAT_SHM'):
+        return os.environ['NPUSTAT_SHM']
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') \
+        else tempfile.gettempdir()
+    return os.path.join(directory, 'npustat.snapshot')
+
+
+def _encode(text: Optional[str], size: int) -> bytes:
+    data = (text or '').encode('utf-8')[:size]
+    # do not leave a multi-byte character cut in half
+    return data.decode('utf-8', 'ignore').encode('utf-8')
+
+
+def _decode(data: bytes) -> str:
+    return data.rstrip(b'\0').decode('utf-8', 'replace')
+
+
+def _pack_device(buf: bytearray, offset: int, info) -> None:
+    cores = info.cores[:MAX_CORES]
+    processes = info.processes[:MAX_PROCESSES]
+    values = []
+    for name, fmt in _DEVICE_FIELDS:
+        if name == 'core_count':
+            value = len(cores)
+        elif name == 'process_count':
+            value = len(processes)
+        else:
+            value = getattr(info, name)
+        if value is None and name in _OPTIONAL:
+            value = math.nan if fmt == 'd' else -1
+        elif fmt.endswith('s'):
+            value = _encode(value, int(fmt[:-1]))
+        values.append(value)
+    _DEVICE.pack_into(buf, offset, *values)
+    offset += _DEVICE.size
+
+    _PCIE.pack_into(buf, offset, *(info.pcie.get(k, -1) for k in _PCIE_KEYS))
+    offset += _PCIE.size
+
+    for i, core in enumerate(cores):
+        _CORE.pack_into(buf, offset + i * _CORE.size, core.cluster,
+                        core.core, core.npu_time_us, core.interval_us)
+    offset += MAX_CORES * _CORE.size
+
+    for i, p in enumerate(processes):
+        _PROCESS.pack_into(buf, offset + i * _PROCESS.size, p.pid,
+                           p.npu_memory, p.count, p.utilization,
+                           _encode(p.process_name, 32),
+                           _encode(p.username, 32),
+                           _encode('\0'.join(p.full_command or ()), 256))
+
+
+def _unpack_device(data: bytes, offset: int):
+    from npustat.npu import NPUCore, NPUInfo, NPUProcess
+
+    values = dict(zip((n for n, _ in _DEVICE_FIELDS),
+                      _DEVICE.unpack_from(data, offset)))
+    offset += _DEVICE.size
+    for name, fmt in _DEVICE_FIELDS:
+        value = values[name]
+        if fmt.endswith('s'):
+            values[name] = _decode(value)
+        elif name in _OPTIONAL and (
+                value == -1 if fmt != 'd' else math.isnan(value)):
+            values[name] = None
+    core_count = values.pop('core_count')
+    process_count = values.pop('process_count')
+
+    pcie = {k: v for k, v in zip(_PCIE_KEYS, _PCIE.unpack_from(data, offset))
+            if v != -1}
+    offset += _PCIE.size
+
+    cores = [NPUCore(*_CORE.unpack_from(data, offset + i * _CORE.size))
+             for i in range(core_count)]
+    offset += MAX_CORES * _CORE.size
+
+    processes = []
+    for i in range(process_count):
+        pid, memory, count, utilization, name, username, command = \
+            _PROCESS.unpack_from(data, offset + i * _PROCESS.size)
+        command = _decode(command)
+        processes.append(NPUProcess(
+            npu_index=values['index'], pid=pid, process_name=_decode(name),
+            npu_memory=memory, count=count, utilization=utilization,
+            username=_decode(username) or None,
+            full_command=command.split('\0') if command else None))
+
+    return NPUInfo(pcie=pcie, cores=cores, processes=processes, **values)
+
+
+@dataclass(frozen=True)
+class SharedSnapshot:
+    """A snapshot decoded from the shared-memory region."""
+    seq: int  # even, increasing with every publication
+    query_time: datetime
+    duration: float  # seconds the publisher spent querying
+    interval: float  # the publisher's sampling interval
+    publisher_pid: int
+    npu_stats: Any  # NPUStatCollection, or None if the query failed
+    error: Optional[str] = None
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was taken."""
+        return max(time.time() - self.query_time.timestamp(), 0.0)
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the publisher runs and keeps the snapshot up to date."""
+        return psutil.pid_exists(self.publisher_pid) and \
+            self.age <= 2 * self.interval + 1.0
+
+
+class SnapshotWriter:
+    """Publishes snapshots into the shared-memory region.
+
+    There is a single writer per region: a second one fails to start.
+
+    Usage:
+        writer = SnapshotWriter()
+        sampler = Sampler(1.0, npu_query=..., observers=[writer.observe])
+    """
+
+    def __init__(self, path: Optional[str] = None, interval: float = 1.0):
+        self.path = path or shm_path()
+        self.interval = interval
+        self._lock = open(self.path + '.lock', 'a+b')
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock.close()
+            raise RuntimeError(
+                f'Another npustat publisher is writing {self.path}')
+
+        # A fresh region, swapped in atomically: readers still mapping an
+        # old one (e.g. of another layout version) pick up the new file.
+        fd, tmp = tempfile.mkstemp(prefix='.npustat.',
+                                   dir=os.path.dirname(self.path))
+        try:
+            os.ftruncate(fd, REGION_SIZE)
+            os.fchmod(fd, 0o644)
+            self._mm = mmap.mmap(fd, REGION_SIZE)
+        finally:
+            os.close(fd)
+        _HEADER.pack_into(self._mm, 0, MAGIC, LAYOUT_VERSION, REGION_SIZE, 0,
+                          0.0, 0.0, interval, os.getpid(), 0, b'', b'', b'',
+                          b'')
+        os.replace(tmp, self.path)
+        self._seq = 0
+        self._body = bytearray(REGION_SIZE - _HEADER.size)
+
+    def publish(self, npu_stats=None, *, query_time: Optional[datetime] = None,
+                duration: float = 0.0, error: Optional[str] = None):
+        """Write a snapshot (or the error that replaced it)."""
+        npus = list(npu_stats or ())[:MAX_NPUS]
+        drivers = getattr(npu_stats, 'driver_versions', None)
+        for i, n in enumerate(npus):
+            _pack_device(self._body, i * DEVICE_SIZE, n.entry)
+        used = len(npus) * DEVICE_SIZE
+        query_time = query_time or getattr(npu_stats, 'query_time', None) \
+            or datetime.now()
+
+        mm = self._mm
+        self._seq += 1  # odd: being written
+        _SEQ.pack_into(mm, _SEQ_OFFSET, self._seq)
+        _HEADER.pack_into(
+            mm, 0, MAGIC, LAYOUT_VERSION, REGION_SIZE, self._seq,
+            query_time.timestamp(), duration, self.interval, os.getpid(),
+            len(npus),
+            _encode(drivers and drivers.aries, 32),
+            _encode(drivers and drivers.regulus, 32),
+            _encode(drivers and drivers.regulus_usb, 32),
+            _encode(error, 256))
+        mm[_HEADER.size:_HEADER.size + used] = self._body[:used]
+        self._seq += 1  # even: consistent
+        _SEQ.pack_into(mm, _SEQ_OFFSET, self._seq)
+
+    def observe(self, snapshot):
+        """Sampler observer: publish every snapshot."""
+        self.publish(snapshot.npu_stats, query_time=snapshot.query_time,
+                     duration=snapshot.duration,
+                     error=str(snapshot.npu_error)
+                     if snapshot.npu_error is not None else None)
+
+    def close(self):
+        self._mm.close()
+        self._lock.close()  # releases the lock
+
+
+class SnapshotReader:
+    """Reads the latest snapshot from the shared-memory region."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or shm_path()
+        self._mm: Optional[mmap.mmap] = None
+        self._inode = None
+
+    def _map(self) -> Optional[mmap.mmap]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if self._mm is None or st.st_ino != self._inode:
+            # the publisher (re)started with a new region
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            if st.st_size < _HEADER.size:
+                return None
+            with open(self.path, 'rb') as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._inode = st.st_ino
+        return self._mm
+
+    def read(self, timeout: float = 0.1) -> Optional[SharedSnapshot]:
+        """The latest consistent snapshot, or None if there is none.
+
+        Waits up to `timeout` seconds for a publication in progress.
+        """
+        mm = self._map()
+        if mm is None:
+            return None
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = _SEQ.unpack_from(mm, _SEQ_OFFSET)[0]
+            if not seq & 1:
+                header = _HEADER.unpack_from(mm, 0)
+                count = min(header[8], MAX_NPUS)
+                body = mm[_HEADER.size:_HEADER.size + count * DEVICE_SIZE]
+                if _SEQ.unpack_from(mm, _SEQ_OFFSET)[0] == seq:
+                    break
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.0001)
+
+        (magic, version, size, seq, query_time, duration, interval, pid,
+         count, aries, regulus, regulus_usb, error) = header
+        if magic != MAGIC or version != LAYOUT_VERSION or size > len(mm) \
+                or seq == 0:
+            return None  # not published yet, or of an unknown layout
+
+        from npustat.core_npu import NPUStat, NPUStatCollection
+        from npustat.npu import NPUDriverVersions
+
+        npu_stats = None
+        error = _decode(error) or None
+        if error is None:
+            drivers = NPUDriverVersions(aries=_decode(aries) or None,
+                                        regulus=_decode(regulus) or None,
+                                        regulus_usb=_decode(regulus_usb)
+                                        or None)
+            npu_stats = NPUStatCollection(
+                [NPUStat(_unpack_device(body, i * DEVICE_SIZE))
+                 for i in range(count)], driver_versions=drivers)
+            npu_stats.query_time = datetime.fromtimestamp(query_time)
+        return SharedSnapshot(seq=seq,
+                              query_time=datetime.fromtimestamp(query_time),
+                              duration=duration, interval=interval,
+                              publisher_pid=pid, npu_stats=npu_stats,
+                              error=error)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+_readers: Dict[str, SnapshotReader] = {}
+
+
+def read_shared_snapshot(path: Optional[str] = None,
+                         timeout: float = 0.1) -> Optional[SharedSnapshot]:
+    """The latest snapshot published by ``npustat publish``, if any.
+
+    Args:
+        path: The shared-memory file (default: shm_path())
+        timeout: Seconds to wait for a publication in progress
+
+    Returns:
+        A SharedSnapshot (check its `fresh` property), or None if nothing
+        was published.
+    """
+    path = path or shm_path()
+    reader = _readers.get(path)
+    if reader is None:
+        reader = _readers[path] = SnapshotReader(path)
+    return reader.read(timeout)
+
+
+def npu_query(path: Optional[str] = None,
+              fallback: Optional[Callable[[], Any]] = None):
+    """NPU stats from a fresh shared snapshot, else from `fallback()`.
+
+    Raises:
+        RuntimeError: If the publisher failed to query the NPUs, or if no
+            publisher runs and there is no fallback.
+    """
+    snapshot = read_shared_snapshot(path)
+    if snapshot is not None and snapshot.fresh:
+        if snapshot.error is not None:
+            raise RuntimeError(snapshot.error)
+        return snapshot.npu_stats
+    if fallback is None:
+        raise RuntimeError('No npustat publisher is running '
+                           f'(see `npustat publish`); {path or shm_path()}')
+    return fallback()
+
+
+def main(argv) -> int:
+    """Entry point of ``npustat publish``; argv[0] is the subcommand name."""
+    parser = argparse.ArgumentParser(
+        'npustat publish',
+        description='Sample the NPUs and publish every snapshot in shared '
+                    'memory, for `npustat --shm`, the statusline and '
+                    'npustat.read_shared_snapshot() to read with no driver '
+                    'calls.')
+    parser.add_argument('-i', '--interval', type=float, default=1.0,
+                        help='Seconds between samples (default: 1)')
+    parser.add_argument('--path', default=None,
+                        help=f'Shared-memory file (default: {shm_path()}, '
+                             'or $NPUSTAT_SHM)')
+    args = parser.parse_args(argv[1:])
+
+    from npustat.core_npu import NPUStatCollection
+    from npustat.policy import NPUPoller
+    from npustat.sampler import Sampler
+
+    try:
+        writer = SnapshotWriter(args.path, interval=args.interval)
+    except (OSError, RuntimeError) as e:
+        sys.stderr.write(f'npustat publish: {e}\n')
+        return 1
+
+    npu_query_ = functools.partial(NPUStatCollection.new_query,
+                                   poller=NPUPoller())
+    sampler = Sampler(args.interval, npu_query=npu_query_,
+                      observers=[writer.observe])
+    signal.signal(signal.SIGTERM, lambda *_: sampler.stop(timeout=0))
+    sampler.start()
+    try:
+        while not sampler.stopped:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.stop(timeout=1.0)
+        writer.close()
+    return 0
@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('fcntl')  # the shared snapshot needs file locks
+
+from npustat import cli, shm
+from npustat.conftest import aries, process_info
+from npustat.core_npu import NPUStatCollection
+
+
+@pytest.fixture
+def shm_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'npustat.snapshot')
+    monkeypatch.setenv('NPUSTAT_SHM', path)
+    monkeypatch.setattr(shm, '_readers', {})
+    return path
+
+
+def test_roundtrip(fake_mbltml, shm_path):
+    fake_mbltml.devices[0] = aries(0, processes=[process_info(4242, 300, 25)])
+    npus = NPUStatCollection.new_query()
+
+    writer = shm.SnapshotWriter(interval=0.5)
+    try:
+        assert shm.read_shared_snapshot() is None  # nothing published yet
+        writer.publish(npus, duration=0.01)
+        snapshot = shm.read_shared_snapshot()
+    finally:
+        writer.close()
+
+    assert snapshot.seq == 2 and snapshot.interval == 0.5
+    assert snapshot.publisher_pid == os.getpid() and snapshot.fresh
+    assert snapshot.error is None
+    # the decoded stats are those that were published
+    expected = npus.jsonify()
+    decoded = snapshot.npu_stats.jsonify()
+    del expected['hostname'], decoded['hostname']
+    assert decoded == expected
+
+
+def test_second_writer_refused(shm_path):
+    writer = shm.SnapshotWriter()
+    try:
+        with pytest.raises(RuntimeError, match='Another npustat publisher'):
+            shm.SnapshotWriter()
+    finally:
+        writer.close()
+
+
+def test_torn_read_is_retried(fake_mbltml, shm_path):
+    writer = shm.SnapshotWriter()
+    try:
+        writer.publish(NPUStatCollection.new_query())
+        # a publication in progress: readers wait, then give up
+        shm._SEQ.pack_into(writer._mm, shm._SEQ_OFFSET, 3)
+        assert shm.read_shared_snapshot(timeout=0.01) is None
+        shm._SEQ.pack_into(writer._mm, shm._SEQ_OFFSET, 2)
+        assert shm.read_shared_snapshot().seq == 2
+    finally:
+        writer.close()
+
+
+def test_error_is_published(shm_path):
+    writer = shm.SnapshotWriter()
+    try:
+        writer.publish(error='mbltml is not available')
+        with pytest.raises(RuntimeError, match='mbltml is not available'):
+            shm.npu_query()
+    finally:
+        writer.close()
+
+
+def test_cli_reads_without_driver_calls(fake_mbltml, shm_path,
+                                        capsys):
+    writer = shm.SnapshotWriter()
+    try:
+        writer.publish(NPUStatCollection.new_query())
+        calls = sum(fake_mbltml.calls.values())
+        cli.main('npustat', '--npu-only', '--shm', '--json')
+        assert sum(fake_mbltml.calls.values()) == calls
+    finally:
+        writer.close()
+    out = json.loads(capsys.readouterr().out)
+    assert [n['name'] for n in out['npu']['npus']] == \
+        ['Aries(aries0)', 'Regulus(USB)(regulus1)']
+
+    # without a running publisher, npustat queries the NPUs itself
+    os.unlink(shm_path)
+    cli.main('npustat', '--npu-only', '--shm', '--json')
+    assert sum(fake_mbltml.calls.values()) > calls
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
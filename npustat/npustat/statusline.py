@@ -0,0 +1,151 @@
+"""
+``npustat statusline``: one-line utilization summary for status bars.
+
+Replaces pipelines like ``npustat --npu-only --json | jq ... | bc`` in
+tmux/statusbar.tmux: a single invocation reads only the utilization of each
+device (or the snapshot of a running ``npustat publish``), computes the mean
+and the maximum per accelerator family, and prints the colored segments.
+"""
+
+import argparse
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+FAMILIES = ('gpu', 'npu')
+
+# (threshold, background, foreground) from the highest threshold down, as
+# in tmux/statusbar.tmux; the mean utilization picks the first it reaches.
+GRADIENTS: Dict[str, List[Tuple[float, str, str]]] = {
+    'gpu': [(90, '#40C057', 'black'), (75, '#3EAE51', 'black'),
+            (50, '#398A44', 'black'), (25, '#356537', 'white'),
+            (0, '#30412A', 'white')],
+    'npu': [(90, '#9c36b5', 'white'), (75, '#862e9c', 'white'),
+            (50, '#6c2d82', 'white'), (25, '#522c68', 'white'),
+            (0, '#3b2b4e', '#888888')],
+}
+
+# Nerd Font icons of the statusbar segments
+ICONS = {'gpu': '\U000f08ae', 'npu': '\U000f06a9'}
+
+
+@dataclass
+class FamilyLoad:
+    """Utilization of one accelerator family, in percent."""
+    family: str
+    mean: float
+    max: float
+    count: int  # number of devices
+
+    @classmethod
+    def of(cls, family: str, values: Sequence[float]) -> 'FamilyLoad':
+        return cls(family, sum(values) / len(values), max(values),
+                   len(values))
+
+    def colors(self) -> Tuple[str, str]:
+        """(background, foreground) of the gradient step of the mean."""
+        for threshold, bg, fg in GRADIENTS[self.family]:
+            if self.mean >= threshold:
+                return bg, fg
+        return GRADIENTS[self.family][-1][1:]
+
+
+def npu_utilizations() -> List[float]:
+    """Utilization of every NPU, from a fresh shared snapshot if possible."""
+    from npustat.shm import read_shared_snapshot
+    snapshot = read_shared_snapshot()
+    if snapshot is not None and snapshot.fresh and snapshot.npu_stats:
+        return [n.utilization for n in snapshot.npu_stats]
+
+    from npustat.npu import npu_count
+    from npustat.wait import npu_reader
+    read = npu_reader(['utilization'])
+    return [read(i)['utilization'] for i in range(npu_count())]
+
+
+def gpu_utilizations() -> List[float]:
+    from npustat.nvml import pynvml as N
+    from npustat.wait import gpu_reader
+    read = gpu_reader(['utilization'])
+    return [read(i)['utilization'] for i in range(N.nvmlDeviceGetCount())]
+
+
+def query_loads(families: Sequence[str] = FAMILIES) -> List[FamilyLoad]:
+    """The load of each family that has devices; others are left out."""
+    readers = {'gpu': gpu_utilizations, 'npu': npu_utilizations}
+    loads = []
+    for family in families:
+        try:
+            values = readers[family]()
+        except Exception:  # pylint: disable=broad-exception-caught
+            continue  # no driver, no bindings: nothing to show
+        if values:
+            loads.append(FamilyLoad.of(family, values))
+    return loads
+
+
+def format_tmux(load: FamilyLoad) -> str:
+    bg, fg = load.colors()
+    text = f'{load.family.upper()} {load.mean:3.0f}%'
+    if load.count > 1:
+        text += f' ▲{load.max:.0f}%'
+    return f'#[bg={bg},fg={fg}] {ICONS[load.family]} {text} #[default]'
+
+
+def format_plain(load: FamilyLoad) -> str:
+    text = f'{load.family.upper()} {load.mean:.0f}%'
+    if load.count > 1:
+        text += f' (max {load.max:.0f}%)'
+    return text
+
+
+FORMATS = {'tmux': (format_tmux, ''), 'plain': (format_plain, '  ')}
+
+
+def statusline(families: Sequence[str] = FAMILIES, fmt: str = 'tmux',
+               max_age: Optional[float] = None) -> str:
+    """The status line of the given families, empty if none has devices.
+
+    Args:
+        families: Accelerator families to show, in this order
+        fmt: 'tmux' for colored segments, 'plain' for text
+        max_age: Reuse loads queried by another invocation at most that many
+            seconds ago (see npustat.cache)
+    """
+    if max_age:
+        from npustat.cache import cached_query
+        loads = cached_query(f'statusline-{"-".join(families)}', max_age,
+                             lambda: query_loads(families))
+    else:
+        loads = query_loads(families)
+    format_load, separator = FORMATS[fmt]
+    return separator.join(format_load(load) for load in loads)
+
+
+def main(argv: List[str]) -> int:
+    """Entry point of ``npustat statusline``; argv[0] is the subcommand."""
+    parser = argparse.ArgumentParser(
+        'npustat statusline',
+        description='Print the mean (and, with several devices, the maximum) '
+                    'utilization of each accelerator family, e.g. as tmux '
+                    'status segments. Prints nothing and exits 1 if there is '
+                    'no device.')
+    parser.add_argument('--format', dest='fmt', choices=sorted(FORMATS),
+                        default='tmux')
+    parser.add_argument('--gpu', dest='families', action='append_const',
+                        const='gpu', help='Show GPUs (default: all families)')
+    parser.add_argument('--npu', dest='families', action='append_const',
+                        const='npu', help='Show NPUs (default: all families)')
+    parser.add_argument('--max-age', type=float, default=None,
+                        metavar='SECONDS',
+                        help='Reuse the loads of another invocation at most '
+                             'SECONDS old')
+    args = parser.parse_args(argv[1:])
+
+    line = statusline(args.families or FAMILIES, args.fmt, args.max_age)
+    if not line:
+        return 1
+    sys.stdout.write(line)
+    if args.fmt == 'plain':
+        sys.stdout.write('\n')
+    return 0
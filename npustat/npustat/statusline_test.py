@@ -0,0 +1,71 @@
+import sys
+
+import pytest
+
+pytest.importorskip('fcntl')  # the shared snapshot needs file locks
+
+from npustat import cli, shm, statusline
+from npustat.conftest import aries
+from npustat.core_npu import NPUStatCollection
+
+
+@pytest.fixture
+def no_publisher(tmp_path, monkeypatch):
+    monkeypatch.setenv('NPUSTAT_SHM', str(tmp_path / 'npustat.snapshot'))
+    monkeypatch.setattr(shm, '_readers', {})
+
+
+@pytest.fixture
+def gpus(monkeypatch):
+    monkeypatch.setattr(statusline, 'gpu_utilizations', lambda: [10.0, 95.0])
+
+
+def test_gradient():
+    load = statusline.FamilyLoad.of('npu', [80.0, 70.0])
+    assert (load.mean, load.max, load.count) == (75.0, 80.0, 2)
+    assert load.colors() == ('#862e9c', 'white')
+    assert statusline.FamilyLoad.of('gpu', [3.0]).colors() == \
+        ('#30412A', 'white')
+
+
+def test_statusline_tmux(fake_mbltml, no_publisher, gpus):
+    fake_mbltml.devices[:] = [aries(0, utilization=60.0),
+                              aries(1, utilization=20.0)]
+    line = statusline.statusline(fmt='tmux')
+    assert line == (
+        '#[bg=#398A44,fg=black] \U000f08ae GPU  52% ▲95% #[default]'
+        '#[bg=#522c68,fg=white] \U000f06a9 NPU  40% ▲60% #[default]')
+    # only the utilization of the NPUs was read
+    assert {key for _, key in fake_mbltml.calls} == {'TotalUtilization'}
+
+    assert statusline.statusline(['npu'], fmt='plain') == \
+        'NPU 40% (max 60%)'
+
+
+def test_statusline_from_shared_snapshot(fake_mbltml, no_publisher,
+                                         gpus):
+    writer = shm.SnapshotWriter()
+    try:
+        writer.publish(NPUStatCollection.new_query())
+        fake_mbltml.calls.clear()
+        assert statusline.statusline(['npu'], fmt='plain') == \
+            'NPU 8% (max 8%)'
+        assert not fake_mbltml.calls
+    finally:
+        writer.close()
+
+
+def test_statusline_cli(fake_mbltml, no_publisher, monkeypatch,
+                        capsys):
+    def no_gpu():
+        raise RuntimeError('NVML Shared Library Not Found')
+    monkeypatch.setattr(statusline, 'gpu_utilizations', no_gpu)
+
+    assert cli.main('npustat', 'statusline', '--format', 'plain') == 0
+    assert capsys.readouterr().out == 'NPU 8% (max 8%)\n'
+    assert cli.main('npustat', 'statusline', '--gpu') == 1
+    assert capsys.readouterr().out == ''
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
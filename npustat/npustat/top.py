@@ -0,0 +1,236 @@
+"""
+``npustat top``: one process table across all GPUs and NPUs.
+
+Processes of every device are merged into a single table, sorted by
+device utilization, device memory or accumulated device time. A
+ProcessTable keeps per-process state between ticks, so the accumulated time
+is updated incrementally and processes that exit are simply dropped; only
+the rows that fit on the screen are selected and rendered.
+"""
+
+import argparse
+import dataclasses
+import functools
+import heapq
+import os
+import sys
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from blessed import Terminal
+
+from npustat import util
+
+# How each sort order ranks rows, highest first; ties by memory, then pid.
+SORT_KEYS: Dict[str, Callable[['ProcessRow'], tuple]] = {
+    'util': lambda r: (r.utilization or 0.0, r.memory or 0, -r.pid),
+    'mem': lambda r: (r.memory or 0, r.utilization or 0.0, -r.pid),
+    'time': lambda r: (r.device_time, r.utilization or 0.0, -r.pid),
+}
+SORT_HOTKEYS = {'u': 'util', 'm': 'mem', 't': 'time'}
+
+HEADER_LINES = 2  # the status line and the column titles
+
+
+@dataclasses.dataclass
+class ProcessRow:
+    """The state of one process on one device."""
+    device: str  # device label, e.g. G0 or N1
+    pid: int
+    username: str
+    command: str
+    memory: Optional[int]  # MB
+    utilization: Optional[float]  # percent, None if not reported
+    device_time: float = 0.0  # seconds of full device utilization so far
+    first_seen: float = 0.0  # unix timestamp
+
+
+def _iter_processes(snapshot) -> Iterator[Tuple[str, int, str, str,
+                                                Optional[int],
+                                                Optional[float]]]:
+    """(device, pid, username, command, memory, utilization) of a snapshot."""
+    for g in snapshot.gpu_stats or ():
+        for p in g.processes or ():
+            yield (f'G{g.index}', p['pid'], p.get('username') or '?',
+                   ' '.join(p.get('full_command') or [p.get('command', '?')]),
+                   p.get('gpu_memory_usage'), p.get('gpu_utilization'))
+    for n in snapshot.npu_stats or ():
+        for p in n.processes:
+            yield (f'N{n.index}', p.pid, p.username or '?',
+                   ' '.join(p.full_command or [p.process_name]),
+                   p.npu_memory, p.utilization)
+
+
+class ProcessTable:
+    """Per-process state across ticks, keyed by (device, pid)."""
+
+    def __init__(self):
+        self.rows: Dict[Tuple[str, int], ProcessRow] = {}
+        self._last_update: Optional[float] = None
+
+    def update(self, snapshot):
+        """Merge the processes of a snapshot into the table."""
+        now = snapshot.query_time.timestamp()
+        elapsed = 0.0
+        if self._last_update is not None:
+            elapsed = max(now - self._last_update, 0.0)
+        self._last_update = now
+
+        seen = set()
+        for device, pid, username, command, memory, utilization in \
+                _iter_processes(snapshot):
+            key = (device, pid)
+            seen.add(key)
+            row = self.rows.get(key)
+            if row is None:
+                self.rows[key] = ProcessRow(
+                    device=device, pid=pid, username=username,
+                    command=command, memory=memory, utilization=utilization,
+                    first_seen=now)
+                continue
+            # the utilization reported last held over the elapsed interval
+            row.device_time += elapsed * (row.utilization or 0.0) / 100.0
+            row.memory = memory
+            row.utilization = utilization
+
+        for key in self.rows.keys() - seen:
+            del self.rows[key]
+
+    def top(self, n: Optional[int] = None, sort: str = 'util') -> List[ProcessRow]:
+        """The `n` highest rows for the given sort order (all if None)."""
+        key = SORT_KEYS[sort]
+        if n is None:
+            return sorted(self.rows.values(), key=key, reverse=True)
+        return heapq.nlargest(n, self.rows.values(), key=key)
+
+
+def _format_time(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
+
+
+def render_table(term, table: ProcessTable, sort: str,
+                 max_rows: Optional[int], width: int) -> List[str]:
+    """The lines of the table (column titles first)."""
+    titles = {'util': 'UTIL', 'mem': 'MEM', 'time': 'TIME'}
+    columns = f"{'DEV':>4} {'PID':>8} {'USER':<10} " \
+        f"{'UTIL':>5} {'MEM':>7} {'TIME':>8}  COMMAND"
+    # mark the active sort column
+    columns = columns.replace(titles[sort], titles[sort].lower(), 1)
+    lines = [term.reverse(f'{columns:<{width}}')]
+
+    for r in table.top(max_rows, sort):
+        device = (term.bold_magenta if r.device[0] == 'N'
+                  else term.bold_white)(f'{r.device:>4}')
+        util_str = '   ??' if r.utilization is None \
+            else f'{r.utilization:4.0f}%'
+        mem_str = '     ??' if r.memory is None else f'{r.memory:6d}M'
+        prefix_width = 4 + 1 + 8 + 1 + 10 + 1 + 5 + 1 + 7 + 1 + 8 + 2
+        command = util.shorten_left(r.command, width=max(width - prefix_width, 8),
+                                    placeholder='…')
+        lines.append(
+            f'{device} {r.pid:>8} '
+            + term.bold_black(f'{r.username[:10]:<10}') + ' '
+            + term.green(util_str) + ' ' + term.yellow(mem_str) + ' '
+            + f'{_format_time(r.device_time):>8}  ' + term.color(24)(command))
+    return lines
+
+
+def main(argv: List[str]) -> int:
+    """Entry point of ``npustat top``; argv[0] is the subcommand name."""
+    parser = argparse.ArgumentParser(
+        'npustat top',
+        description='Show the processes of all GPUs and NPUs in one table.')
+    parser.add_argument('-i', '--interval', type=float, default=1.0,
+                        help='Seconds between updates (default: 1)')
+    parser.add_argument('-s', '--sort', choices=sorted(SORT_KEYS),
+                        default='util',
+                        help='Sort by device utilization, device memory or '
+                             'accumulated device time (keys: u, m, t)')
+    parser.add_argument('-n', '--max-rows', type=int, default=None,
+                        help='Show at most N processes '
+                             '(default: as many as fit on the screen)')
+    parser.add_argument('--once', action='store_true',
+                        help='Print the table once and exit')
+    parser.add_argument('--no-npu', action='store_true',
+                        help='Hide NPU (Mobilint) processes')
+    parser.add_argument('--npu-only', action='store_true',
+                        help='Only show NPU processes')
+    parser_color = parser.add_mutually_exclusive_group()
+    parser_color.add_argument('--force-color', '--color', action='store_true',
+                              help='Force to output with colors')
+    parser_color.add_argument('--no-color', action='store_true',
+                              help='Suppress colored output')
+    args = parser.parse_args(argv[1:])
+
+    if args.force_color:
+        term = Terminal(kind=os.getenv('TERM') or 'xterm-256color',
+                        force_styling=True)
+    elif args.no_color:
+        term = Terminal(force_styling=None)
+    else:
+        term = Terminal()
+
+    from npustat.cli import MIN_INTERVAL
+    from npustat.core import GPUStatCollection
+    from npustat.core_npu import NPUStatCollection
+    from npustat.policy import NPUPoller
+    from npustat.sampler import Sampler
+
+    gpu_query = None if args.npu_only else GPUStatCollection.new_query
+    npu_query = None
+    if not args.no_npu or args.npu_only:
+        npu_query = functools.partial(NPUStatCollection.new_query,
+                                      poller=NPUPoller())
+    sampler = Sampler(max(args.interval, MIN_INTERVAL), gpu_query=gpu_query,
+                      npu_query=npu_query, maxlen=16)
+    table = ProcessTable()
+
+    if args.once:
+        table.update(sampler.sample())
+        for line in render_table(term, table, args.sort, args.max_rows,
+                                 term.width or 80):
+            print(line)
+        return 0
+
+    sort = args.sort
+    sampler.start()
+    eol_char = term.clear_eol + os.linesep
+    last_seq = 0
+    try:
+        with term.fullscreen(), term.cbreak(), term.hidden_cursor():
+            while 1:
+                key = term.inkey(timeout=0.05)
+                if key.lower() == 'q':
+                    return 0
+                sort = SORT_HOTKEYS.get(key.lower(), sort)
+
+                snapshots = [s for s in sampler.slot.recent()
+                             if s.seq > last_seq]
+                if not snapshots and not key:
+                    continue
+                for s in snapshots:
+                    table.update(s)
+                    last_seq = s.seq
+
+                # only the rows that fit on the screen are ever rendered
+                max_rows = max((term.height or 24) - HEADER_LINES, 1)
+                if args.max_rows is not None:
+                    max_rows = min(max_rows, args.max_rows)
+                width = term.width or 80
+
+                out = [term.move(0, 0)]
+                out.append(term.bold_white(
+                    f'{len(table.rows)} processes, sorted by {sort}  ')
+                    + term.bold_black('(u/m/t: sort, q: quit)') + eol_char)
+                for line in render_table(term, table, sort, max_rows, width):
+                    out.append(line + eol_char)
+                out.append(term.clear_eos)
+                sys.stdout.write(''.join(out))
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        sampler.stop(timeout=0.05)
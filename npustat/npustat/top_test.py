@@ -0,0 +1,44 @@
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from blessed import Terminal
+
+from npustat.conftest import aries, process_info
+from npustat.core_npu import NPUStatCollection
+from npustat.sampler import Snapshot
+from npustat.top import ProcessTable, render_table
+
+
+def test_process_table_incremental(fake_mbltml):
+    start = datetime(2026, 1, 1)
+
+    def tick(seq, processes):
+        fake_mbltml.devices[:] = [aries(0, processes=processes)]
+        table.update(Snapshot(seq=seq, npu_stats=NPUStatCollection.new_query(),
+                              query_time=start + timedelta(seconds=seq)))
+
+    table = ProcessTable()
+    tick(1, [process_info(100, 512, 50.0), process_info(200, 2048, 10.0)])
+    tick(3, [process_info(100, 512, 50.0), process_info(200, 2048, 90.0)])
+
+    rows = table.top()
+    assert [r.pid for r in rows] == [200, 100]  # by utilization
+    assert [r.pid for r in table.top(sort='mem')] == [200, 100]
+    # 2 seconds at the utilization reported by the previous tick
+    assert table.rows[('N0', 100)].device_time == pytest.approx(1.0)
+    assert table.rows[('N0', 200)].device_time == pytest.approx(0.2)
+    assert [r.pid for r in table.top(sort='time')] == [100, 200]
+    assert [r.pid for r in table.top(1)] == [200]
+
+    tick(4, [process_info(200, 2048, 90.0)])  # pid 100 exited
+    assert list(table.rows) == [('N0', 200)]
+
+    lines = render_table(Terminal(force_styling=None), table, 'util',
+                         max_rows=5, width=80)
+    assert len(lines) == 2
+    assert lines[1].split()[:5] == ['N0', '200', 'user1', '90%', '2048M']
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
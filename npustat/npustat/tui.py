@@ -0,0 +1,187 @@
+"""
+Full-screen sparkline view for watch mode (``npustat --tui``).
+
+Every snapshot is recorded into a History whose series are bounded ring
+buffers, and each frame draws at most the last ``width`` samples of each
+series, so the cost of a redraw depends on the number of devices and the
+terminal width, never on how long the session has been running.
+"""
+
+import os
+import platform
+from typing import List, Optional, Sequence
+
+from npustat import util
+from npustat.history import History
+
+SPARK_CHARS = ' ▁▂▃▄▅▆▇█'
+
+# Samples kept per series; wider terminals simply show all of them.
+HISTORY_MAXLEN = 240
+
+# (metric, label, fixed upper bound or None to scale to the window's max)
+METRICS = (
+    ('utilization', 'util', 100.0),
+    ('memory', 'mem', 100.0),
+    ('power', 'pwr', None),
+    ('temperature', 'temp', 100.0),
+)
+
+
+def sparkline(values: Sequence[float], width: int, lo: float = 0.0,
+              hi: Optional[float] = None) -> str:
+    """Render the last `width` values as block characters, right-aligned."""
+    values = list(values)[-width:] if width > 0 else []
+    if hi is None:
+        hi = max(values, default=0.0)
+    span = hi - lo
+    top = len(SPARK_CHARS) - 1
+    chars = []
+    for v in values:
+        if span <= 0:
+            level = 0
+        else:
+            level = int(round((min(max(v, lo), hi) - lo) / span * top))
+        # a non-zero value never disappears into a blank cell
+        if level == 0 and v > lo:
+            level = 1
+        chars.append(SPARK_CHARS[level])
+    return ' ' * (width - len(chars)) + ''.join(chars)
+
+
+def _percent(used, total) -> Optional[float]:
+    if used is None or not total:
+        return None
+    return 100.0 * used / total
+
+
+class SparklineView:
+    """Records snapshots and renders one sparkline row per device.
+
+    With `show_cores`, every NPU core also gets a utilization sparkline.
+    With `high_res`, the GPU utilization and power series are filled with
+    the driver's sub-second samples by a GPUSampleReader sharing `history`,
+    so snapshots only add the other GPU metrics.
+    """
+
+    def __init__(self, show_cores: bool = False,
+                 maxlen: int = HISTORY_MAXLEN, high_res: bool = False):
+        self.show_cores = show_cores
+        self.high_res = high_res
+        self.history = History(maxlen)
+        self._last_seq = 0
+
+    def update(self, snapshot):
+        """Record a snapshot; recording the same one twice is a no-op."""
+        if snapshot.seq <= self._last_seq:
+            return
+        self._last_seq = snapshot.seq
+        ts = snapshot.query_time.timestamp()
+        record = self.history.record
+
+        for g in snapshot.gpu_stats or ():
+            key = f'G{g.index}'
+            if not self.high_res:
+                record(key, 'utilization', ts, g.utilization)
+                record(key, 'power', ts, g.power_draw)
+            record(key, 'memory', ts, _percent(g.memory_used, g.memory_total))
+            record(key, 'temperature', ts, g.temperature)
+
+        for n in snapshot.npu_stats or ():
+            key = f'N{n.index}'
+            record(key, 'utilization', ts, n.utilization)
+            record(key, 'memory', ts, _percent(n.memory_used, n.memory_total))
+            record(key, 'power', ts, n.power_total)
+            record(key, 'temperature', ts, n.temperature)
+            for core in n.cores:
+                record(f'{key}/{core.label}', 'utilization', ts,
+                       core.utilization)
+
+    def render(self, term, snapshot, width: Optional[int] = None) -> List[str]:
+        """The lines of one frame, without end-of-line characters."""
+        width = width or term.width or 80
+        devices = []  # (key, name, current values, upper bound of power)
+        for g in snapshot.gpu_stats or ():
+            devices.append((f'G{g.index}', g.name, {
+                'utilization': (g.utilization, '{:3.0f}%'),
+                'memory': (g.memory_used, '{:5.0f}M'),
+                'power': (g.power_draw, '{:4.0f}W'),
+                'temperature': (g.temperature, '{:3.0f}C'),
+            }, g.power_limit))
+        for n in snapshot.npu_stats or ():
+            devices.append((f'N{n.index}', n.name, {
+                'utilization': (n.utilization, '{:3.0f}%'),
+                'memory': (n.memory_used, '{:5.0f}M'),
+                'power': (n.power_total, '{:4.1f}W'),
+                'temperature': (n.temperature, '{:3.0f}C'),
+            }, None))
+
+        name_width = max([len(d[1]) for d in devices] + [8])
+        name_width = min(name_width, 24)
+        # "[N0] name " then four "label spark value" cells
+        cell_fixed = max(len(label) for _, label, _ in METRICS) + 9
+        spark_width = (width - (name_width + 6)) // len(METRICS) - cell_fixed
+        spark_width = max(spark_width, 4)
+
+        lines = []
+        for key, name, current, power_limit in devices:
+            color = term.bold_magenta if key[0] == 'N' else term.bold_white
+            row = [color(f'[{key}]') + ' ' + term.blue(
+                f"{util.shorten_left(name, width=name_width, placeholder='…'):{name_width}}")]
+            for metric, label, hi in METRICS:
+                if metric == 'power' and power_limit:
+                    hi = power_limit
+                series = self.history.get(key, metric)
+                values = series.values(last=spark_width) if series else []
+                value, fmt = current[metric]
+                text = '  ??' if value is None else fmt.format(value)
+                row.append(f'{label} ' + term.cyan(
+                    sparkline(values, spark_width, hi=hi)) + ' ' + text)
+            lines.append(' '.join(row))
+
+            if self.show_cores and key[0] == 'N':
+                lines.extend(self._render_cores(term, key, width))
+        return lines
+
+    def _render_cores(self, term, key: str, width: int) -> List[str]:
+        prefix = f'{key}/'
+        cores = sorted(k for k, m in self.history.keys()
+                       if k.startswith(prefix) and m == 'utilization')
+        if not cores:
+            return []
+        # "    C0/c0 <spark> 100%" cells, as many per line as fit
+        spark_width = 12
+        cell_width = len('C0/c0') + spark_width + 7
+        per_line = max((width - 4) // cell_width, 1)
+
+        lines = []
+        cells = []
+        for core_key in cores:
+            values = self.history.series(core_key, 'utilization')\
+                .values(last=spark_width)
+            label = core_key[len(prefix):]
+            latest = values[-1] if values else 0.0
+            spark = sparkline(values, spark_width, hi=100.0)
+            cells.append(f'{label:5} ' + (
+                term.bold_green(spark) if latest > 0 else
+                term.bold_black(spark)) + f' {latest:3.0f}%')
+            if len(cells) == per_line:
+                lines.append('    ' + '  '.join(cells))
+                cells = []
+        if cells:
+            lines.append('    ' + '  '.join(cells))
+        return lines
+
+
+def header_line(term, snapshot) -> str:
+    timestr = snapshot.query_time.strftime('%Y-%m-%d %H:%M:%S')
+    return (term.bold_white(platform.node()) + '  ' + timestr + '  ' +
+            term.bold_black('(c: toggle cores, q: quit)'))
+
+
+def render_frame(term, view: SparklineView, snapshot, fp, eol_char=os.linesep):
+    """Record `snapshot` into `view` and draw a whole frame to `fp`."""
+    view.update(snapshot)
+    fp.write(header_line(term, snapshot) + eol_char)
+    for line in view.render(term, snapshot):
+        fp.write(line + eol_char)
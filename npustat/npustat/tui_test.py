@@ -0,0 +1,57 @@
+import sys
+import types
+from datetime import datetime, timedelta
+
+import pytest
+from blessed import Terminal
+
+from npustat.conftest import aries
+from npustat.core_npu import NPUStatCollection
+from npustat.sampler import Snapshot
+from npustat.tui import SparklineView, sparkline
+
+
+def test_sparkline():
+    assert sparkline([0, 50, 100], 3, hi=100) == ' ▄█'
+    assert sparkline([1], 3, hi=100) == '  ▁'  # non-zero is never blank
+    assert sparkline(range(10), 4) == '▅▆▇█'  # only the last `width` values
+    assert sparkline([], 2) == '  '
+
+
+def test_view_history_is_bounded(fake_mbltml):
+    fake_mbltml.devices[:] = [aries(0)]
+    view = SparklineView(show_cores=True, maxlen=8)
+    start = datetime(2026, 1, 1)
+    for seq in range(1, 21):
+        fake_mbltml.devices[0]['TotalUtilization'] = seq
+        snapshot = Snapshot(seq=seq, npu_stats=NPUStatCollection.new_query(),
+                            query_time=start + timedelta(seconds=seq))
+        view.update(snapshot)
+        view.update(snapshot)  # recorded once
+
+    assert view.history.series('N0', 'utilization').values() == \
+        [float(v) for v in range(13, 21)]
+    assert len(view.history.series('N0/C0/c0', 'utilization')) == 8
+
+    lines = view.render(Terminal(force_styling=None), snapshot, width=100)
+    assert lines[0].startswith('[N0] Aries(aries0)')
+    assert ' 20%' in lines[0]
+    assert 'C0/c0' in lines[1]
+
+
+def test_high_res_view_leaves_gpu_series_to_the_reader():
+    view = SparklineView(high_res=True)
+    view.history.record_many('G0', 'utilization', [(0.5, 90), (0.75, 10)])
+    gpu = types.SimpleNamespace(index=0, utilization=10, power_draw=100,
+                                memory_used=1, memory_total=2,
+                                temperature=50)
+    view.update(Snapshot(seq=1, gpu_stats=[gpu],
+                         query_time=datetime.fromtimestamp(1.0)))
+
+    assert view.history.series('G0', 'utilization').values() == [90, 10]
+    assert view.history.get('G0', 'power') is None
+    assert view.history.series('G0', 'memory').values() == [50.0]
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
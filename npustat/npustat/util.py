@@ -62,6 +62,28 @@ def shorten_left(text, width, placeholder="…"):
     return placeholder + text[-(width - len(placeholder)):]
 
 
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_duration(text: str) -> float:
+    """Parse a duration such as '500ms', '10s', '5m', '1h' or '2.5' into
+    seconds; a bare number is in seconds."""
+    text = text.strip()
+    for unit in ('ms', 's', 'm', 'h'):
+        if text.endswith(unit):
+            number, scale = text[:-len(unit)], _DURATION_UNITS[unit]
+            break
+    else:
+        number, scale = text, 1.0
+    try:
+        seconds = float(number) * scale
+    except ValueError:
+        raise ValueError(f"Invalid duration: {text!r}") from None
+    if seconds < 0:
+        raise ValueError(f"Duration must be non-negative: {text!r}")
+    return seconds
+
+
 def safecall(fn: Callable[[], T],
              *,
              exc_types: Union[Type, Tuple[Type, ...]] = Exception,
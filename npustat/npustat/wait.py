@@ -0,0 +1,305 @@
+"""
+``npustat wait``: block until devices are free or idle.
+
+Meant for job launchers that used to loop over ``npustat --json | jq``: the
+backend is initialized once, only the values the condition needs are read
+(e.g. just the memory of an NPU for ``--mem-free``), and polling backs off
+while the condition does not hold.
+
+Exit status: 0 once the condition holds, 1 on timeout, 2 on errors.
+"""
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from typing import (Any, Callable, Dict, List, Optional, Sequence, Tuple,
+                    Union)
+
+from npustat.util import parse_duration
+
+EXIT_TIMEOUT = 1
+EXIT_ERROR = 2
+
+# Consecutive failed reads of a device after which waiting gives up; fewer
+# count as the condition not holding (e.g. a device busy for a moment).
+MAX_READ_ERRORS = 3
+
+
+@dataclass
+class Condition:
+    """What a device must satisfy; unset criteria are not checked."""
+    mem_free: Optional[int] = None  # at least this many MB free
+    util_below: Optional[float] = None  # utilization strictly below, percent
+    no_processes: bool = False  # no process running on the device
+
+    @property
+    def groups(self) -> List[str]:
+        """The NPU field groups (see npu.FIELD_GROUPS) the condition needs."""
+        groups = []
+        if self.mem_free is not None:
+            groups.append('memory')
+        if self.util_below is not None:
+            groups.append('utilization')
+        if self.no_processes:
+            groups.append('processes')
+        return groups
+
+    def holds(self, values: Dict[str, Any]) -> bool:
+        if self.mem_free is not None and \
+                values['memory_total'] - values['memory_used'] < self.mem_free:
+            return False
+        if self.util_below is not None and \
+                not values['utilization'] < self.util_below:
+            return False
+        if self.no_processes and values['processes']:
+            return False
+        return True
+
+
+def npu_reader(groups: Sequence[str], *,
+               strict: bool = False) -> Callable[[int], Dict[str, Any]]:
+    """Reads only the given field groups of an NPU.
+
+    With strict, a getter that fails raises instead of reading as 0 (or as
+    no process), so that a broken device never looks idle.
+    """
+    from npustat import npu
+    npu.ensure_initialized()
+    readers = [npu.FIELD_GROUPS[g] for g in groups]
+
+    def read(index: int) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        for reader in readers:
+            values.update(reader(index, strict=strict))
+        return values
+    return read
+
+
+def _decode(value: Union[str, bytes]) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def gpu_reader(groups: Sequence[str]) -> Callable[[int], Dict[str, Any]]:
+    """Reads only the NVML values behind the given field groups of a GPU."""
+    from npustat import nvml
+    from npustat.nvml import pynvml as N
+    nvml.ensure_initialized()
+    handles: Dict[int, Any] = {}
+
+    def read(index: int) -> Dict[str, Any]:
+        handle = handles.get(index)
+        if handle is None:
+            handle = handles[index] = N.nvmlDeviceGetHandleByIndex(index)
+        values: Dict[str, Any] = {}
+        if 'static' in groups:
+            values['name'] = _decode(N.nvmlDeviceGetName(handle))
+            values['uuid'] = _decode(N.nvmlDeviceGetUUID(handle))
+        if 'temperature' in groups:
+            values['temperature'] = N.nvmlDeviceGetTemperature(
+                handle, N.NVML_TEMPERATURE_GPU)
+        if 'memory' in groups:
+            memory = N.nvmlDeviceGetMemoryInfo(handle)
+            values['memory_used'] = memory.used // (1024 * 1024)
+            values['memory_total'] = memory.total // (1024 * 1024)
+        if 'utilization' in groups:
+            values['utilization'] = \
+                N.nvmlDeviceGetUtilizationRates(handle).gpu
+        if 'power' in groups:
+            values['power_total'] = \
+                N.nvmlDeviceGetPowerUsage(handle) / 1000.0  # mW -> W
+        if 'processes' in groups:
+            values['processes'] = \
+                N.nvmlDeviceGetComputeRunningProcesses(handle) + \
+                N.nvmlDeviceGetGraphicsRunningProcesses(handle)
+        return values
+    return read
+
+
+def wait_until(condition: Condition,
+               devices: Sequence[Tuple[str, Callable[[], Dict[str, Any]]]], *,
+               hold: float = 0.0,
+               timeout: Optional[float] = None,
+               any_device: bool = False,
+               interval: float = 0.5,
+               max_interval: float = 5.0,
+               max_errors: int = MAX_READ_ERRORS,
+               clock: Callable[[], float] = time.monotonic,
+               sleep: Callable[[float], None] = time.sleep,
+               ) -> Optional[List[str]]:
+    """Poll `devices` until `condition` has held for `hold` seconds.
+
+    Args:
+        condition: The condition every (or, with any_device, some) device
+            must satisfy
+        devices: (label, read) pairs; read() returns the device values
+        hold: Seconds the condition must hold without interruption
+        timeout: Seconds to give up after, or None to wait forever
+        any_device: Succeed as soon as one device satisfies the condition
+        interval: Initial seconds between polls; doubled, up to
+            max_interval, while the condition does not hold
+        max_interval: Upper bound of the backoff
+        max_errors: Consecutive failed reads of a device to give up after
+        clock: Monotonic clock, for testing
+        sleep: Sleep function, for testing
+
+    Returns:
+        The labels of the devices satisfying the condition, or None on
+        timeout.
+
+    Raises:
+        RuntimeError: If a device could not be read max_errors times in a
+            row, e.g. because it is gone.
+    """
+    start = clock()
+    since: Dict[str, Optional[float]] = {label: None for label, _ in devices}
+    errors = {label: 0 for label, _ in devices}
+    delay = interval
+    while True:
+        now = clock()
+        for label, read in devices:
+            try:
+                ok = condition.holds(read())
+                errors[label] = 0
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                errors[label] += 1
+                if errors[label] >= max_errors:
+                    raise RuntimeError(f'cannot read {label}: {e}') from e
+                ok = False
+            if not ok:
+                since[label] = None
+            elif since[label] is None:
+                since[label] = now
+
+        ready = [label for label, t in since.items()
+                 if t is not None and now - t >= hold]
+        if ready and (any_device or len(ready) == len(since)):
+            return ready
+
+        holding = any(t is not None for t in since.values())
+        if holding:
+            # confirm at the base rate while the condition holds
+            delay = interval
+            pending = [t + hold - now for t in since.values() if t is not None]
+            wait = min(delay, max(min(pending), 0.0)) or delay
+        else:
+            wait = delay
+            delay = min(delay * 2, max_interval)
+
+        if timeout is not None:
+            remaining = start + timeout - now
+            if remaining <= 0:
+                return None
+            wait = min(wait, remaining)
+        sleep(wait)
+
+
+def _parse_indices(value: str) -> Optional[List[int]]:
+    if value == 'all':
+        return None
+    try:
+        return [int(i) for i in value.split(',') if i.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected a comma-separated list of indices or 'all': {value!r}")
+
+
+def _check_indices(kind: str, indices: Optional[List[int]],
+                   count: int) -> Sequence[int]:
+    """The given device indices (all if None); raises on unknown ones."""
+    if indices is None:
+        return range(count)
+    unknown = [i for i in indices if not 0 <= i < count]
+    if unknown:
+        raise ValueError(f"no {kind} {', '.join(map(str, unknown))} "
+                         f"({count} {kind}(s) found)")
+    return indices
+
+
+def _duration(value: str) -> float:
+    try:
+        return parse_duration(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def main(argv: List[str]) -> int:
+    """Entry point of ``npustat wait``; argv[0] is the subcommand name."""
+    parser = argparse.ArgumentParser(
+        'npustat wait',
+        description='Block until devices satisfy a condition, e.g. '
+                    '`npustat wait --npu 0,1 --mem-free 4096 --util-below 5 '
+                    '--for 10s --timeout 600`. Exits 0 once it holds, 1 on '
+                    'timeout and 2 on errors.')
+    parser.add_argument('--npu', type=_parse_indices, nargs='?', const=None,
+                        default=False, metavar='INDICES',
+                        help='NPUs to wait for (default: all NPUs)')
+    parser.add_argument('--gpu', type=_parse_indices, nargs='?', const=None,
+                        default=False, metavar='INDICES',
+                        help='GPUs to wait for (default: none)')
+    parser.add_argument('--mem-free', type=int, default=None, metavar='MB',
+                        help='Free device memory of at least MB megabytes')
+    parser.add_argument('--util-below', type=float, default=None,
+                        metavar='PERCENT',
+                        help='Device utilization below PERCENT')
+    parser.add_argument('--no-processes', action='store_true',
+                        help='No process running on the device')
+    parser.add_argument('--for', dest='hold', type=_duration, default=0.0,
+                        metavar='DURATION',
+                        help='How long the condition must hold, e.g. 10s')
+    parser.add_argument('--timeout', type=_duration, default=None,
+                        metavar='DURATION',
+                        help='Give up (exit 1) after DURATION, e.g. 10m')
+    parser.add_argument('--any', dest='any_device', action='store_true',
+                        help='Succeed once any one of the devices satisfies '
+                             'the condition, and print which')
+    parser.add_argument('-i', '--interval', type=_duration, default=0.5,
+                        help='Initial seconds between polls; backs off up '
+                             'to --max-interval while the condition fails')
+    parser.add_argument('--max-interval', type=_duration, default=5.0)
+    args = parser.parse_args(argv[1:])
+
+    condition = Condition(mem_free=args.mem_free, util_below=args.util_below,
+                          no_processes=args.no_processes)
+    if not condition.groups:
+        parser.error('nothing to wait for; give --mem-free, --util-below '
+                     'and/or --no-processes')
+    if args.npu is False and args.gpu is False:
+        args.npu = None  # all NPUs
+
+    devices = []
+    try:
+        if args.npu is not False:
+            from npustat.npu import npu_count
+            read = npu_reader(condition.groups, strict=True)
+            for i in _check_indices('NPU', args.npu, npu_count()):
+                devices.append((f'N{i}', lambda i=i: read(i)))
+        if args.gpu is not False:
+            from npustat.nvml import pynvml as N
+            read_gpu = gpu_reader(condition.groups)
+            for i in _check_indices('GPU', args.gpu,
+                                    N.nvmlDeviceGetCount()):
+                devices.append((f'G{i}', lambda i=i: read_gpu(i)))
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        sys.stderr.write(f'npustat wait: cannot query the devices: {e}\n')
+        return EXIT_ERROR
+    if not devices:
+        sys.stderr.write('npustat wait: no device to wait for.\n')
+        return EXIT_ERROR
+
+    try:
+        ready = wait_until(condition, devices, hold=args.hold,
+                           timeout=args.timeout, any_device=args.any_device,
+                           interval=args.interval,
+                           max_interval=max(args.max_interval, args.interval))
+    except RuntimeError as e:
+        sys.stderr.write(f'npustat wait: {e}\n')
+        return EXIT_ERROR
+    except KeyboardInterrupt:
+        return EXIT_ERROR
+    if ready is None:
+        sys.stderr.write('npustat wait: timed out.\n')
+        return EXIT_TIMEOUT
+    if args.any_device:
+        print(','.join(ready))
+    return 0
@@ -0,0 +1,113 @@
+import sys
+
+import pytest
+
+from npustat import cli
+from npustat.conftest import FakeClock
+from npustat.wait import Condition, npu_reader, wait_until
+
+MB = 1024 * 1024
+
+
+class FakeSleep:
+
+    def __init__(self, clock, on_sleep=None):
+        self.clock = clock
+        self.on_sleep = on_sleep
+        self.calls = []
+
+    def __call__(self, seconds):
+        self.calls.append(seconds)
+        self.clock.now += seconds
+        if self.on_sleep:
+            self.on_sleep(self.clock.now)
+
+
+def test_wait_reads_only_needed_fields(fake_mbltml):
+    clock = FakeClock()
+    start = clock.now
+
+    def on_sleep(now):  # memory is released on N1 after 10 seconds
+        if now - start >= 10:
+            fake_mbltml.devices[1]['MemoryUsage'] = 100 * MB
+
+    sleep = FakeSleep(clock, on_sleep)
+    read = npu_reader(Condition(mem_free=16000).groups)
+    ready = wait_until(Condition(mem_free=16000),
+                       [('N0', lambda: read(0)), ('N1', lambda: read(1))],
+                       any_device=True, interval=0.5, max_interval=4.0,
+                       clock=clock, sleep=sleep)
+    assert ready == ['N1']
+    assert sleep.calls[:5] == [0.5, 1.0, 2.0, 4.0, 4.0]  # backoff
+    assert {key for _, key in fake_mbltml.calls} == \
+        {'MemoryUsage', 'MemoryTotal'}
+
+
+def test_wait_hold_and_timeout(fake_mbltml):
+    clock = FakeClock()
+    sleep = FakeSleep(clock)
+    read = npu_reader(['utilization'])
+    devices = [('N0', lambda: read(0)), ('N1', lambda: read(1))]
+
+    # utilization is 8 %: holds, and must keep holding for 3 seconds
+    ready = wait_until(Condition(util_below=10), devices, hold=3.0,
+                       interval=1.0, clock=clock, sleep=sleep)
+    assert ready == ['N0', 'N1']
+    assert sum(sleep.calls) == pytest.approx(3.0)
+
+    assert wait_until(Condition(util_below=5), devices, timeout=10.0,
+                      clock=clock, sleep=sleep) is None
+
+
+def test_wait_read_errors(fake_mbltml):
+    clock = FakeClock()
+    sleep = FakeSleep(clock)
+    reads = []
+
+    def read():
+        reads.append(clock.now)
+        if len(reads) < 3:
+            raise RuntimeError('busy')
+        return {'utilization': 0.0}
+    # a failed read or two is the condition not holding
+    assert wait_until(Condition(util_below=10), [('N0', read)],
+                      clock=clock, sleep=sleep) == ['N0']
+
+    def gone():
+        raise RuntimeError('device lost')
+    with pytest.raises(RuntimeError, match='cannot read N1: device lost'):
+        wait_until(Condition(util_below=10), [('N1', gone)], max_errors=3,
+                   clock=clock, sleep=sleep)
+
+
+@pytest.mark.parametrize('condition, getter', [
+    ('--util-below=5', 'TotalUtilization'),
+    ('--mem-free=16000', 'MemoryUsage'),
+    ('--no-processes', 'ProcessInfos'),
+])
+def test_wait_broken_device(fake_mbltml, capsys, condition, getter):
+    # a getter that fails (or returns nothing) is not an idle device
+    if getter == 'ProcessInfos':
+        fake_mbltml.devices[1][getter] = None
+    else:
+        del fake_mbltml.devices[1][getter]
+    assert cli.main('npustat', 'wait', '--npu', '1', condition,
+                    '-i', '0.01') == 2
+    assert 'cannot read N1' in capsys.readouterr().err
+    assert fake_mbltml.calls[(1, getter)] == 3  # MAX_READ_ERRORS
+
+
+def test_wait_cli(fake_mbltml, capsys):
+    assert cli.main('npustat', 'wait', '--npu', '0,1', '--util-below', '10',
+                    '--any') == 0
+    assert capsys.readouterr().out == 'N0,N1\n'
+    assert cli.main('npustat', 'wait', '--mem-free', '999999',
+                    '--timeout', '0') == 1
+    # there are two NPUs
+    assert cli.main('npustat', 'wait', '--npu', '5', '--util-below', '10') \
+        == 2
+    assert 'no NPU 5 (2 NPU(s) found)' in capsys.readouterr().err
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
@@ -0,0 +1,258 @@
+"""
+Workload sampling for profiling a block of Python code.
+
+    with npustat.sample(interval=0.05, devices=['N0']) as s:
+        model.run(inputs)
+    print(s.report())
+    s.summary()['N0']['energy']   # joules spent during the block
+
+A background thread reads only the utilization, memory, power and (for
+NPUs) per-core counters of the selected devices at a fixed rate. The raw
+series are kept as ``array.array('d')`` (wrap them with ``numpy.asarray``
+if needed), and summaries are computed from them on demand.
+
+``%load_ext npustat`` registers the matching ``%%npustat`` cell magic.
+"""
+
+import argparse
+import contextlib
+import math
+import shlex
+import threading
+import time
+from array import array
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Sequence,
+                    Tuple)
+
+from npustat.scheduler import FixedRateScheduler
+
+NPU_GROUPS = ('utilization', 'memory', 'power', 'cores')
+GPU_GROUPS = ('utilization', 'memory', 'power')
+
+# recorded for every device: name in the series -> key in the read values
+METRICS = {'utilization': 'utilization', 'memory': 'memory_used',
+           'power': 'power_total'}
+
+
+def _device_readers(devices: Optional[Sequence[str]]
+                    ) -> List[Tuple[str, Callable[[], Dict[str, Any]]]]:
+    """(label, read) of the selected devices, e.g. ('N0', read)."""
+    from npustat.wait import gpu_reader, npu_reader
+
+    def npus():
+        from npustat.npu import npu_count
+        return npu_reader(NPU_GROUPS), npu_count()
+
+    def gpus():
+        from npustat.nvml import pynvml as N
+        read = gpu_reader(GPU_GROUPS)
+        return read, N.nvmlDeviceGetCount()
+
+    wanted = None if devices is None else [d.upper() for d in devices]
+    readers = []
+    for prefix, family in (('G', gpus), ('N', npus)):
+        requested = wanted is not None and \
+            any(w.startswith(prefix) for w in wanted)
+        if wanted is not None and not requested:
+            continue
+        try:
+            read, count = family()
+        except Exception:  # pylint: disable=broad-exception-caught
+            if requested:
+                raise
+            continue  # e.g. no NVIDIA driver: sample the other family only
+        for index in range(count):
+            label = f'{prefix}{index}'
+            if wanted is None or label in wanted:
+                readers.append((label, lambda i=index, r=read: r(i)))
+
+    unknown = set(wanted or ()) - {label for label, _ in readers}
+    if unknown:
+        raise ValueError(f"Unknown device(s): {', '.join(sorted(unknown))} "
+                         "(expected labels like N0 or G1)")
+    return readers
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of the non-NaN values (NaN if none)."""
+    values = sorted(v for v in values if not math.isnan(v))
+    if not values:
+        return math.nan
+    return values[max(math.ceil(q / 100.0 * len(values)) - 1, 0)]
+
+
+def _mean(values: Sequence[float]) -> float:
+    values = [v for v in values if not math.isnan(v)]
+    return sum(values) / len(values) if values else math.nan
+
+
+def _energy(times: Sequence[float], power: Sequence[float]) -> float:
+    """Joules: the trapezoidal integral of power over time."""
+    total = 0.0
+    for i in range(1, len(times)):
+        p0, p1 = power[i - 1], power[i]
+        if not (math.isnan(p0) or math.isnan(p1)):
+            total += (p0 + p1) / 2 * (times[i] - times[i - 1])
+    return total
+
+
+class Recording:
+    """The series sampled by sample(), indexed by device label.
+
+    `times` holds the seconds since the start of each sample; every series
+    has one value per sample, NaN where the device could not be read.
+    """
+
+    def __init__(self, interval: float,
+                 readers: Sequence[Tuple[str, Callable[[], Dict[str, Any]]]]):
+        self.interval = interval
+        self.devices = [label for label, _ in readers]
+        self.times = array('d')
+        self.series: Dict[str, Dict[str, array]] = {
+            label: {name: array('d') for name in METRICS}
+            for label in self.devices}
+        # per NPU core (e.g. 'C0/c1'): its utilization
+        self.cores: Dict[str, Dict[str, array]] = {
+            label: {} for label in self.devices}
+        self.errors: Dict[str, str] = {}  # the first error of each device
+        self.duration = 0.0
+
+        self._readers = list(readers)
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def take(self):
+        """Read every device once and append the values."""
+        t = time.monotonic() - self._start
+        readings = []
+        for label, read in self._readers:
+            try:
+                readings.append((label, read()))
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self.errors.setdefault(label, str(e))
+                readings.append((label, {}))
+
+        with self._lock:
+            self.times.append(t)
+            n = len(self.times)
+            for label, values in readings:
+                for name, key in METRICS.items():
+                    value = values.get(key)
+                    self.series[label][name].append(
+                        math.nan if value is None else float(value))
+                cores = self.cores[label]
+                for core in values.get('cores', ()):
+                    series = cores.get(core.label)
+                    if series is None:  # first seen: pad the past
+                        series = cores[core.label] = \
+                            array('d', [math.nan]) * (n - 1)
+                    series.append(core.utilization)
+                for series in cores.values():
+                    if len(series) < n:  # not reported this time
+                        series.append(math.nan)
+            self.duration = t
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Summary statistics of each device over the recording.
+
+        Returns:
+            For each device label: 'utilization' and per-core 'cores'
+            ({'mean': %, 'p95': %}), 'memory.peak' (MB), 'power.mean' (W)
+            and 'energy' (J).
+        """
+        with self._lock:
+            result = {}
+            for label in self.devices:
+                series = self.series[label]
+                memory = [v for v in series['memory'] if not math.isnan(v)]
+                result[label] = {
+                    'utilization': {
+                        'mean': _mean(series['utilization']),
+                        'p95': _percentile(series['utilization'], 95)},
+                    'memory.peak': max(memory) if memory else math.nan,
+                    'power.mean': _mean(series['power']),
+                    'energy': _energy(self.times, series['power']),
+                    'cores': {
+                        core: {'mean': _mean(values),
+                               'p95': _percentile(values, 95)}
+                        for core, values in sorted(
+                            self.cores[label].items())},
+                }
+            return result
+
+    def report(self) -> str:
+        """The summary as text, one line per device and per NPU core."""
+        lines = [f'npustat: {self.duration:.2f} s, {len(self.times)} samples '
+                 f'every {self.interval:g} s']
+        for label, s in self.summary().items():
+            u = s['utilization']
+            lines.append(
+                f"[{label}] util {u['mean']:5.1f} % (p95 {u['p95']:5.1f} %)"
+                f" | mem peak {s['memory.peak']:6.0f} MB"
+                f" | {s['energy']:8.2f} J ({s['power.mean']:.1f} W avg)")
+            for core, c in s['cores'].items():
+                lines.append(f"    {core:6} {c['mean']:5.1f} % "
+                             f"(p95 {c['p95']:5.1f} %)")
+            if label in self.errors:
+                lines.append(f'    error: {self.errors[label]}')
+        return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def sample(interval: float = 0.05,
+           devices: Optional[Sequence[str]] = None) -> Iterator[Recording]:
+    """Sample devices in the background while the block runs.
+
+    Args:
+        interval: Seconds between samples
+        devices: Labels of the devices to sample, e.g. ['N0', 'G1']
+            (default: every GPU and NPU found)
+
+    Yields:
+        The Recording, complete once the block exits (a last sample is
+        taken then).
+    """
+    recording = Recording(interval, _device_readers(devices))
+    stop = threading.Event()
+    scheduler = FixedRateScheduler(interval, sleep=stop.wait)
+
+    def run():
+        while not stop.is_set():
+            scheduler.wait()
+            if stop.is_set():
+                break
+            recording.take()
+
+    thread = threading.Thread(target=run, daemon=True,
+                              name='npustat-workload')
+    thread.start()
+    try:
+        yield recording
+    finally:
+        stop.set()
+        thread.join()
+        recording.take()
+
+
+def load_ipython_extension(ipython):
+    """Register the ``%%npustat [-i INTERVAL] [-d N0,G1] [-o VAR]`` magic.
+
+    The report is printed after the cell; with ``-o VAR`` the Recording is
+    also stored in the variable VAR of the notebook.
+    """
+    parser = argparse.ArgumentParser(prog='%%npustat', add_help=False)
+    parser.add_argument('-i', '--interval', type=float, default=0.05)
+    parser.add_argument('-d', '--devices', default=None,
+                        help='Comma-separated device labels, e.g. N0,G1')
+    parser.add_argument('-o', '--output', default=None, metavar='VAR')
+
+    def npustat_magic(line, cell):
+        args = parser.parse_args(shlex.split(line))
+        devices = args.devices.split(',') if args.devices else None
+        with sample(args.interval, devices) as recording:
+            ipython.run_cell(cell)
+        print(recording.report())
+        if args.output:
+            ipython.user_ns[args.output] = recording
+
+    ipython.register_magic_function(npustat_magic, 'cell', 'npustat')
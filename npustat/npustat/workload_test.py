@@ -0,0 +1,80 @@
+import math
+import sys
+import time
+import types
+
+import pytest
+
+import npustat
+from npustat import workload
+from npustat.conftest import aries, core_info
+
+
+def test_summary():
+    values = iter([
+        {'utilization': 10.0, 'memory_used': 100, 'power_total': 5.0},
+        {'utilization': 90.0, 'memory_used': 300, 'power_total': 15.0},
+        {'utilization': 50.0, 'memory_used': 200, 'power_total': 10.0},
+    ])
+    recording = workload.Recording(0.1, [('N0', lambda: next(values))])
+    for _ in range(3):
+        recording.take()
+    recording.times[:] = workload.array('d', [0.0, 1.0, 2.0])
+
+    s = recording.summary()['N0']
+    assert s['utilization'] == {'mean': 50.0, 'p95': 90.0}
+    assert s['memory.peak'] == 300
+    assert s['power.mean'] == 10.0
+    assert s['energy'] == 10.0 + 12.5  # trapezoids of 1 s each
+    assert list(recording.series['N0']['utilization']) == [10.0, 90.0, 50.0]
+
+
+def test_failed_reads_are_nan():
+    def read():
+        raise RuntimeError('device lost')
+
+    recording = workload.Recording(0.1, [('N1', read)])
+    recording.take()
+    assert math.isnan(recording.series['N1']['utilization'][0])
+    assert recording.errors == {'N1': 'device lost'}
+    assert 'error: device lost' in recording.report()
+
+
+def test_sample(fake_mbltml):
+    fake_mbltml.devices[0] = aries(0, utilization=40.0, cores=[
+        core_info(0, -1, 500_000), core_info(0, 0, 250_000)])
+    with npustat.sample(interval=0.01, devices=['n0']) as s:
+        time.sleep(0.05)
+    assert s.devices == ['N0']
+    assert len(s.times) >= 3
+    summary = s.summary()['N0']
+    assert summary['utilization']['mean'] == 40.0
+    assert summary['cores'] == {'C0/G': {'mean': 50.0, 'p95': 50.0},
+                                'C0/c0': {'mean': 25.0, 'p95': 25.0}}
+    # only the counters of the samples were read, never e.g. processes
+    assert not {key for _, key in fake_mbltml.calls} & \
+        {'ProcessInfos', 'Temperature', 'NodeName'}
+    assert s.report().splitlines()[1].startswith('[N0] util  40.0 %')
+
+
+def test_unknown_device(fake_mbltml):
+    with pytest.raises(ValueError, match='N7'):
+        with npustat.sample(devices=['N7']):
+            pass
+
+
+def test_cell_magic(fake_mbltml, capsys):
+    magics = {}
+    ipython = types.SimpleNamespace(
+        user_ns={},
+        run_cell=lambda cell: time.sleep(0.02),
+        register_magic_function=lambda f, kind, name: magics.update(
+            {(kind, name): f}))
+    npustat.load_ipython_extension(ipython)
+    magics[('cell', 'npustat')]('-i 0.01 -d N0,N1 -o rec', 'model.run()')
+    assert capsys.readouterr().out.startswith('npustat: ')
+    assert ipython.user_ns['rec'].devices == ['N0', 'N1']
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main(["-s", "-v"] + sys.argv))
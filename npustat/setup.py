@@ -132,7 +132,8 @@ setup(
     ],
     packages=['npustat'],
     install_requires=install_requires,
-    extras_require={'test': tests_requires, 'completion': ['shtab']},
+    extras_require={'test': tests_requires, 'completion': ['shtab'],
+                    'fast': ['orjson']},
     tests_require=tests_requires,
     entry_points={
         'console_scripts': ['npustat=npustat:main'],